@@ -0,0 +1,86 @@
+-- Columnar compression and continuous aggregates for the market_data hypertable
+--
+-- Requires the Timescale-licensed (community) TimescaleDB build for compression and
+-- continuous aggregates, and 2.9+ for aggregates on top of aggregates.
+
+-- The (symbol, timestamp) primary key already serves symbol lookups
+DROP INDEX IF EXISTS idx_market_data_symbol;
+
+-- Compress chunks older than a week, one segment per symbol ordered by time
+ALTER TABLE market_data SET (
+    timescaledb.compress,
+    timescaledb.compress_segmentby = 'symbol',
+    timescaledb.compress_orderby = 'timestamp DESC'
+);
+SELECT add_compression_policy('market_data', INTERVAL '7 days', if_not_exists => TRUE);
+
+-- Hourly bars (intraday rollup)
+CREATE MATERIALIZED VIEW IF NOT EXISTS market_data_1h
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT symbol,
+       time_bucket(INTERVAL '1 hour', timestamp) AS bucket,
+       first(open, timestamp) AS open,
+       max(high) AS high,
+       min(low) AS low,
+       last(close, timestamp) AS close,
+       sum(volume) AS volume
+FROM market_data
+GROUP BY symbol, bucket
+WITH NO DATA;
+
+-- Daily bars (intraday-to-daily rollup; identity for daily data)
+CREATE MATERIALIZED VIEW IF NOT EXISTS market_data_1d
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT symbol,
+       time_bucket(INTERVAL '1 day', timestamp) AS bucket,
+       first(open, timestamp) AS open,
+       max(high) AS high,
+       min(low) AS low,
+       last(close, timestamp) AS close,
+       sum(volume) AS volume
+FROM market_data
+GROUP BY symbol, bucket
+WITH NO DATA;
+
+-- Weekly (Monday-aligned) and monthly bars, rolled up from the daily aggregate
+CREATE MATERIALIZED VIEW IF NOT EXISTS market_data_1w
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT symbol,
+       time_bucket(INTERVAL '1 week', bucket) AS bucket,
+       first(open, bucket) AS open,
+       max(high) AS high,
+       min(low) AS low,
+       last(close, bucket) AS close,
+       sum(volume) AS volume
+FROM market_data_1d
+GROUP BY symbol, time_bucket(INTERVAL '1 week', bucket)
+WITH NO DATA;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS market_data_1mo
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT symbol,
+       time_bucket(INTERVAL '1 month', bucket) AS bucket,
+       first(open, bucket) AS open,
+       max(high) AS high,
+       min(low) AS low,
+       last(close, bucket) AS close,
+       sum(volume) AS volume
+FROM market_data_1d
+GROUP BY symbol, time_bucket(INTERVAL '1 month', bucket)
+WITH NO DATA;
+
+-- Keep recent buckets materialized; older ones only change on backfills
+SELECT add_continuous_aggregate_policy('market_data_1h', start_offset => INTERVAL '3 days',
+    end_offset => INTERVAL '1 hour', schedule_interval => INTERVAL '30 minutes', if_not_exists => TRUE);
+SELECT add_continuous_aggregate_policy('market_data_1d', start_offset => INTERVAL '7 days',
+    end_offset => INTERVAL '1 hour', schedule_interval => INTERVAL '1 hour', if_not_exists => TRUE);
+SELECT add_continuous_aggregate_policy('market_data_1w', start_offset => INTERVAL '5 weeks',
+    end_offset => INTERVAL '1 day', schedule_interval => INTERVAL '1 day', if_not_exists => TRUE);
+SELECT add_continuous_aggregate_policy('market_data_1mo', start_offset => INTERVAL '3 months',
+    end_offset => INTERVAL '1 day', schedule_interval => INTERVAL '1 day', if_not_exists => TRUE);
+
+-- Materialize existing history (backfills: CALL refresh_continuous_aggregate(view, start, end))
+CALL refresh_continuous_aggregate('market_data_1h', NULL, NULL);
+CALL refresh_continuous_aggregate('market_data_1d', NULL, NULL);
+CALL refresh_continuous_aggregate('market_data_1w', NULL, NULL);
+CALL refresh_continuous_aggregate('market_data_1mo', NULL, NULL);
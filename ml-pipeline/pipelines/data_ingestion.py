@@ -1,11 +1,12 @@
 """
 Data ingestion module for downloading stock data using yfinance and converting to Polars DataFrame
+
+yfinance and pandas are imported inside the download functions so that loading
+cached parquet files does not pay their import cost.
 """
 from datetime import datetime
 from pathlib import Path
-import yfinance as yf
 import polars as pl
-import pandas as pd
 
 
 def download_stock_data(symbol: str, start_date: datetime = None, end_date: datetime = None) -> pl.DataFrame:
@@ -20,6 +21,9 @@ def download_stock_data(symbol: str, start_date: datetime = None, end_date: date
     Returns:
         Polars DataFrame with stock data
     """
+    import yfinance as yf
+    import pandas as pd
+
     if end_date is None:
         end_date = datetime.now()
     if start_date is None:
@@ -74,6 +78,8 @@ def download_dividends_and_splits(symbol: str) -> tuple[pl.DataFrame, pl.DataFra
     Returns:
         Tuple of (dividends_df, splits_df) as Polars DataFrames
     """
+    import yfinance as yf
+
     ticker = yf.Ticker(symbol)
     
     # Get dividends
@@ -0,0 +1,204 @@
+"""
+Memory-budgeted dtype policy for PyStockBot feature frames
+
+Feature engineering produces hundreds of Float64 columns, Int32/Int64 flags and
+repeated event-name strings. This module downcasts them according to a
+DtypePolicyConfig (Float32 features, Int8 flags, UInt8 calendar columns,
+Categorical event names) and reports the effect on memory and model metrics.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import polars as pl
+
+from config import DtypePolicyConfig
+
+CALENDAR_COLUMNS = ["day_of_week", "day_of_month", "month", "week_of_year"]
+FLAG_PATTERNS = ["_gt_", "is_not_null_", "_divergence"]
+
+
+def _resolve_dtype(name: str) -> pl.DataType:
+    """Resolve a dtype name from the config (e.g. 'Float32') to a Polars dtype"""
+    try:
+        return getattr(pl, name)
+    except AttributeError:
+        raise ValueError(f"Unknown Polars dtype in dtype policy: {name}") from None
+
+
+def classify_column(name: str, dtype: pl.DataType, config: DtypePolicyConfig) -> str:
+    """
+    Classify a column for the dtype policy
+
+    Returns:
+        One of 'keep', 'event_name', 'event_sentiment', 'flag', 'calendar',
+        'year' or 'float'
+    """
+    if name in config.keep_columns or not (dtype.is_numeric() or dtype == pl.Utf8):
+        return 'keep'
+    if name.endswith("_event_name"):
+        return 'event_name'
+    if name.endswith("_event_sentiment"):
+        return 'event_sentiment'
+    if any(pattern in name for pattern in FLAG_PATTERNS):
+        return 'flag'
+    if name in CALENDAR_COLUMNS:
+        return 'calendar'
+    if name == "year":
+        return 'year'
+    if dtype.is_numeric():
+        return 'float'
+    return 'keep'
+
+
+def build_cast_expressions(schema: Dict[str, pl.DataType], config: DtypePolicyConfig) -> List[pl.Expr]:
+    """Build the cast expressions the policy applies to a frame with this schema"""
+    target_dtypes = {
+        'event_name': _resolve_dtype(config.event_name_dtype),
+        'event_sentiment': _resolve_dtype(config.flag_dtype),
+        'flag': _resolve_dtype(config.flag_dtype),
+        'calendar': _resolve_dtype(config.calendar_dtype),
+        'year': _resolve_dtype(config.year_dtype),
+        'float': _resolve_dtype(config.float_dtype),
+    }
+
+    expressions = []
+    for name, dtype in schema.items():
+        target = target_dtypes.get(classify_column(name, dtype, config))
+        if target is not None and dtype != target:
+            expressions.append(pl.col(name).cast(target))
+    return expressions
+
+
+def apply_dtype_policy(df: pl.DataFrame, config: Optional[DtypePolicyConfig] = None) -> pl.DataFrame:
+    """
+    Downcast feature columns according to the dtype policy
+
+    Args:
+        df: Feature DataFrame (output of create_comprehensive_features)
+        config: Dtype policy configuration (defaults to DtypePolicyConfig())
+
+    Returns:
+        DataFrame with compact dtypes; column order is unchanged
+    """
+    config = config or DtypePolicyConfig()
+    expressions = build_cast_expressions(df.schema, config)
+    return df.with_columns(expressions) if expressions else df
+
+
+@dataclass
+class DtypeValidationReport:
+    """Memory savings and model metric impact of a dtype policy"""
+    bytes_before: int
+    bytes_after: int
+    metrics: pl.DataFrame
+
+    @property
+    def memory_ratio(self) -> float:
+        """Compact size as a fraction of the original size"""
+        return self.bytes_after / self.bytes_before if self.bytes_before else 1.0
+
+    @property
+    def max_abs_metric_diff(self) -> float:
+        """Largest absolute metric change across targets"""
+        return self.metrics["abs_diff"].max() if self.metrics.height else 0.0
+
+    def __str__(self) -> str:
+        lines = [
+            f"Memory: {self.bytes_before / 1e6:.2f} MB -> {self.bytes_after / 1e6:.2f} MB "
+            f"({self.memory_ratio:.1%} of original)",
+            f"Max absolute metric difference: {self.max_abs_metric_diff:.6f}",
+            str(self.metrics),
+        ]
+        return "\n".join(lines)
+
+    def __repr__(self) -> str:
+        return (f"DtypeValidationReport(bytes_before={self.bytes_before}, "
+                f"bytes_after={self.bytes_after}, metrics={self.metrics.height} rows)")
+
+
+def _compare_results(baseline: Dict, compact: Dict) -> pl.DataFrame:
+    """Compare metrics of two ModelTrainer result dictionaries"""
+    rows = []
+    for target, base_result in baseline.items():
+        compact_result = compact.get(target, {})
+        for metric, base_value in base_result.items():
+            compact_value = compact_result.get(metric)
+            if metric in ('model', 'type', 'tuned') or compact_value is None:
+                continue
+            rows.append({
+                'target': target,
+                'metric': metric,
+                'baseline_model': type(base_result['model']).__name__,
+                'policy_model': type(compact_result['model']).__name__,
+                'float64': float(base_value),
+                'policy': float(compact_value),
+                'abs_diff': abs(float(compact_value) - float(base_value)),
+            })
+    return pl.DataFrame(rows, schema={
+        'target': pl.Utf8, 'metric': pl.Utf8, 'baseline_model': pl.Utf8, 'policy_model': pl.Utf8,
+        'float64': pl.Float64, 'policy': pl.Float64, 'abs_diff': pl.Float64,
+    })
+
+
+def validate_dtype_policy(df: pl.DataFrame,
+                          regression_targets: List[str],
+                          classification_targets: List[str],
+                          config: Optional[DtypePolicyConfig] = None,
+                          random_state: int = 42) -> DtypeValidationReport:
+    """
+    Train models on the original and the policy-compacted frame and compare
+
+    Args:
+        df: Feature DataFrame with target columns
+        regression_targets: Regression target columns
+        classification_targets: Classification target columns
+        config: Dtype policy to validate
+        random_state: Random state shared by both training runs
+
+    Returns:
+        DtypeValidationReport with memory sizes and per-metric differences
+    """
+    from model_training import ModelTrainer
+
+    config = config or DtypePolicyConfig()
+    compact_df = apply_dtype_policy(df, config)
+
+    baseline = ModelTrainer(random_state=random_state).train_all_models(
+        df, regression_targets=regression_targets, classification_targets=classification_targets
+    )
+    compact = ModelTrainer(random_state=random_state, feature_dtype=config.training_dtype).train_all_models(
+        compact_df, regression_targets=regression_targets, classification_targets=classification_targets
+    )
+
+    return DtypeValidationReport(
+        bytes_before=df.estimated_size(),
+        bytes_after=compact_df.estimated_size(),
+        metrics=_compare_results(baseline, compact),
+    )
+
+
+if __name__ == "__main__":
+    # Example usage on synthetic data
+    import numpy as np
+    from feature_engineering import create_comprehensive_features
+
+    dates = pl.date_range(pl.date(2020, 1, 1), pl.date(2023, 12, 31), "1d", eager=True)
+    np.random.seed(42)
+    prices = np.cumsum(np.random.randn(len(dates)) * 0.5) + 100
+
+    df = pl.DataFrame({
+        'date': dates,
+        'close': prices,
+        'open': prices + np.random.randn(len(dates)) * 0.5,
+        'high': prices + np.abs(np.random.randn(len(dates)) * 1.0),
+        'low': prices - np.abs(np.random.randn(len(dates)) * 1.0),
+        'volume': np.random.randint(1000000, 10000000, len(dates))
+    })
+    df = create_comprehensive_features(df)
+    df = df.with_columns([
+        ((pl.col("close").shift(-1) - pl.col("close")) / pl.col("close") * 100).alias("target_return_1d"),
+        (pl.col("close").shift(-1) > pl.col("close")).cast(pl.Int32).alias("target_direction_1d")
+    ]).head(-1)
+
+    report = validate_dtype_policy(df, ["target_return_1d"], ["target_direction_1d"])
+    print(report)
@@ -0,0 +1,279 @@
+"""
+Out-of-core XGBoost training from the parquet feature store
+
+prepare_data_for_training materializes the whole cleaned feature matrix, which
+caps pooled cross-symbol training at available RAM. This module streams
+record batches from one or more (partitioned) parquet files through an
+xgboost.DataIter instead. With disk_cache the quantized matrix is paged to
+disk (external memory), otherwise it is held as a compact QuantileDMatrix;
+either way only one float batch is alive at a time.
+
+Boosting parameters are taken from the same XGBoost estimator ModelTrainer
+would fit, so streaming the same rows produces the same trees as in-memory
+training. The booster is loaded back into that estimator, so predict_frame,
+backtesting and the manifest work unchanged.
+"""
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import polars as pl
+import xgboost as xgb
+
+from config import ExternalMemoryConfig
+from incremental_training import training_record
+
+
+def resolve_parquet_sources(source: Union[str, Path, List[str]]) -> List[str]:
+    """Expand a parquet file, a directory of (hive-partitioned) files or a list of files"""
+    if isinstance(source, (list, tuple)):
+        return [str(path) for path in source]
+    source = Path(source)
+    if source.is_dir():
+        paths = sorted(str(path) for path in source.rglob("*.parquet"))
+        if not paths:
+            raise ValueError(f"No parquet files found under {source}")
+        return paths
+    return [str(source)]
+
+
+def iter_training_batches(paths: List[str], feature_columns: List[str], target: str,
+                          batch_rows: int = 100000, holdout_every: int = 0,
+                          holdout: bool = False) -> Iterator[Tuple[np.ndarray, np.ndarray, pl.DataFrame]]:
+    """
+    Yield (features, labels, ids) batches with null rows removed
+
+    Rows are numbered after null removal; with holdout_every = n every n-th
+    row belongs to the holdout set, which is yielded instead of the training
+    rows when holdout is True.
+    """
+    import pyarrow.parquet as pq
+
+    cast_exprs = pl.col(feature_columns).cast(pl.Float32)
+    row_offset = 0
+    for path in paths:
+        parquet_file = pq.ParquetFile(path)
+        id_columns = ['date'] if 'date' in parquet_file.schema_arrow.names else []
+        columns = id_columns + feature_columns + [target]
+
+        for record_batch in parquet_file.iter_batches(batch_size=batch_rows, columns=columns):
+            frame = pl.from_arrow(record_batch).drop_nulls(feature_columns + [target])
+            if holdout_every:
+                is_holdout = (np.arange(row_offset, row_offset + frame.height) % holdout_every) == 0
+                row_offset += frame.height
+                frame = frame.filter(pl.Series(is_holdout if holdout else ~is_holdout))
+            if frame.height:
+                yield (frame.select(cast_exprs).to_numpy(), frame.get_column(target).to_numpy(),
+                       frame.select(id_columns))
+
+
+class ParquetBatchIter(xgb.DataIter):
+    """XGBoost data iterator over parquet record batches"""
+
+    def __init__(self, paths: List[str], feature_columns: List[str], target: str,
+                 batch_rows: int = 100000, holdout_every: int = 0,
+                 cache_prefix: Optional[str] = None):
+        self.paths = paths
+        self.feature_columns = feature_columns
+        self.target = target
+        self.batch_rows = batch_rows
+        self.holdout_every = holdout_every
+        self.rows = 0
+        self.max_date = None
+        self._pass_rows = 0
+        self._batches = None
+        super().__init__(cache_prefix=cache_prefix)
+
+    def __repr__(self) -> str:
+        return f"ParquetBatchIter(files={len(self.paths)}, target='{self.target}', batch_rows={self.batch_rows})"
+
+    def next(self, input_data) -> int:
+        """Feed the next batch to XGBoost; return 0 when the pass is complete"""
+        if self._batches is None:
+            self.reset()
+        batch = next(self._batches, None)
+        if batch is None:
+            self.rows = self._pass_rows
+            return 0
+
+        features, labels, ids = batch
+        self._pass_rows += len(labels)
+        if ids.width:
+            batch_max = ids.get_column('date').max()
+            self.max_date = batch_max if self.max_date is None else max(self.max_date, batch_max)
+        input_data(data=features, label=labels)
+        return 1
+
+    def reset(self):
+        """Restart the pass over all files"""
+        self._pass_rows = 0
+        self._batches = iter_training_batches(
+            self.paths, self.feature_columns, self.target, self.batch_rows, self.holdout_every
+        )
+
+
+def evaluate_streaming(model: Any, batches: Iterator[Tuple[np.ndarray, np.ndarray, pl.DataFrame]],
+                       task_type: str) -> Dict[str, float]:
+    """
+    Holdout metrics accumulated batch by batch
+
+    Returns the same metric keys as ModelTrainer (without cross-validation):
+    mse/mae/r2 for regression, accuracy and weighted precision/recall/f1 for
+    classification, plus main_score.
+    """
+    if task_type == 'regression':
+        n, sum_y, sum_y2, sse, sae = 0, 0.0, 0.0, 0.0, 0.0
+        for features, labels, _ in batches:
+            errors = model.predict(features) - labels
+            n += len(labels)
+            sum_y += labels.sum()
+            sum_y2 += (labels ** 2).sum()
+            sse += (errors ** 2).sum()
+            sae += np.abs(errors).sum()
+        if n == 0:
+            return {}
+        total = sum_y2 - sum_y ** 2 / n
+        r2 = 1.0 - sse / total if total > 0 else 0.0
+        return {'mse': sse / n, 'mae': sae / n, 'r2': r2, 'main_score': r2}
+
+    n_classes = len(model.classes_)
+    confusion = np.zeros((n_classes, n_classes), dtype=np.int64)
+    for features, labels, _ in batches:
+        np.add.at(confusion, (labels.astype(int), model.predict(features).astype(int)), 1)
+    if confusion.sum() == 0:
+        return {}
+
+    support = confusion.sum(axis=1)
+    true_positive = np.diag(confusion)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.nan_to_num(true_positive / confusion.sum(axis=0))
+        recall = np.nan_to_num(true_positive / support)
+        f1 = np.nan_to_num(2 * precision * recall / (precision + recall))
+    weights = support / support.sum()
+    return {
+        'accuracy': true_positive.sum() / confusion.sum(),
+        'precision': float(precision @ weights),
+        'recall': float(recall @ weights),
+        'f1': float(f1 @ weights),
+        'main_score': float(f1 @ weights),
+    }
+
+
+def train_xgboost_booster(paths: List[str], feature_columns: List[str], target: str, task_type: str,
+                          estimator: Any, config: ExternalMemoryConfig) -> Tuple[xgb.Booster, ParquetBatchIter]:
+    """
+    Boost one target from streamed parquet batches with the estimator's parameters
+
+    Returns:
+        Tuple of (booster, iterator) - the iterator reports rows and latest date seen
+    """
+    params = {key: value for key, value in estimator.get_xgb_params().items() if value is not None}
+
+    with tempfile.TemporaryDirectory(dir=config.cache_dir, prefix="xgb_external_") as cache_dir:
+        cache_prefix = os.path.join(cache_dir, "pages") if config.disk_cache else None
+        batches = ParquetBatchIter(paths, feature_columns, target, config.batch_rows,
+                                   config.holdout_every, cache_prefix=cache_prefix)
+        dtrain = (xgb.DMatrix(batches) if config.disk_cache
+                  else xgb.QuantileDMatrix(batches, max_bin=params.get('max_bin', 256)))
+
+        if task_type == 'classification':
+            n_classes = len(np.unique(dtrain.get_label()))
+            if n_classes > 2:
+                params.update(objective='multi:softprob', num_class=n_classes)
+
+        booster = xgb.train(params, dtrain, num_boost_round=estimator.n_estimators)
+        del dtrain
+
+    return booster, batches
+
+
+def train_xgboost_external(trainer: Any, source: Union[str, Path, List[str]],
+                           regression_targets: Optional[List[str]] = None,
+                           classification_targets: Optional[List[str]] = None,
+                           feature_columns: Optional[List[str]] = None,
+                           config: Optional[ExternalMemoryConfig] = None) -> Dict[str, Any]:
+    """
+    Train XGBoost models for every target without materializing the feature matrix
+
+    Args:
+        trainer: ModelTrainer receiving the models (same result layout as train_all_models)
+        source: Parquet file, directory of partitioned parquet files or list of files
+        regression_targets: Regression target columns
+        classification_targets: Classification target columns
+        feature_columns: Explicit feature list; derived from the parquet schema when None
+        config: Batch size, holdout and cache settings
+
+    Returns:
+        Dictionary of trained models and streamed holdout metrics per target
+    """
+    config = config or ExternalMemoryConfig()
+    regression_targets = regression_targets or []
+    classification_targets = classification_targets or []
+    all_targets = regression_targets + classification_targets
+    if not all_targets:
+        raise ValueError("No targets specified for training")
+
+    paths = resolve_parquet_sources(source)
+    if feature_columns is None:
+        schema = pl.read_parquet_schema(paths[0])
+        feature_columns = trainer.get_feature_columns(pl.DataFrame(schema=schema), all_targets)
+    trainer.feature_names = feature_columns
+    print(f"Streaming {len(feature_columns)} features from {len(paths)} parquet file(s) "
+          f"in batches of {config.batch_rows} rows")
+
+    results = {}
+    task_types = [(target, 'regression') for target in regression_targets] + \
+                 [(target, 'classification') for target in classification_targets]
+    for target, task_type in task_types:
+        estimator = trainer._get_model_configs(task_type)['xgboost']
+        booster, batches = train_xgboost_booster(paths, feature_columns, target, task_type, estimator, config)
+        estimator.load_model(bytearray(booster.save_raw('ubj')))
+
+        metrics = {}
+        if config.holdout_every:
+            holdout = iter_training_batches(paths, feature_columns, target, config.batch_rows,
+                                            config.holdout_every, holdout=True)
+            metrics = evaluate_streaming(estimator, holdout, task_type)
+
+        importance = sorted(zip(feature_columns, estimator.feature_importances_), key=lambda x: x[1], reverse=True)
+        trainer.feature_importance[target] = importance[:20]
+        results[target] = {
+            'model': estimator,
+            **metrics,
+            'type': task_type,
+            'tuned': False,
+            **training_record('full', batches.max_date, batches.max_date, 0,
+                              update_method='external_memory', train_rows=batches.rows),
+        }
+        print(f"  {target}: {batches.rows} training rows, main score {metrics.get('main_score', float('nan')):.4f}")
+
+    trainer.models.update(results)
+    return results
+
+
+if __name__ == "__main__":
+    # Example: pooled training over a hive-partitioned store, one file per symbol
+    import time
+    from model_training import ModelTrainer
+
+    np.random.seed(42)
+    n_rows, n_features = 50000, 60
+    coefficients = np.random.randn(5)
+    with tempfile.TemporaryDirectory() as store:
+        for i in range(8):
+            features = np.random.randn(n_rows, n_features).astype(np.float32)
+            target = features[:, :5] @ coefficients + np.random.randn(n_rows)
+            partition = Path(store) / f"symbol=SYM{i}"
+            partition.mkdir()
+            pl.DataFrame({f"f{j}": features[:, j] for j in range(n_features)}).with_columns(
+                pl.Series('target_return_1d', target),
+                pl.Series('target_direction_1d', (target > 0).astype(np.int32)),
+            ).write_parquet(partition / "part-0.parquet", row_group_size=25000)
+
+        start = time.perf_counter()
+        trainer = ModelTrainer()
+        train_xgboost_external(trainer, store, ['target_return_1d'], ['target_direction_1d'],
+                               config=ExternalMemoryConfig(batch_rows=25000))
+        print(f"Out-of-core training on {8 * n_rows:,} rows in {time.perf_counter() - start:.1f}s")
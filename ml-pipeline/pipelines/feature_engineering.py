@@ -5,6 +5,49 @@ import polars as pl
 import numpy as np
 from typing import List, Optional
 
+# Feature set built by create_comprehensive_features (shared with feature_plan)
+PRICE_COLUMNS = ["open", "close", "high", "low"]
+ALL_COLUMNS = PRICE_COLUMNS + ["volume"]
+DATE_FEATURES = {
+    "day_of_week": pl.col("date").dt.weekday(),
+    "day_of_month": pl.col("date").dt.day(),
+    "month": pl.col("date").dt.month(),
+    "year": pl.col("date").dt.year(),
+    "week_of_year": pl.col("date").dt.week(),
+}
+PCT_CHANGE_PERIODS = [1, 2, 3, 5, 10, 20]
+ROLLING_WINDOWS = [5, 10, 20, 50]
+MAX_LAG = 10
+RETURN_LAG_COLUMN = "close_pct_change_1"
+RETURN_LAGS = [1, 2, 3, 5, 7, 10, 15, 20, 30]
+INTERACTION_PAIRS = [
+    ("open", "close"),
+    ("high", "low"),
+    ("close", "volume"),
+    ("close_pct_change_1", "volume_pct_change_1")
+]
+COMPARISON_PAIRS = [
+    ("close", "open"),
+    ("close", "close_rolling_mean_20"),
+    ("volume", "volume_rolling_mean_20")
+]
+
+ROLLING_STATS = [
+    ('rolling_mean', lambda col, win: pl.col(col).rolling_mean(win)),
+    ('rolling_std', lambda col, win: pl.col(col).rolling_std(win)),
+    ('rolling_min', lambda col, win: pl.col(col).rolling_min(win)),
+    ('rolling_max', lambda col, win: pl.col(col).rolling_max(win)),
+    ('rolling_median', lambda col, win: pl.col(col).rolling_median(win)),
+    ('rolling_q25', lambda col, win: pl.col(col).rolling_quantile(0.25, window_size=win)),
+    ('rolling_q75', lambda col, win: pl.col(col).rolling_quantile(0.75, window_size=win))
+]
+
+INTERACTION_TYPES = [
+    ('x', lambda c1, c2: pl.col(c1) * pl.col(c2)),
+    ('div', lambda c1, c2: pl.col(c1) / pl.col(c2)),
+    ('minus', lambda c1, c2: pl.col(c1) - pl.col(c2))
+]
+
 
 def forward_fill_with_decay(df: pl.DataFrame, column: str, decay_factor: float = 0.99) -> pl.DataFrame:
     """
@@ -204,21 +247,11 @@ def rolling_statistics_features(df: pl.DataFrame, columns: List[str],
     Returns:
         DataFrame with rolling statistics features
     """
-    stats_funcs = [
-        ('rolling_mean', lambda col, win: pl.col(col).rolling_mean(win)),
-        ('rolling_std', lambda col, win: pl.col(col).rolling_std(win)),
-        ('rolling_min', lambda col, win: pl.col(col).rolling_min(win)),
-        ('rolling_max', lambda col, win: pl.col(col).rolling_max(win)),
-        ('rolling_median', lambda col, win: pl.col(col).rolling_median(win)),
-        ('rolling_q25', lambda col, win: pl.col(col).rolling_quantile(0.25, window_size=win)),
-        ('rolling_q75', lambda col, win: pl.col(col).rolling_quantile(0.75, window_size=win))
-    ]
-    
     return df.with_columns([
         stat_func(column, window).alias(f"{column}_{stat_name}_{window}")
         for column in columns
         for window in windows
-        for stat_name, stat_func in stats_funcs
+        for stat_name, stat_func in ROLLING_STATS
     ])
 
 
@@ -276,16 +309,10 @@ def interaction_features(df: pl.DataFrame, column_pairs: List[tuple]) -> pl.Data
     Returns:  
         DataFrame with interaction features
     """
-    interaction_types = [
-        ('x', lambda c1, c2: pl.col(c1) * pl.col(c2)),
-        ('div', lambda c1, c2: pl.col(c1) / pl.col(c2)),
-        ('minus', lambda c1, c2: pl.col(c1) - pl.col(c2))
-    ]
-    
     return df.with_columns([
         func(col1, col2).alias(f"{col1}_{name}_{col2}")
         for col1, col2 in column_pairs
-        for name, func in interaction_types
+        for name, func in INTERACTION_TYPES
     ])
 
 
@@ -307,32 +334,22 @@ Returns:
     """
     print("Creating comprehensive features...")
     
-    # Base price columns
-    price_cols = ["open", "close", "high", "low"]
-    all_cols = price_cols + ["volume"]
-    
     # 1. Date features
     print("  Adding date features...")
-    df = df.with_columns([
-        pl.col("date").dt.weekday().alias("day_of_week"),
-        pl.col("date").dt.day().alias("day_of_month"), 
-        pl.col("date").dt.month().alias("month"),
-        pl.col("date").dt.year().alias("year"),
-        pl.col("date").dt.week().alias("week_of_year")
-    ])
+    df = df.with_columns([expr.alias(name) for name, expr in DATE_FEATURES.items()])
     
     # 2. Basic percentage changes
     print("  Adding percentage change features...")
-    df = pct_change_features(df, price_cols, [1, 2, 3, 5, 10, 20])
+    df = pct_change_features(df, PRICE_COLUMNS, PCT_CHANGE_PERIODS)
     
     # 3. Rolling statistics
     print("  Adding rolling statistics...")
-    df = rolling_statistics_features(df, all_cols, [5, 10, 20, 50])
+    df = rolling_statistics_features(df, ALL_COLUMNS, ROLLING_WINDOWS)
     
     # 4. Lag features (extensive)
     print("  Adding lag features...")
-    df = comprehensive_lag_features(df, all_cols, max_lag=10)
-    df = comprehensive_lag_features(df, ["close_pct_change_1"], specific_lags=[1, 2, 3, 5, 7, 10, 15, 20, 30])
+    df = comprehensive_lag_features(df, ALL_COLUMNS, max_lag=MAX_LAG)
+    df = comprehensive_lag_features(df, [RETURN_LAG_COLUMN], specific_lags=RETURN_LAGS)
     
     # 5. Apply events using functional approach
     event_configs = [
@@ -359,14 +376,8 @@ Returns:
     # 6. Interaction features for important pairs
     print("  Adding interaction features...")
     # Only use pairs where both columns exist
-    potential_pairs = [
-        ("open", "close"),
-        ("high", "low"),
-        ("close", "volume"),
-        ("close_pct_change_1", "volume_pct_change_1")
-    ]
     important_pairs = [
-        (col1, col2) for col1, col2 in potential_pairs 
+        (col1, col2) for col1, col2 in INTERACTION_PAIRS 
         if col1 in df.columns and col2 in df.columns
     ]
     if important_pairs:
@@ -374,13 +385,8 @@ Returns:
     
     # 7. Comparison features
     print("  Adding comparison features...")
-    potential_comparison_pairs = [
-        ("close", "open"),
-        ("close", "close_rolling_mean_20"),
-        ("volume", "volume_rolling_mean_20")
-    ]
     comparison_pairs = [
-        (col1, col2) for col1, col2 in potential_comparison_pairs 
+        (col1, col2) for col1, col2 in COMPARISON_PAIRS 
         if col1 in df.columns and col2 in df.columns
     ]
     if comparison_pairs:
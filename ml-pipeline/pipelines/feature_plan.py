@@ -0,0 +1,309 @@
+"""
+Projection-pushdown feature computation for inference
+
+apply_all_technical_indicators and create_comprehensive_features always build
+the full feature set. At inference time a model only needs the features it was
+trained on (see ModelTrainer.feature_names), so this module describes every
+output column as a FeatureSpec with declared inputs, resolves the dependency
+closure of a requested feature list, and computes only those specs, in the
+same order as the full build so values are identical.
+"""
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import polars as pl
+
+import technical_indicators as ti
+from feature_engineering import (
+    ALL_COLUMNS, COMPARISON_PAIRS, DATE_FEATURES, INTERACTION_PAIRS, INTERACTION_TYPES,
+    MAX_LAG, PCT_CHANGE_PERIODS, PRICE_COLUMNS, RETURN_LAG_COLUMN, RETURN_LAGS,
+    ROLLING_STATS, ROLLING_WINDOWS, apply_event_features, is_not_null_features,
+)
+
+BASE_COLUMNS = ["date", "open", "high", "low", "close", "volume"]
+
+
+@dataclass
+class FeatureSpec:
+    """One unit of feature computation: either Polars expressions or a frame function"""
+    name: str
+    outputs: Tuple[str, ...]
+    inputs: Tuple[str, ...]
+    exprs: List[pl.Expr] = field(default_factory=list)
+    compute: Optional[Callable[[pl.DataFrame], pl.DataFrame]] = None
+
+    def __repr__(self) -> str:
+        return f"FeatureSpec(name='{self.name}', outputs={len(self.outputs)}, inputs={list(self.inputs)})"
+
+
+def _expr_spec(name: str, expr: pl.Expr, inputs: Sequence[str]) -> FeatureSpec:
+    """Spec producing a single column from one expression"""
+    return FeatureSpec(name=name, outputs=(name,), inputs=tuple(inputs), exprs=[expr.alias(name)])
+
+
+def _frame_spec(name: str, func: Callable, outputs: Sequence[str], inputs: Sequence[str]) -> FeatureSpec:
+    """Spec wrapping an existing DataFrame -> DataFrame indicator function"""
+    return FeatureSpec(name=name, outputs=tuple(outputs), inputs=tuple(inputs), compute=func)
+
+
+def _indicator_specs(target_columns: List[str], windows: List[int]) -> List[FeatureSpec]:
+    """Specs mirroring apply_all_technical_indicators, in the same order"""
+    specs = []
+    for column in target_columns:
+        for window in windows:
+            specs.append(_frame_spec(f"{column}_sma_{window}", partial(ti.simple_moving_average, column=column, window=window),
+                                     [f"{column}_sma_{window}"], [column]))
+    for column in target_columns:
+        for window in windows:
+            specs.append(_frame_spec(f"{column}_ema_{window}", partial(ti.exponential_moving_average, column=column, window=window),
+                                     [f"{column}_ema_{window}"], [column]))
+    for column in target_columns:
+        for window in windows:
+            specs.append(_frame_spec(f"volatility_{column}_{window}", partial(ti.volatility, column=column, window=window),
+                                     [f"volatility_{column}_{window}", f"volatility_pct_{column}_{window}"], [column]))
+
+    for window in windows:
+        specs.append(_frame_spec(f"rsi_{window}", partial(ti.relative_strength_index, column="close", window=window),
+                                 [f"rsi_{window}"], ["close"]))
+    for window in windows:
+        outputs = [f"close_bb_{part}_{window}" for part in ("middle", "std", "upper", "lower")]
+        specs.append(_frame_spec(f"close_bb_{window}", partial(ti.bollinger_bands, column="close", window=window),
+                                 outputs, ["close"]))
+
+    window_indicators = [
+        (ti.stochastic_oscillator, "stoch_k", ["close", "high", "low"]),
+        (ti.williams_r, "williams_r", ["close", "high", "low"]),
+        (ti.money_flow_index, "mfi", ["close", "high", "low", "volume"]),
+        (ti.volume_weighted_average_price, "vwap", ["close", "high", "low", "volume"]),
+    ]
+    for func, prefix, inputs in window_indicators:
+        for window in windows:
+            specs.append(_frame_spec(f"{prefix}_{window}", partial(func, window=window), [f"{prefix}_{window}"], inputs))
+
+    specs.extend([
+        _frame_spec("macd", ti.macd, ["ema_12", "ema_26", "macd_12_26", "macd_signal_9", "macd_histogram_12_26_9"], ["close"]),
+        _frame_spec("atr_14", ti.average_true_range, ["atr_14"], ["close", "high", "low"]),
+        _frame_spec("adx_14", ti.adx, ["adx_14"], ["close", "high", "low"]),
+        _frame_spec("obv", ti.on_balance_volume, ["obv"], ["close", "volume"]),
+        _frame_spec("fib", ti.fibonacci_retracement, [f"fib_{level}" for level in (0.236, 0.382, 0.618, 1.0)],
+                    ["high", "low"]),
+    ])
+    return specs
+
+
+def _event_specs(events_df: Optional[pl.DataFrame], dividends_df: Optional[pl.DataFrame],
+                 splits_df: Optional[pl.DataFrame]) -> List[FeatureSpec]:
+    """Specs mirroring the event step of create_comprehensive_features"""
+    event_configs = [
+        (events_df, "general_events", 0.99, False),
+        (dividends_df, "dividends", 0.95, True),
+        (splits_df, "splits", 0.95, True),
+    ]
+
+    specs = []
+    for event_df, prefix, decay, null_flags in event_configs:
+        if event_df is None or event_df.is_empty():
+            continue
+
+        outputs = [f"{prefix}_event_{part}" for part in ("name", "value", "sentiment", "decay")]
+        null_check_cols = [f"{prefix}_event_value", f"{prefix}_event_sentiment"] if null_flags else []
+        outputs += [f"is_not_null_{col}" for col in null_check_cols]
+
+        def compute(df: pl.DataFrame, event_df=event_df, prefix=prefix, decay=decay,
+                    null_check_cols=null_check_cols) -> pl.DataFrame:
+            df = apply_event_features(df, event_df, prefix, decay_factor=decay)
+            return is_not_null_features(df, null_check_cols) if null_check_cols else df
+
+        specs.append(_frame_spec(prefix, compute, outputs, ["date"]))
+    return specs
+
+
+def _engineering_specs(available: set, events_df: Optional[pl.DataFrame],
+                       dividends_df: Optional[pl.DataFrame],
+                       splits_df: Optional[pl.DataFrame]) -> List[FeatureSpec]:
+    """Specs mirroring create_comprehensive_features, in the same order"""
+    specs = [_expr_spec(name, expr, ["date"]) for name, expr in DATE_FEATURES.items()]
+
+    specs += [
+        _expr_spec(f"{column}_pct_change_{period}", pl.col(column).pct_change(period), [column])
+        for column in PRICE_COLUMNS
+        for period in PCT_CHANGE_PERIODS
+    ]
+    specs += [
+        _expr_spec(f"{column}_{stat_name}_{window}", stat_func(column, window), [column])
+        for column in ALL_COLUMNS
+        for window in ROLLING_WINDOWS
+        for stat_name, stat_func in ROLLING_STATS
+    ]
+    specs += [
+        _expr_spec(f"{column}_lag_{lag}", pl.col(column).shift(lag), [column])
+        for column in ALL_COLUMNS
+        for lag in range(1, MAX_LAG + 1)
+    ]
+    specs += [
+        _expr_spec(f"{RETURN_LAG_COLUMN}_lag_{lag}", pl.col(RETURN_LAG_COLUMN).shift(lag), [RETURN_LAG_COLUMN])
+        for lag in RETURN_LAGS
+    ]
+    specs += _event_specs(events_df, dividends_df, splits_df)
+
+    # Pairs are only built when both columns exist in the full feature set
+    available = available | {output for spec in specs for output in spec.outputs}
+    specs += [
+        _expr_spec(f"{col1}_{name}_{col2}", func(col1, col2), [col1, col2])
+        for col1, col2 in INTERACTION_PAIRS
+        if col1 in available and col2 in available
+        for name, func in INTERACTION_TYPES
+    ]
+    specs += [
+        _expr_spec(f"{col1}_gt_{col2}", (pl.col(col1) > pl.col(col2)).cast(pl.Int32), [col1, col2])
+        for col1, col2 in COMPARISON_PAIRS
+        if col1 in available and col2 in available
+    ]
+    return specs
+
+
+def build_feature_catalog(target_columns: Optional[List[str]] = None,
+                          windows: Optional[List[int]] = None,
+                          events_df: Optional[pl.DataFrame] = None,
+                          dividends_df: Optional[pl.DataFrame] = None,
+                          splits_df: Optional[pl.DataFrame] = None,
+                          base_columns: Optional[List[str]] = None) -> List[FeatureSpec]:
+    """
+    Describe the full indicator + feature build as an ordered list of specs
+
+    Args:
+        target_columns: Columns passed to apply_all_technical_indicators
+        windows: Windows passed to apply_all_technical_indicators
+        events_df, dividends_df, splits_df: Event frames as in create_comprehensive_features
+        base_columns: Raw input columns (OHLCV + date)
+
+    Returns:
+        Specs in full-build order (a valid topological order)
+    """
+    target_columns = target_columns or ["close", "open", "high", "low", "volume"]
+    windows = windows or [7, 14, 30]
+    base_columns = base_columns or BASE_COLUMNS
+
+    specs = _indicator_specs(target_columns, windows)
+    available = set(base_columns) | {output for spec in specs for output in spec.outputs}
+    return specs + _engineering_specs(available, events_df, dividends_df, splits_df)
+
+
+def plan_features(requested: List[str], catalog: List[FeatureSpec],
+                  base_columns: Optional[List[str]] = None) -> List[FeatureSpec]:
+    """
+    Resolve the minimal ordered list of specs producing the requested features
+
+    Raises:
+        ValueError: If a requested feature (or one of its inputs) has no producer
+    """
+    base_columns = set(base_columns or BASE_COLUMNS)
+    producers: Dict[str, int] = {}
+    for index, spec in enumerate(catalog):
+        for output in spec.outputs:
+            producers.setdefault(output, index)
+
+    unknown = [name for name in requested if name not in producers and name not in base_columns]
+    if unknown:
+        raise ValueError(f"No producer for requested features: {unknown}")
+
+    needed, stack = set(), [name for name in requested if name not in base_columns]
+    while stack:
+        index = producers[stack.pop()]
+        if index in needed:
+            continue
+        needed.add(index)
+        for column in catalog[index].inputs:
+            if column in base_columns:
+                continue
+            if column not in producers:
+                raise ValueError(f"No producer for input column '{column}' of {catalog[index].name}")
+            stack.append(column)
+
+    return [catalog[index] for index in sorted(needed)]
+
+
+def execute_plan(df: pl.DataFrame, plan: List[FeatureSpec]) -> pl.DataFrame:
+    """
+    Apply planned specs, batching consecutive independent expressions into one
+    with_columns call so Polars evaluates them in parallel
+    """
+    pending: List[pl.Expr] = []
+    pending_outputs: set = set()
+
+    for spec in plan:
+        if spec.compute is not None or pending_outputs.intersection(spec.inputs):
+            if pending:
+                df = df.with_columns(pending)
+                pending, pending_outputs = [], set()
+        if spec.compute is not None:
+            df = spec.compute(df)
+        else:
+            pending.extend(spec.exprs)
+            pending_outputs.update(spec.outputs)
+
+    return df.with_columns(pending) if pending else df
+
+
+def compute_features(df: pl.DataFrame, requested: List[str],
+                     target_columns: Optional[List[str]] = None,
+                     windows: Optional[List[int]] = None,
+                     events_df: Optional[pl.DataFrame] = None,
+                     dividends_df: Optional[pl.DataFrame] = None,
+                     splits_df: Optional[pl.DataFrame] = None,
+                     keep_columns: Optional[List[str]] = None) -> pl.DataFrame:
+    """
+    Compute only the requested features (plus their dependencies)
+
+    Columns already in df (e.g. indicators read from the indicator store) are
+    reused instead of recomputed.
+
+    Args:
+        df: OHLCV DataFrame with a date column, optionally with precomputed features
+        requested: Feature names, e.g. ModelTrainer.feature_names
+        target_columns, windows: Indicator parameters used when the model was trained
+        events_df, dividends_df, splits_df: Optional event frames
+        keep_columns: Extra columns to keep in the output (default: ['date'])
+
+    Returns:
+        DataFrame with keep_columns followed by the requested features
+    """
+    catalog = build_feature_catalog(target_columns, windows, events_df, dividends_df, splits_df)
+    plan = plan_features(requested, catalog, base_columns=df.columns)
+    print(f"Feature plan: {len(plan)} of {len(catalog)} specs for {len(requested)} features")
+
+    keep_columns = keep_columns if keep_columns is not None else ["date"]
+    return execute_plan(df, plan).select(keep_columns + [col for col in requested if col not in keep_columns])
+
+
+if __name__ == "__main__":
+    # Example: compare a top-20 projection with the full build
+    import time
+    import numpy as np
+    from feature_engineering import create_comprehensive_features
+
+    dates = pl.date_range(pl.date(2010, 1, 1), pl.date(2023, 12, 31), "1d", eager=True)
+    np.random.seed(42)
+    prices = np.cumsum(np.random.randn(len(dates)) * 0.5) + 100
+
+    df = pl.DataFrame({
+        'date': dates,
+        'close': prices,
+        'open': prices + np.random.randn(len(dates)) * 0.5,
+        'high': prices + np.abs(np.random.randn(len(dates)) * 1.0),
+        'low': prices - np.abs(np.random.randn(len(dates)) * 1.0),
+        'volume': np.random.randint(1000000, 10000000, len(dates))
+    })
+
+    start = time.perf_counter()
+    full = create_comprehensive_features(ti.apply_all_technical_indicators(df))
+    full_time = time.perf_counter() - start
+
+    requested = [col for col in full.columns if col not in BASE_COLUMNS][::15][:20]
+    start = time.perf_counter()
+    projected = compute_features(df, requested)
+    projected_time = time.perf_counter() - start
+
+    print(f"Full build: {full_time:.3f}s, projected: {projected_time:.3f}s")
+    print(f"Identical: {projected.equals(full.select(projected.columns))}")
@@ -0,0 +1,212 @@
+"""
+Streaming feature selection for PyStockBot
+
+Feature engineering emits many near-duplicate columns (SMA vs rolling mean,
+OHLC lags, Fibonacci levels that are linear in high/low). This stage prunes
+them before training using statistics gathered in a single streaming pass
+over the feature store:
+
+1. constant filter      - variance at (or near) zero
+2. low-variance filter  - coefficient of variation below a threshold
+3. importance screen    - |correlation| with the targets, keep the strongest
+4. correlation filter   - greedily drop features highly correlated with a
+                          stronger feature that is already kept
+
+Only the running mean and cross-product matrix of the batch are held in
+memory, so the feature store never has to be materialized as one matrix.
+"""
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+
+import numpy as np
+import polars as pl
+
+from config import FeatureSelectionConfig
+
+
+class StreamingCovariance:
+    """Single-pass covariance using batched (Chan et al.) moment merging"""
+
+    def __init__(self, n_columns: int):
+        self.count = 0
+        self.mean = np.zeros(n_columns)
+        self.m2 = np.zeros((n_columns, n_columns))
+
+    def __repr__(self) -> str:
+        return f"StreamingCovariance(columns={self.mean.shape[0]}, count={self.count})"
+
+    def update(self, batch: np.ndarray):
+        """Merge a (rows, columns) batch; rows with any non-finite value are skipped"""
+        batch = batch[np.isfinite(batch).all(axis=1)]
+        batch_count = batch.shape[0]
+        if batch_count == 0:
+            return
+
+        batch_mean = batch.mean(axis=0)
+        centered = batch - batch_mean
+        batch_m2 = centered.T @ centered
+
+        total = self.count + batch_count
+        delta = batch_mean - self.mean
+        self.m2 += batch_m2 + np.outer(delta, delta) * (self.count * batch_count / total)
+        self.mean += delta * (batch_count / total)
+        self.count = total
+
+    @property
+    def covariance(self) -> np.ndarray:
+        """Sample covariance matrix"""
+        if self.count < 2:
+            raise ValueError("At least two complete rows are required for covariance")
+        return self.m2 / (self.count - 1)
+
+    @property
+    def variance(self) -> np.ndarray:
+        """Sample variance of every column"""
+        return np.diag(self.covariance).copy()
+
+    def correlation(self) -> np.ndarray:
+        """Pearson correlation matrix (zero for constant columns)"""
+        std = np.sqrt(self.variance)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = self.covariance / np.outer(std, std)
+        return np.nan_to_num(corr, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def iter_feature_batches(source: Union[pl.DataFrame, str, Path], columns: List[str],
+                         batch_rows: int = 50000) -> Iterator[np.ndarray]:
+    """
+    Yield float64 batches of the given columns from a DataFrame or parquet file
+
+    Parquet files are streamed row group by row group through pyarrow, so
+    only one batch of the requested columns is in memory at a time.
+    """
+    if isinstance(source, pl.DataFrame):
+        cast_exprs = pl.col(columns).cast(pl.Float64)
+        for start in range(0, source.height, batch_rows):
+            yield source.slice(start, batch_rows).select(cast_exprs).to_numpy()
+        return
+
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(str(source))
+    for record_batch in parquet_file.iter_batches(batch_size=batch_rows, columns=columns):
+        frame = pl.from_arrow(record_batch)
+        yield frame.select(pl.col(columns).cast(pl.Float64)).to_numpy()
+
+
+@dataclass
+class FeatureSelectionResult:
+    """Selected features and the reason every other feature was dropped"""
+    selected: List[str]
+    dropped: Dict[str, List[str]] = field(default_factory=dict)
+    scores: Dict[str, float] = field(default_factory=dict)
+    rows_used: int = 0
+
+    def __str__(self) -> str:
+        dropped = ", ".join(f"{reason}: {len(cols)}" for reason, cols in self.dropped.items())
+        return f"Selected {len(self.selected)} features from {self.rows_used} rows (dropped {dropped})"
+
+    def __repr__(self) -> str:
+        return f"FeatureSelectionResult(selected={len(self.selected)}, rows_used={self.rows_used})"
+
+    def to_dict(self) -> Dict[str, object]:
+        """JSON-friendly representation persisted with the models"""
+        return {
+            'selected': self.selected,
+            'dropped': self.dropped,
+            'scores': self.scores,
+            'rows_used': self.rows_used,
+        }
+
+
+def _greedy_decorrelate(order: np.ndarray, abs_corr: np.ndarray, threshold: float) -> List[int]:
+    """Keep features in priority order unless highly correlated with a kept one"""
+    kept: List[int] = []
+    for index in order:
+        if not kept or abs_corr[index, kept].max() < threshold:
+            kept.append(int(index))
+    return kept
+
+
+def select_features(source: Union[pl.DataFrame, str, Path],
+                    feature_columns: List[str],
+                    target_columns: List[str],
+                    config: Optional[FeatureSelectionConfig] = None) -> FeatureSelectionResult:
+    """
+    Select a compact, de-duplicated feature subset in one streaming pass
+
+    Args:
+        source: Feature DataFrame or path to the parquet feature store
+        feature_columns: Candidate feature columns
+        target_columns: Targets used for the correlation importance screen
+        config: Selection thresholds
+
+    Returns:
+        FeatureSelectionResult with selected features in priority order
+    """
+    config = config or FeatureSelectionConfig()
+    n_features = len(feature_columns)
+
+    moments = StreamingCovariance(n_features + len(target_columns))
+    for batch in iter_feature_batches(source, feature_columns + target_columns, config.batch_rows):
+        moments.update(batch)
+
+    variance = moments.variance[:n_features]
+    mean = moments.mean[:n_features]
+    corr = moments.correlation()
+    feature_corr = np.abs(corr[:n_features, :n_features])
+
+    # Importance pre-screen: strongest absolute correlation with any target
+    importance = np.abs(corr[:n_features, n_features:]).max(axis=1) if target_columns else variance
+
+    constant = variance <= config.constant_threshold
+    with np.errstate(divide='ignore', invalid='ignore'):
+        coefficient_of_variation = np.sqrt(variance) / np.abs(mean)
+    low_variance = ~constant & (coefficient_of_variation < config.min_coefficient_of_variation)
+
+    candidates = np.flatnonzero(~constant & ~low_variance)
+    order = candidates[np.argsort(-importance[candidates], kind='stable')]
+    kept = _greedy_decorrelate(order, feature_corr, config.correlation_threshold)
+    selected = kept[:config.max_features]
+
+    kept_set, selected_set = set(kept), set(selected)
+    result = FeatureSelectionResult(
+        selected=[feature_columns[i] for i in selected],
+        dropped={
+            'constant': [feature_columns[i] for i in np.flatnonzero(constant)],
+            'low_variance': [feature_columns[i] for i in np.flatnonzero(low_variance)],
+            'correlated': [feature_columns[i] for i in order if i not in kept_set],
+            'importance': [feature_columns[i] for i in kept if i not in selected_set],
+        },
+        scores={feature_columns[i]: float(importance[i]) for i in selected},
+        rows_used=moments.count,
+    )
+    print(result)
+    return result
+
+
+if __name__ == "__main__":
+    # Example usage on synthetic data
+    from feature_engineering import create_comprehensive_features
+    from model_training import ModelTrainer
+
+    dates = pl.date_range(pl.date(2020, 1, 1), pl.date(2023, 12, 31), "1d", eager=True)
+    np.random.seed(42)
+    prices = np.cumsum(np.random.randn(len(dates)) * 0.5) + 100
+
+    df = pl.DataFrame({
+        'date': dates,
+        'close': prices,
+        'open': prices + np.random.randn(len(dates)) * 0.5,
+        'high': prices + np.abs(np.random.randn(len(dates)) * 1.0),
+        'low': prices - np.abs(np.random.randn(len(dates)) * 1.0),
+        'volume': np.random.randint(1000000, 10000000, len(dates))
+    })
+    df = create_comprehensive_features(df).with_columns(
+        ((pl.col("close").shift(-1) - pl.col("close")) / pl.col("close") * 100).alias("target_return_1d")
+    ).head(-1)
+
+    candidates = ModelTrainer().get_feature_columns(df, ["target_return_1d"])
+    selection = select_features(df, candidates, ["target_return_1d"])
+    print(f"Top features: {selection.selected[:10]}")
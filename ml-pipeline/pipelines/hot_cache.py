@@ -0,0 +1,277 @@
+"""
+Latest-features hot cache for serving and dashboards
+
+Questions like "current RSI/MACD/prediction for symbol X" only need the most
+recent row per symbol, not the historical dataset.parquet. This module keeps
+that row - every feature, the OHLCV columns and the latest model predictions
+(pred_<target>, plus pred_<target>_proba for classifiers) - in a compact
+snapshot:
+
+- built when a pipeline run finishes and merged into the previous snapshot,
+  so a run covering a few symbols only replaces their rows
+- persisted as an uncompressed Arrow IPC file written to a temporary file and
+  moved into place with os.replace, so readers never see a partial file
+- memory-mapped at process start; HotCache keeps a symbol -> row dictionary
+  for O(1) lookups and swaps its whole state in one assignment when a new
+  snapshot lands
+"""
+import hashlib
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import polars as pl
+
+HOT_CACHE_FILE = "latest_features.arrow"
+PREDICTION_PREFIX = "pred_"
+BASE_COLUMNS = ['date', 'symbol', 'open', 'high', 'low', 'close', 'volume']
+
+
+def latest_rows(df: pl.DataFrame, required: Optional[List[str]] = None,
+                symbol: Optional[str] = None) -> pl.DataFrame:
+    """
+    Most recent row per symbol
+
+    Args:
+        df: Frame with a date column; single-symbol frames get a symbol column
+        required: Columns that must be non-null for a row to count as latest
+        symbol: Symbol name for frames without a symbol column
+
+    Returns:
+        One row per symbol, sorted by symbol
+    """
+    if 'symbol' not in df.columns:
+        df = df.with_columns(pl.lit(symbol or "SYMBOL").alias('symbol'))
+    if required:
+        df = df.drop_nulls(required)
+    return df.sort('date').group_by('symbol', maintain_order=True).last().sort('symbol')
+
+
+def build_snapshot(df: pl.DataFrame, trainer: Optional[Any] = None,
+                   symbol: Optional[str] = None) -> pl.DataFrame:
+    """
+    Latest features and model predictions per symbol
+
+    Args:
+        df: Processed dataset (features, OHLCV, targets)
+        trainer: Optional ModelTrainer; adds pred_<target> columns for every model
+        symbol: Symbol name for single-symbol datasets
+
+    Returns:
+        Snapshot frame with base columns, features and predictions
+    """
+    if trainer is not None and trainer.feature_names:
+        feature_columns = trainer.feature_names
+    else:
+        from model_training import ModelTrainer
+        feature_columns = ModelTrainer().get_feature_columns(df, [])
+
+    base = [col for col in BASE_COLUMNS if col in df.columns or col == 'symbol']
+    frame = df.with_columns(pl.lit(symbol or "SYMBOL").alias('symbol')) if 'symbol' not in df.columns else df
+    frame = frame.select(base + [col for col in feature_columns if col not in base])
+    snapshot = latest_rows(frame, required=feature_columns)
+
+    if trainer is not None and trainer.models and snapshot.height:
+        X = trainer._to_feature_matrix(snapshot, feature_columns)
+        predictions = []
+        for target, result in trainer.models.items():
+            model = result['model']
+            predictions.append(pl.Series(f"{PREDICTION_PREFIX}{target}", np.asarray(model.predict(X), dtype=np.float64)))
+            if result.get('type') == 'classification' and hasattr(model, 'predict_proba'):
+                probabilities = np.asarray(model.predict_proba(X))[:, -1]
+                predictions.append(pl.Series(f"{PREDICTION_PREFIX}{target}_proba", probabilities, dtype=pl.Float64))
+        snapshot = snapshot.with_columns(predictions)
+
+    return snapshot
+
+
+def merge_snapshots(current: pl.DataFrame, new: pl.DataFrame) -> pl.DataFrame:
+    """Keep the newer row per symbol; rows of the new snapshot win ties"""
+    return (
+        pl.concat([current, new], how='diagonal_relaxed')
+        .sort('date', maintain_order=True)
+        .group_by('symbol', maintain_order=True)
+        .last()
+        .sort('symbol')
+    )
+
+
+def write_snapshot(snapshot: pl.DataFrame, path: str, version: Optional[str] = None) -> str:
+    """
+    Atomically replace the Arrow IPC snapshot file
+
+    Returns:
+        Version string stored in the file's schema metadata
+    """
+    import pyarrow as pa
+
+    path = Path(path)
+    created_at = datetime.now().isoformat(timespec='microseconds')
+    version = version or hashlib.sha1(f"{created_at}-{snapshot.height}".encode()).hexdigest()[:12]
+
+    table = snapshot.to_arrow()
+    table = table.replace_schema_metadata({
+        'version': version,
+        'created_at': created_at,
+        'symbols': str(snapshot.height),
+    })
+
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with pa.OSFile(str(tmp_path), 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, path)
+    return version
+
+
+def read_snapshot(path: str) -> Tuple[pl.DataFrame, Dict[str, str]]:
+    """Memory-map a snapshot file; returns (frame, metadata)"""
+    import pyarrow as pa
+
+    table = pa.ipc.open_file(pa.memory_map(str(path), 'r')).read_all()
+    metadata = {key.decode(): value.decode() for key, value in (table.schema.metadata or {}).items()}
+    return pl.from_arrow(table), metadata
+
+
+def update_hot_cache(path: str, df: pl.DataFrame, trainer: Optional[Any] = None,
+                     symbol: Optional[str] = None) -> str:
+    """
+    Merge the latest rows of a finished run into the snapshot file
+
+    Returns:
+        Version of the written snapshot
+    """
+    snapshot = build_snapshot(df, trainer, symbol)
+    if Path(path).exists():
+        current, _ = read_snapshot(path)
+        snapshot = merge_snapshots(current, snapshot)
+    return write_snapshot(snapshot, path)
+
+
+@dataclass(frozen=True)
+class _CacheState:
+    """Immutable view swapped in one assignment"""
+    frame: pl.DataFrame
+    index: Dict[str, int]
+    metadata: Dict[str, str]
+    fingerprint: Tuple[int, int, int]
+
+
+class HotCache:
+    """O(1) symbol lookups over a memory-mapped latest-features snapshot"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._state: Optional[_CacheState] = None
+        self.refresh()
+
+    def __repr__(self) -> str:
+        return f"HotCache('{self.path}', symbols={len(self)}, version={self.version})"
+
+    def __len__(self) -> int:
+        return len(self._state.index) if self._state else 0
+
+    def __contains__(self, symbol: str) -> bool:
+        return self._state is not None and symbol in self._state.index
+
+    def _fingerprint(self) -> Optional[Tuple[int, int, int]]:
+        """Inode, size and mtime of the snapshot file (changes on every replace)"""
+        if not self.path.exists():
+            return None
+        stat = self.path.stat()
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def refresh(self) -> bool:
+        """
+        Load the snapshot file if it changed since the last load
+
+        Returns:
+            True if a new snapshot was swapped in
+        """
+        fingerprint = self._fingerprint()
+        if fingerprint is None or (self._state is not None and self._state.fingerprint == fingerprint):
+            return False
+        frame, metadata = read_snapshot(str(self.path))
+        index = {symbol: i for i, symbol in enumerate(frame.get_column('symbol').to_list())}
+        self._state = _CacheState(frame, index, metadata, fingerprint)
+        return True
+
+    def swap(self, snapshot: pl.DataFrame, version: Optional[str] = None) -> str:
+        """Persist a new snapshot and swap it in"""
+        version = write_snapshot(snapshot, str(self.path), version)
+        self.refresh()
+        return version
+
+    @property
+    def version(self) -> Optional[str]:
+        """Version of the loaded snapshot"""
+        return self._state.metadata.get('version') if self._state else None
+
+    @property
+    def frame(self) -> pl.DataFrame:
+        """The whole loaded snapshot"""
+        return self._state.frame if self._state else pl.DataFrame()
+
+    @property
+    def symbols(self) -> List[str]:
+        """Symbols in the loaded snapshot"""
+        return list(self._state.index) if self._state else []
+
+    def get(self, symbol: str, columns: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """Latest row of a symbol as a dictionary, or None if unknown"""
+        state = self._state
+        if state is None or symbol not in state.index:
+            return None
+        row = state.index[symbol]
+        if columns:
+            # Column access avoids materialising the whole (wide) row
+            return {col: state.frame.get_column(col)[row] for col in columns}
+        return state.frame.row(row, named=True)
+
+    def get_many(self, symbols: List[str], columns: Optional[List[str]] = None) -> pl.DataFrame:
+        """Latest rows of several symbols (unknown symbols are skipped)"""
+        state = self._state
+        if state is None:
+            return pl.DataFrame()
+        rows = [state.index[symbol] for symbol in symbols if symbol in state.index]
+        frame = state.frame[rows]
+        return frame.select(['symbol'] + [col for col in columns if col != 'symbol']) if columns else frame
+
+
+if __name__ == "__main__":
+    # Example: snapshot 2,000 symbols x 200 features, then time lookups against parquet
+    import tempfile
+    import time
+
+    np.random.seed(42)
+    n_symbols, n_days, n_features = 2000, 20, 200
+    df = pl.DataFrame({
+        'date': np.tile(pl.date_range(pl.date(2024, 6, 1), pl.date(2024, 6, n_days), "1d", eager=True).to_numpy(),
+                        n_symbols),
+        'symbol': np.repeat([f"SYM{i:04d}" for i in range(n_symbols)], n_days),
+        'close': 100 + np.random.randn(n_symbols * n_days).cumsum() * 0.1,
+        **{f"feature_{j}": np.random.randn(n_symbols * n_days) for j in range(n_features)},
+    })
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = f"{tmp_dir}/{HOT_CACHE_FILE}"
+        start = time.perf_counter()
+        update_hot_cache(path, df)
+        print(f"Built snapshot in {time.perf_counter() - start:.3f}s ({Path(path).stat().st_size / 1e6:.1f} MB)")
+
+        start = time.perf_counter()
+        cache = HotCache(path)
+        print(f"Memory-mapped {cache} in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+        start = time.perf_counter()
+        for i in range(10000):
+            cache.get(f"SYM{i % n_symbols:04d}", ['close', 'feature_0'])
+        print(f"10,000 lookups in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+        dataset_path = f"{tmp_dir}/dataset.parquet"
+        df.write_parquet(dataset_path)
+        start = time.perf_counter()
+        pl.scan_parquet(dataset_path).filter(pl.col('symbol') == "SYM0042").sort('date').tail(1).collect()
+        print(f"Same question from the parquet store: {(time.perf_counter() - start) * 1000:.1f}ms per lookup")
@@ -0,0 +1,412 @@
+"""
+Warm-start incremental retraining for PyStockBot models
+
+A full run of train_all_models fits three candidate models per target, cross
+validates each and keeps the best. When only a few new days have arrived,
+this module updates the saved best model instead:
+
+- XGBoost models keep boosting from the existing booster (xgb_model) on the
+  new rows plus a replay window of recent history
+- random forests add warm-started trees fitted on the same window
+- partial_fit-capable estimators are updated with the new rows only
+- linear/logistic baselines are refit on the full history (closed form or
+  warm-started from the previous coefficients, both take milliseconds)
+- stacking ensembles update each base model and keep the meta-model
+- targets of one multi-output fit are updated together, so every shared
+  model is updated once (or the group is refit through fit_multi_output)
+
+A full retrain of a target still happens on a schedule, after a maximum number
+of updates, when the new rows drift away from the training distribution
+(population stability index) or when the model scores poorly on them. Every
+model records which mode produced it.
+"""
+import copy
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import polars as pl
+import xgboost as xgb
+from sklearn.base import clone, is_classifier
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.linear_model import LinearRegression, LogisticRegression
+from sklearn.metrics import f1_score, r2_score
+from sklearn.multioutput import MultiOutputClassifier
+
+from config import IncrementalTrainingConfig
+from multi_output import OutputSlice, fit_multi_output
+from stacking import StackingEnsemble
+
+PSI_EPSILON = 1e-4
+DRIFT_CHUNK_ROWS = 10000
+
+
+def _bin_proportions(X: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """Share of rows per quantile bin for every feature, as a (bins, features) array"""
+    n_bins = edges.shape[0] + 1
+    counts = np.zeros((n_bins, edges.shape[1]))
+    for start in range(0, X.shape[0], DRIFT_CHUNK_ROWS):
+        chunk = np.asarray(X[start:start + DRIFT_CHUNK_ROWS], dtype=np.float64)
+        bin_index = (chunk[:, np.newaxis, :] > edges[np.newaxis, :, :]).sum(axis=1)
+        counts += np.stack([(bin_index == b).sum(axis=0) for b in range(n_bins)])
+    return counts / max(X.shape[0], 1)
+
+
+def build_drift_reference(X: np.ndarray, bins: int = 10) -> Dict[str, np.ndarray]:
+    """
+    Quantile bin edges and bin proportions of the training matrix
+
+    Returns:
+        Dictionary with 'edges' (bins - 1, features) and 'proportions' (bins, features)
+    """
+    X = np.asarray(X, dtype=np.float64)
+    edges = np.quantile(X, np.linspace(0, 1, bins + 1)[1:-1], axis=0)
+    return {'edges': edges, 'proportions': _bin_proportions(X, edges)}
+
+
+def population_stability_index(reference: Dict[str, np.ndarray], X: np.ndarray) -> np.ndarray:
+    """Population stability index of every feature of X against the training reference"""
+    expected = np.clip(reference['proportions'], PSI_EPSILON, None)
+    actual = np.clip(_bin_proportions(X, reference['edges']), PSI_EPSILON, None)
+    return ((actual - expected) * np.log(actual / expected)).sum(axis=0)
+
+
+def training_record(mode: str, trained_through: Any, last_full_train: Any,
+                    updates_since_full: int, **details: Any) -> Dict[str, Any]:
+    """Metadata stored in a model result describing how it was produced"""
+    return {
+        'training_mode': mode,
+        'trained_through': trained_through,
+        'last_full_train': last_full_train,
+        'updates_since_full': updates_since_full,
+        **details,
+    }
+
+
+def _has_every_class(model: Any, y: np.ndarray) -> bool:
+    """Whether every output column of y contains all classes the classifier was fitted on"""
+    classes = model.classes_ if isinstance(model.classes_, list) else [model.classes_]
+    columns = y.reshape(len(y), -1).T
+    return all(np.array_equal(np.unique(column), known) for column, known in zip(columns, classes))
+
+
+def continue_training(model: Any, X_history: np.ndarray, y_history: np.ndarray,
+                      X_new: np.ndarray, y_new: np.ndarray,
+                      replay_rows: int, config: IncrementalTrainingConfig) -> Tuple[Any, str]:
+    """
+    Update a fitted model with new rows without the full candidate search
+
+    Args:
+        model: Fitted best model of a target
+        X_history, y_history: All rows up to and including the new ones
+            (y is a (rows, outputs) matrix for multi-output models)
+        X_new, y_new: Rows newer than the model's training data
+        replay_rows: Recent already-seen rows added to the new rows for tree updates
+        config: Update sizes
+
+    Returns:
+        Tuple of (updated model, update method name); the original model is not modified
+
+    Raises:
+        ValueError: If the model type cannot be updated (or the window lacks classes)
+    """
+    window = slice(max(0, len(y_history) - len(y_new) - replay_rows), None)
+
+    if isinstance(model, (xgb.XGBRegressor, xgb.XGBClassifier)):
+        updated = clone(model).set_params(n_estimators=config.boost_rounds)
+        updated.fit(X_history[window], y_history[window], xgb_model=model.get_booster())
+        return updated, 'xgboost_continue'
+
+    if isinstance(model, (RandomForestRegressor, RandomForestClassifier)):
+        if is_classifier(model) and not _has_every_class(model, y_history[window]):
+            raise ValueError("Replay window does not contain every class")
+        updated = copy.deepcopy(model)
+        updated.set_params(warm_start=True, n_estimators=len(model.estimators_) + config.forest_trees)
+        updated.fit(X_history[window], y_history[window])
+        updated.set_params(warm_start=False)
+        return updated, 'forest_warm_start'
+
+    if hasattr(model, 'partial_fit'):
+        updated = copy.deepcopy(model)
+        updated.partial_fit(X_new, y_new)
+        return updated, 'partial_fit'
+
+    if isinstance(model, LinearRegression):
+        return clone(model).fit(X_history, y_history), 'linear_refit'
+
+    if isinstance(model, LogisticRegression):
+        updated = copy.deepcopy(model)
+        updated.set_params(warm_start=True)
+        updated.fit(X_history, y_history)
+        return updated, 'logistic_warm_start'
+
+    if isinstance(model, MultiOutputClassifier):
+        return clone(model).fit(X_history, y_history), 'multi_output_refit'
+
+    if isinstance(model, StackingEnsemble):
+        # The meta-model weights were fitted on out-of-fold predictions and stay valid
+        base_models = {
+            name: continue_training(base, X_history, y_history, X_new, y_new, replay_rows, config)[0]
+            for name, base in model.base_models.items()
+        }
+        return StackingEnsemble(base_models, model.meta_model, model.task_type), 'stacking_base_update'
+
+    raise ValueError(f"No incremental update for {type(model).__name__}")
+
+
+def score_new_rows(model: Any, X_new: np.ndarray, y_new: np.ndarray, task_type: str) -> float:
+    """Out-of-sample main score (R² or weighted F1) of the current model on the new rows"""
+    y_pred = model.predict(X_new)
+    if task_type == 'regression':
+        return float(r2_score(y_new, y_pred))
+    return float(f1_score(y_new, y_pred, average='weighted', zero_division=0))
+
+
+def choose_training_mode(result: Dict[str, Any], newest: Any, n_new: int, drift_psi: float,
+                         new_score: Optional[float], config: IncrementalTrainingConfig) -> Tuple[str, str]:
+    """
+    Decide between a full retrain, an incremental update or leaving a model unchanged
+
+    Returns:
+        Tuple of (mode, reason)
+    """
+    if result.get('trained_through') is None:
+        return 'full', 'no training date recorded'
+    if n_new == 0:
+        return 'unchanged', 'no new rows'
+    if (newest - result['last_full_train']).days >= config.full_retrain_every_days:
+        return 'full', 'schedule'
+    if result.get('updates_since_full', 0) >= config.max_updates_between_full:
+        return 'full', 'update limit'
+    if drift_psi > config.drift_threshold:
+        return 'full', 'feature drift'
+    if new_score is not None and 'main_score' in result and new_score < result['main_score'] - config.score_drop_tolerance:
+        return 'full', 'score drop'
+    return 'incremental', 'new rows'
+
+
+def _update_multi_output_group(trainer: Any, df: pl.DataFrame, targets: List[str], feature_columns: List[str],
+                               config: IncrementalTrainingConfig, date_column: str) -> List[Dict[str, Any]]:
+    """
+    Update the targets of one multi-output fit together
+
+    Every candidate of the fit was trained on all of the group's targets, so
+    each distinct shared model is updated once on the full target matrix and
+    each target gets a new OutputSlice of its updated model. The group takes
+    the most thorough mode any of its targets asks for, so a full retrain of
+    one horizon refits the group through fit_multi_output.
+
+    Returns:
+        One report row per target
+    """
+    start = time.perf_counter()
+    results = [trainer.models[target] for target in targets]
+    task_type = results[0]['type']
+    clean = df.select([date_column] + feature_columns + targets).drop_nulls().sort(date_column)
+    newest = clean.get_column(date_column).max()
+
+    X = trainer._to_feature_matrix(clean, feature_columns)
+    Y = clean.select(targets).to_numpy()
+    Y = Y.astype(int) if task_type == 'classification' else Y
+
+    trained_through = results[0].get('trained_through')
+    n_new = int((clean.get_column(date_column) > trained_through).sum()) if trained_through is not None else 0
+    X_new, Y_new = X[len(Y) - n_new:], Y[len(Y) - n_new:]
+
+    reference = results[0].get('drift_reference', trainer.drift_reference)
+    drift_window = X[max(0, len(Y) - max(n_new, config.replay_rows)):]
+    drift_psi = float(population_stability_index(reference, drift_window).mean()) if reference and n_new else 0.0
+    new_scores = [
+        score_new_rows(result['model'], X_new, Y_new[:, i], task_type) if n_new >= config.min_eval_rows else None
+        for i, result in enumerate(results)
+    ]
+
+    decisions = [choose_training_mode(result, newest, n_new, drift_psi, score, config)
+                 for result, score in zip(results, new_scores)]
+    priority = ['full', 'incremental', 'unchanged']
+    mode, reason = min(decisions, key=lambda decision: priority.index(decision[0]))
+    methods = [None] * len(targets)
+
+    if mode == 'incremental':
+        try:
+            if [result['model'].index for result in results] != list(range(results[0]['model'].n_outputs)):
+                raise ValueError("Not every output of the multi-output fit is loaded")
+            updates = {}
+            for result in results:
+                shared = result['model'].model
+                if id(shared) not in updates:
+                    updates[id(shared)] = continue_training(shared, X, Y, X_new, Y_new, config.replay_rows, config)
+            for i, (target, result) in enumerate(zip(targets, results)):
+                model, methods[i] = updates[id(result['model'].model)]
+                trainer.models[target] = {
+                    **result,
+                    'model': OutputSlice(model, i, len(targets)),
+                    **training_record('incremental', newest, result['last_full_train'],
+                                      result.get('updates_since_full', 0) + 1,
+                                      update_method=methods[i], new_rows=n_new, new_rows_score=new_scores[i]),
+                }
+        except ValueError as e:
+            mode, reason = 'full', f"update failed: {e}"
+            methods = [None] * len(targets)
+
+    if mode == 'full':
+        print(f"Full multi-output retrain of {', '.join(targets)} ({reason})")
+        group = fit_multi_output(trainer, X, Y, targets, feature_columns, task_type)
+        reference = build_drift_reference(X, config.drift_bins)
+        for target, result in group.items():
+            trainer.models[target] = {
+                **result,
+                'type': task_type,
+                'tuned': False,
+                **training_record('full', newest, newest, 0, new_rows=n_new, drift_reference=reference),
+                'multi_output': True,
+            }
+
+    seconds = time.perf_counter() - start
+    return [
+        {
+            'target': target,
+            'mode': mode,
+            'reason': reason,
+            'update_method': method,
+            'new_rows': n_new,
+            'drift_psi': drift_psi,
+            'new_rows_score': score,
+            'seconds': seconds,
+        }
+        for target, method, score in zip(targets, methods, new_scores)
+    ]
+
+
+def update_models(trainer: Any, df: pl.DataFrame,
+                  config: Optional[IncrementalTrainingConfig] = None,
+                  date_column: str = "date") -> pl.DataFrame:
+    """
+    Bring every trained model up to date with the rows in df
+
+    Args:
+        trainer: ModelTrainer with loaded models (from a previous full training)
+        df: Full processed dataset including the new rows
+        config: Schedule, drift thresholds and update sizes
+        date_column: Column ordering rows in time
+
+    Returns:
+        Report with one row per target: mode, reason, update method, new rows,
+        drift, new-row score and seconds spent
+    """
+    config = config or IncrementalTrainingConfig()
+    if not trainer.models:
+        raise ValueError("No trained models to update. Run a full training first.")
+
+    feature_columns = trainer.feature_names or trainer.get_feature_columns(df, list(trainer.models))
+    report = []
+    grouped = set()
+
+    for target, result in list(trainer.models.items()):
+        if target in grouped:
+            continue
+        if isinstance(result['model'], OutputSlice):
+            # One multi-output fit per task type covers all of its targets
+            group = sorted(
+                (name for name, other in trainer.models.items()
+                 if isinstance(other['model'], OutputSlice) and other['type'] == result['type']),
+                key=lambda name: trainer.models[name]['model'].index
+            )
+            report.extend(_update_multi_output_group(trainer, df, group, feature_columns, config, date_column))
+            grouped.update(group)
+            continue
+
+        start = time.perf_counter()
+        task_type = result['type']
+        clean = df.select([date_column] + feature_columns + [target]).drop_nulls().sort(date_column)
+        newest = clean.get_column(date_column).max()
+
+        X = trainer._to_feature_matrix(clean, feature_columns)
+        y = clean.get_column(target).to_numpy()
+        y = y.astype(int) if task_type == 'classification' else y
+
+        trained_through = result.get('trained_through')
+        n_new = int((clean.get_column(date_column) > trained_through).sum()) if trained_through is not None else 0
+        X_new, y_new = X[len(y) - n_new:], y[len(y) - n_new:]
+
+        # Models saved before references were stored per target fall back to the shared one
+        reference = result.get('drift_reference', trainer.drift_reference)
+        drift_window = X[max(0, len(y) - max(n_new, config.replay_rows)):]
+        drift_psi = float(population_stability_index(reference, drift_window).mean()) if reference and n_new else 0.0
+        new_score = score_new_rows(result['model'], X_new, y_new, task_type) if n_new >= config.min_eval_rows else None
+
+        mode, reason = choose_training_mode(result, newest, n_new, drift_psi, new_score, config)
+        method = None
+
+        if mode == 'incremental':
+            try:
+                model, method = continue_training(result['model'], X, y, X_new, y_new, config.replay_rows, config)
+                if result.get('stacking') and target in trainer.oof_cache:
+                    # Keep the cached learners in step so update_stack re-blends the updated models
+                    trainer.oof_cache[target].models.update(model.base_models)
+                trainer.models[target] = {
+                    **result,
+                    'model': model,
+                    **training_record('incremental', newest, result['last_full_train'],
+                                      result.get('updates_since_full', 0) + 1,
+                                      update_method=method, new_rows=n_new, new_rows_score=new_score),
+                }
+            except ValueError as e:
+                mode, reason = 'full', f"update failed: {e}"
+
+        if mode == 'full':
+            print(f"Full retrain of {target} ({reason})")
+            if result.get('tuned'):
+                best_result = {'model': trainer.hyperparameter_tuning(X, y, 'xgboost', task_type)}
+            else:
+                best_result = trainer.train_models_by_type(X, y, target, feature_columns, task_type,
+                                                           stacking=bool(result.get('stacking')))
+            trainer.models[target] = {
+                **best_result,
+                'type': task_type,
+                'tuned': bool(result.get('tuned')),
+                **({'stacking': True} if result.get('stacking') else {}),
+                **training_record('full', newest, newest, 0, new_rows=n_new,
+                                  drift_reference=build_drift_reference(X, config.drift_bins)),
+            }
+
+        report.append({
+            'target': target,
+            'mode': mode,
+            'reason': reason,
+            'update_method': method,
+            'new_rows': n_new,
+            'drift_psi': drift_psi,
+            'new_rows_score': new_score,
+            'seconds': time.perf_counter() - start,
+        })
+
+    return pl.DataFrame(report, schema={
+        'target': pl.Utf8, 'mode': pl.Utf8, 'reason': pl.Utf8, 'update_method': pl.Utf8,
+        'new_rows': pl.Int64, 'drift_psi': pl.Float64, 'new_rows_score': pl.Float64, 'seconds': pl.Float64,
+    })
+
+
+if __name__ == "__main__":
+    # Example: full training on history, then a daily incremental update
+    from model_training import ModelTrainer
+
+    np.random.seed(42)
+    n_days, n_features = 1500, 40
+    dates = pl.date_range(pl.date(2019, 1, 1), pl.date(2019, 1, 1) + pl.duration(days=n_days - 1), "1d", eager=True)
+    features = np.random.randn(n_days, n_features)
+    returns = features[:, :3] @ np.array([0.5, -0.3, 0.2]) + np.random.randn(n_days) * 0.5
+    df = pl.DataFrame({'date': dates, **{f"f{i}": features[:, i] for i in range(n_features)}}).with_columns(
+        pl.Series('target_return_1d', returns),
+        pl.Series('target_direction_1d', (returns > 0).astype(np.int32)),
+    )
+
+    trainer = ModelTrainer()
+    start = time.perf_counter()
+    trainer.train_all_models(df.head(n_days - 1), ['target_return_1d'], ['target_direction_1d'])
+    full_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    report = update_models(trainer, df)
+    print(f"Full training: {full_seconds:.2f}s, daily update: {time.perf_counter() - start:.2f}s")
+    print(report)
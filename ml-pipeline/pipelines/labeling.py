@@ -0,0 +1,212 @@
+"""
+Vectorized triple-barrier labels for PyStockBot
+
+For every bar the forward log-return path up to the longest horizon is
+gathered as one (rows x max_horizon) block. Each horizon then reads its prefix
+of the block: volatility-scaled profit-take and stop-loss barriers are compared
+against the whole block at once, and argmax over the boolean hit matrices gives
+the first-touch bar. All symbols are handled in the same pass because paths are
+cut at the end of each symbol's segment, so there is no per-row Python loop over
+forward windows.
+
+Columns added per horizon h:
+    target_barrier_{h}d         +1 profit-take, -1 stop-loss, 0 time-out (Int8)
+    target_barrier_touch_{h}d   bars until the first barrier touch (Int16)
+    target_barrier_return_{h}d  % return at the touch (Float64)
+    target_meta_{h}d            1 if trading the primary side was profitable (Int8)
+"""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import polars as pl
+
+from config import LabelingConfig
+
+ROW_INDEX = "__label_row"
+REMAINING = "__label_remaining"
+
+
+def label_columns(horizon: int) -> Dict[str, str]:
+    """Output column names for one horizon"""
+    return {
+        'label': f"target_barrier_{horizon}d",
+        'touch': f"target_barrier_touch_{horizon}d",
+        'return': f"target_barrier_return_{horizon}d",
+        'meta': f"target_meta_{horizon}d",
+    }
+
+
+def forward_log_returns(log_price: np.ndarray, log_base: np.ndarray, segment_end: np.ndarray,
+                        rows: np.ndarray, max_horizon: int) -> np.ndarray:
+    """
+    Gather forward log returns log_price[i + k] - log_base[i] for k = 1..max_horizon
+
+    Steps past the end of the row's symbol segment are NaN, so paths never
+    cross into the next symbol.
+
+    Returns:
+        (len(rows), max_horizon) float64 block
+    """
+    positions = rows[:, np.newaxis] + np.arange(1, max_horizon + 1)
+    valid = positions <= segment_end[rows, np.newaxis]
+    gathered = log_price[np.minimum(positions, len(log_price) - 1)]
+    return np.where(valid, gathered - log_base[rows, np.newaxis], np.nan)
+
+
+def _first_touch(hits: np.ndarray) -> np.ndarray:
+    """Index of the first True per row, or the row length when there is none"""
+    return np.where(hits.any(axis=1), hits.argmax(axis=1), hits.shape[1])
+
+
+def barrier_outcomes(up_path: np.ndarray, down_path: np.ndarray, close_path: np.ndarray,
+                     volatility: np.ndarray, horizon: int,
+                     config: LabelingConfig) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Resolve the three barriers for one horizon over a block of forward paths
+
+    Args:
+        up_path: Forward log returns checked against the profit-take barrier
+        down_path: Forward log returns checked against the stop-loss barrier
+        close_path: Forward close log returns (time-out return)
+        volatility: Per-row volatility scaling the barrier widths
+        horizon: Vertical barrier in bars
+        config: Barrier multipliers and time-out handling
+
+    Returns:
+        Tuple of (label, touch_bars, log_return, resolved) arrays; rows whose
+        path ends before any barrier is reached are not resolved
+    """
+    width = volatility * (np.sqrt(horizon) if config.scale_with_horizon else 1.0)
+    upper = config.profit_take_multiplier * width if config.profit_take_multiplier > 0 else np.full_like(width, np.inf)
+    lower = -config.stop_loss_multiplier * width if config.stop_loss_multiplier > 0 else np.full_like(width, -np.inf)
+
+    with np.errstate(invalid='ignore'):
+        first_up = _first_touch(up_path[:, :horizon] >= upper[:, np.newaxis])
+        first_down = _first_touch(down_path[:, :horizon] <= lower[:, np.newaxis])
+
+    stop_loss = (first_down < horizon) & (first_down <= first_up)
+    profit_take = (first_up < horizon) & ~stop_loss
+    touch = np.minimum(np.minimum(first_up, first_down), horizon - 1)
+
+    timeout_return = close_path[:, horizon - 1]
+    if config.use_high_low:
+        # Assume fills at the barrier level when an intrabar high/low touches it
+        log_return = np.where(profit_take, upper, np.where(stop_loss, lower, timeout_return))
+    else:
+        log_return = close_path[np.arange(len(touch)), touch]
+
+    timeout_label = np.sign(timeout_return) if config.label_timeouts_by_sign else 0.0
+    label = np.where(profit_take, 1.0, np.where(stop_loss, -1.0, timeout_label))
+    resolved = (profit_take | stop_loss | np.isfinite(timeout_return)) & np.isfinite(volatility)
+    return label, touch + 1, log_return, resolved
+
+
+def triple_barrier_labels(df: pl.DataFrame, horizons: List[int],
+                          config: Optional[LabelingConfig] = None,
+                          price_column: str = "close",
+                          symbol_column: str = "symbol") -> pl.DataFrame:
+    """
+    Add triple-barrier labels, first-touch times and meta-labels for every horizon
+
+    Args:
+        df: Frame with date, price (and high/low when use_high_low) columns;
+            multi-symbol frames carry a symbol column
+        horizons: Vertical barriers in bars
+        config: Barrier configuration
+        price_column: Price used for volatility, barrier reference and time-outs
+        symbol_column: Column identifying each symbol's segment, if present
+
+    Returns:
+        DataFrame with label columns added; row order is unchanged
+    """
+    config = config or LabelingConfig()
+    horizons = sorted(set(horizons))
+    max_horizon = horizons[-1]
+    group = [symbol_column] if symbol_column in df.columns else []
+    over = (lambda expr: expr.over(group)) if group else (lambda expr: expr)
+
+    ordered = df.with_row_index(ROW_INDEX).sort(group + ['date']).with_columns(
+        over(pl.col(price_column).log().diff().ewm_std(span=config.volatility_span, min_samples=config.volatility_span))
+        .clip(lower_bound=config.min_volatility).alias('__label_volatility'),
+        over(pl.int_range(pl.len()).max() - pl.int_range(pl.len())).alias(REMAINING),
+    )
+
+    n_rows = ordered.height
+    log_close = np.log(ordered.get_column(price_column).cast(pl.Float64).to_numpy())
+    log_high = np.log(ordered.get_column('high').cast(pl.Float64).to_numpy()) if config.use_high_low else log_close
+    log_low = np.log(ordered.get_column('low').cast(pl.Float64).to_numpy()) if config.use_high_low else log_close
+    volatility = ordered.get_column('__label_volatility').fill_null(np.nan).to_numpy()
+    segment_end = np.arange(n_rows) + ordered.get_column(REMAINING).to_numpy()
+    side = (ordered.get_column(config.side_column).cast(pl.Float64).fill_null(0.0).to_numpy()
+            if config.side_column else np.ones(n_rows))
+
+    outputs = {name: np.full(n_rows, np.nan) for horizon in horizons for name in label_columns(horizon).values()}
+
+    for start in range(0, n_rows, config.chunk_rows):
+        rows = np.arange(start, min(start + config.chunk_rows, n_rows))
+        close_path = forward_log_returns(log_close, log_close, segment_end, rows, max_horizon)
+        up_path = forward_log_returns(log_high, log_close, segment_end, rows, max_horizon) if config.use_high_low else close_path
+        down_path = forward_log_returns(log_low, log_close, segment_end, rows, max_horizon) if config.use_high_low else close_path
+
+        for horizon in horizons:
+            columns = label_columns(horizon)
+            label, touch, log_return, resolved = barrier_outcomes(
+                up_path, down_path, close_path, volatility[rows], horizon, config
+            )
+            chunk_side = side[rows]
+            meta = (chunk_side * log_return > 0).astype(np.float64)
+
+            outputs[columns['label']][rows] = np.where(resolved, label, np.nan)
+            outputs[columns['touch']][rows] = np.where(resolved, touch, np.nan)
+            outputs[columns['return']][rows] = np.where(resolved, np.expm1(log_return) * 100, np.nan)
+            outputs[columns['meta']][rows] = np.where(resolved & (chunk_side != 0), meta, np.nan)
+
+    dtypes = {'label': pl.Int8, 'touch': pl.Int16, 'return': pl.Float64, 'meta': pl.Int8}
+    label_frame = pl.DataFrame([
+        pl.Series(name, outputs[name]).fill_nan(None).cast(dtypes[kind])
+        for horizon in horizons for kind, name in label_columns(horizon).items()
+    ])
+
+    labels = pl.concat([ordered.select(ROW_INDEX), label_frame], how='horizontal').sort(ROW_INDEX).drop(ROW_INDEX)
+    return pl.concat([df.drop([col for col in labels.columns if col in df.columns]), labels], how='horizontal')
+
+
+def label_distribution(df: pl.DataFrame, horizons: List[int]) -> pl.DataFrame:
+    """Share of profit-take / stop-loss / time-out labels and mean touch time per horizon"""
+    rows = []
+    for horizon in horizons:
+        columns = label_columns(horizon)
+        labels = df.get_column(columns['label']).drop_nulls()
+        total = max(len(labels), 1)
+        rows.append({
+            'horizon': horizon,
+            'labeled': len(labels),
+            'profit_take': float((labels == 1).sum() / total),
+            'stop_loss': float((labels == -1).sum() / total),
+            'time_out': float((labels == 0).sum() / total),
+            'mean_touch_bars': df.get_column(columns['touch']).mean(),
+            'meta_positive': df.get_column(columns['meta']).mean(),
+        })
+    return pl.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    # Example: 500 symbols x 2000 bars of synthetic prices, four horizons in one pass
+    import time
+
+    np.random.seed(42)
+    n_bars, n_symbols = 2000, 500
+    dates = pl.datetime_range(pl.datetime(2024, 1, 2, 9, 30), pl.datetime(2024, 1, 2, 9, 30) + pl.duration(minutes=n_bars - 1),
+                              "1m", eager=True)
+    close = 100 * np.exp(np.cumsum(np.random.normal(0, 0.001, (n_symbols, n_bars)), axis=1))
+    df = pl.DataFrame({
+        'symbol': np.repeat([f"SYM{i:04d}" for i in range(n_symbols)], n_bars),
+        'date': np.tile(dates.to_numpy(), n_symbols),
+        'close': close.ravel(),
+    })
+
+    horizons = [1, 5, 10, 20]
+    start = time.perf_counter()
+    labeled = triple_barrier_labels(df, horizons)
+    print(f"Labeled {labeled.height:,} bars x {len(horizons)} horizons in {time.perf_counter() - start:.2f}s")
+    print(label_distribution(labeled, horizons))
@@ -5,28 +5,26 @@ Main pipeline orchestrator for PyStockBot using Polars
 This script runs the complete ML pipeline from data ingestion to model training
 """
 
+from __future__ import annotations
+
 # Standard library imports
 import argparse
 import logging
 import sys
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, List, Any
-
-# Third-party imports
-import polars as pl
-
-# Local application imports
-from data_ingestion import (
-    download_stock_data,
-    download_dividends_and_splits,
-    create_events_dataframe,
-    save_stock_data,
-    load_stock_data,
-)
-from technical_indicators import apply_all_technical_indicators
-from feature_engineering import create_comprehensive_features
-from model_training import ModelTrainer
+from typing import TYPE_CHECKING, Optional, List, Any
+
+# Local application imports (lightweight; stage modules are imported lazily
+# inside each step so status and analysis commands start fast)
+from config import (AttributionConfig, BacktestConfig, BacktestSweepConfig, DtypePolicyConfig,
+                    ExternalMemoryConfig, FeatureSelectionConfig, IncrementalTrainingConfig, IndicatorStoreConfig,
+                    LabelingConfig, TimescaleConfig)
+from run_manifest import write_manifest, load_manifest, get_dataset_stats, print_manifest_summary
+
+if TYPE_CHECKING:
+    import polars as pl
+    from model_training import ModelTrainer
 
 # Setup logging
 logging.basicConfig(
@@ -51,17 +49,57 @@ class PyStockBotPipeline:
     splits_data_path: Path
     processed_data_path: Path
     models_path: Path
+    manifest_path: Path
+    matrix_cache_dir: Path
+    backtest_path: Path
+    sweep_path: Path
+    hot_cache_path: Path
+    indicator_store_dir: Path
+    use_matrix_cache: bool
     stock_data: Optional[pl.DataFrame]
     processed_data: Optional[pl.DataFrame]
+    latest_features: Optional[pl.DataFrame]
     trainer: Optional[ModelTrainer]
     dividends_data: Optional[pl.DataFrame]
     splits_data: Optional[pl.DataFrame]
     events_data: Optional[pl.DataFrame]
-
-    def __init__(self, data_dir: str = "../../data", symbol: str = "AAPL") -> None:
+    dtype_policy: DtypePolicyConfig
+    feature_selection: FeatureSelectionConfig
+    labeling: LabelingConfig
+    incremental: IncrementalTrainingConfig
+    external_memory: ExternalMemoryConfig
+    multi_output: bool
+    stacking: bool
+    attribution: AttributionConfig
+    timescale: TimescaleConfig
+    indicator_store: IndicatorStoreConfig
+
+    def __init__(self, data_dir: str = "../../data", symbol: str = "AAPL",
+                 dtype_policy: Optional[DtypePolicyConfig] = None,
+                 use_matrix_cache: bool = True,
+                 feature_selection: Optional[FeatureSelectionConfig] = None,
+                 labeling: Optional[LabelingConfig] = None,
+                 incremental: Optional[IncrementalTrainingConfig] = None,
+                 external_memory: Optional[ExternalMemoryConfig] = None,
+                 multi_output: bool = False,
+                 stacking: bool = False,
+                 attribution: Optional[AttributionConfig] = None,
+                 timescale: Optional[TimescaleConfig] = None,
+                 indicator_store: Optional[IndicatorStoreConfig] = None) -> None:
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(exist_ok=True)
         self.symbol = symbol
+        self.dtype_policy = dtype_policy or DtypePolicyConfig()
+        self.use_matrix_cache = use_matrix_cache
+        self.feature_selection = feature_selection or FeatureSelectionConfig()
+        self.labeling = labeling or LabelingConfig()
+        self.incremental = incremental or IncrementalTrainingConfig()
+        self.external_memory = external_memory or ExternalMemoryConfig()
+        self.multi_output = multi_output
+        self.stacking = stacking
+        self.attribution = attribution or AttributionConfig()
+        self.timescale = timescale or TimescaleConfig()
+        self.indicator_store = indicator_store or IndicatorStoreConfig()
 
         # File paths
         self.stock_data_path = self.data_dir / "stock_data.parquet"
@@ -70,10 +108,18 @@ class PyStockBotPipeline:
         self.splits_data_path = self.data_dir / "splits.parquet"
         self.processed_data_path = self.data_dir / "dataset.parquet"
         self.models_path = self.data_dir / "trained_models.pkl"
+        self.manifest_path = self.data_dir / "model_manifest.json"
+        self.matrix_cache_dir = self.data_dir / "matrix_cache"
+        self.backtest_path = self.data_dir / "backtest.parquet"
+        self.sweep_path = self.data_dir / "backtest_sweep.parquet"
+        self.attribution_path = self.data_dir / "attributions.parquet"
+        self.hot_cache_path = self.data_dir / "latest_features.arrow"
+        self.indicator_store_dir = self.data_dir / self.indicator_store.directory
 
         # Data containers
         self.stock_data = None
         self.processed_data = None
+        self.latest_features = None
         self.trainer = None
         self.dividends_data = None
         self.splits_data = None
@@ -91,6 +137,14 @@ class PyStockBotPipeline:
         logger.info("STEP 1: DATA INGESTION")
         logger.info("=" * 60)
 
+        from data_ingestion import (
+            download_stock_data,
+            download_dividends_and_splits,
+            create_events_dataframe,
+            save_stock_data,
+            load_stock_data,
+        )
+
         if not force_refresh and self.stock_data_path.exists():
             logger.info(f"Loading existing stock data from {self.stock_data_path}")
             self.stock_data = load_stock_data(str(self.stock_data_path))
@@ -100,11 +154,19 @@ class PyStockBotPipeline:
             end_date = datetime.now()
             start_date = datetime(end_date.year - years_back, end_date.month, end_date.day)
 
-            logger.info(f"Downloading stock data for {self.symbol}")
-            logger.info(f"Date range: {start_date.date()} to {end_date.date()}")
+            if self.timescale.source:
+                from timescale import MarketDataReader
 
-            # Download stock data
-            self.stock_data = download_stock_data(self.symbol, start_date, end_date)
+                logger.info(f"Reading {self.symbol} bars from {self.timescale.table}")
+                with MarketDataReader(self.timescale) as reader:
+                    bars = reader.read([self.symbol], start_date, end_date, as_date=True)
+                self.stock_data = bars.drop('symbol')
+            else:
+                logger.info(f"Downloading stock data for {self.symbol}")
+                logger.info(f"Date range: {start_date.date()} to {end_date.date()}")
+
+                # Download stock data
+                self.stock_data = download_stock_data(self.symbol, start_date, end_date)
 
             # Save to parquet
             save_stock_data(self.stock_data, str(self.stock_data_path))
@@ -134,28 +196,51 @@ class PyStockBotPipeline:
         self.splits_data = splits_data
         self.events_data = events_data
 
+        # Mirror the bars into the TimescaleDB market_data hypertable
+        if self.timescale.enabled and not self.timescale.source:
+            from timescale import MarketDataSink
+
+            with MarketDataSink(self.timescale) as sink:
+                counts = sink.write(self.stock_data, symbol=self.symbol)
+            logger.info(f"Upserted {sum(counts.values())} bars into {self.timescale.table}")
+
         logger.info("✓ Data ingestion completed successfully")
 
-    def run_technical_indicators(self) -> None:
+    def run_technical_indicators(self, rebuild: bool = False) -> None:
         """
         Step 2: Apply technical indicators
+
+        Args:
+            rebuild: Recompute the symbol's stored indicators from scratch
         """
         logger.info("=" * 60)
         logger.info("STEP 2: TECHNICAL INDICATORS")
         logger.info("=" * 60)
 
+        from technical_indicators import apply_all_technical_indicators
+
         if self.stock_data is None:
             raise ValueError("Stock data not loaded. Run data_ingestion first.")
 
         logger.info(f"Applying technical indicators to {self.stock_data.height} rows")
         logger.info(f"Starting columns: {len(self.stock_data.columns)}")
 
-        # Apply all technical indicators
-        self.stock_data = apply_all_technical_indicators(
-            self.stock_data,
-            target_columns=["close", "open", "high", "low", "volume"],
-            windows=[7, 14, 30]
-        )
+        if self.indicator_store.enabled:
+            from indicator_store import IndicatorStore
+
+            # Compute only bars newer than the stored ones, then read the precomputed history
+            store = IndicatorStore(str(self.indicator_store_dir), self.indicator_store)
+            written = store.update(self.stock_data, symbol=self.symbol, rebuild=rebuild)
+            logger.info(f"Indicator store: computed {written[self.symbol]} new rows for {self.symbol}")
+            self.stock_data = store.read([self.symbol], start=self.stock_data['date'].min(),
+                                         end=self.stock_data['date'].max()).drop('symbol')
+        else:
+            # Apply all technical indicators
+            self.stock_data = apply_all_technical_indicators(
+                self.stock_data,
+                target_columns=["close", "open", "high", "low", "volume"],
+                windows=[7, 14, 30]
+            )
 
         logger.info(f"After indicators: {len(self.stock_data.columns)} columns")
         logger.info("✓ Technical indicators completed successfully")
@@ -168,6 +253,8 @@ class PyStockBotPipeline:
         logger.info("STEP 3: FEATURE ENGINEERING")
         logger.info("=" * 60)
 
+        from feature_engineering import create_comprehensive_features
+
         if self.stock_data is None:
             raise ValueError("Stock data not loaded. Run previous steps first.")
 
@@ -183,6 +270,15 @@ class PyStockBotPipeline:
         )
 
         logger.info(f"After feature engineering: {len(self.processed_data.columns)} columns")
+
+        if self.dtype_policy.enabled:
+            from dtype_policy import apply_dtype_policy
+
+            size_before = self.processed_data.estimated_size()
+            self.processed_data = apply_dtype_policy(self.processed_data, self.dtype_policy)
+            size_after = self.processed_data.estimated_size()
+            logger.info(f"Dtype policy: {size_before / 1e6:.1f} MB -> {size_after / 1e6:.1f} MB")
+
         logger.info("✓ Feature engineering completed successfully")
 
     def run_target_creation(self, prediction_horizons: Optional[List[int]] = None) -> List[str]:
@@ -196,6 +292,8 @@ class PyStockBotPipeline:
         logger.info("STEP 4: TARGET CREATION")
         logger.info("=" * 60)
 
+        import polars as pl
+
         if self.processed_data is None:
             raise ValueError("Processed data not available. Run previous steps first.")
 
@@ -229,6 +327,17 @@ class PyStockBotPipeline:
         # Add all targets in one operation
         self.processed_data = self.processed_data.with_columns(target_expressions)
 
+        # Triple-barrier labels are kept in the dataset alongside the fixed-horizon targets
+        if self.labeling.enabled:
+            from labeling import triple_barrier_labels, label_distribution
+
+            label_horizons = self.labeling.horizons or prediction_horizons
+            self.processed_data = triple_barrier_labels(self.processed_data, label_horizons, self.labeling)
+            logger.info(f"Triple-barrier label distribution:\n{label_distribution(self.processed_data, label_horizons)}")
+
+        # The hot cache needs the newest bars, which have features but no targets yet
+        self.latest_features = self.processed_data
+
         # Remove rows without future data (last N rows where N is max horizon)
         max_horizon = max(prediction_horizons)
         self.processed_data = self.processed_data.head(self.processed_data.height - max_horizon)
@@ -251,6 +360,9 @@ class PyStockBotPipeline:
         logger.info("STEP 5: MODEL TRAINING")
         logger.info("=" * 60)
 
+        from model_training import ModelTrainer
+        from matrix_cache import FeatureMatrixCache
+
         if self.processed_data is None:
             raise ValueError("Processed data not available. Run previous steps first.")
 
@@ -262,14 +374,43 @@ class PyStockBotPipeline:
         logger.info(f"Classification targets: {classification_targets}")
 
         # Initialize trainer
-        self.trainer = ModelTrainer()
+        feature_dtype = self.dtype_policy.training_dtype if self.dtype_policy.enabled else None
+        matrix_cache = FeatureMatrixCache(str(self.matrix_cache_dir)) if self.use_matrix_cache else None
+        self.trainer = ModelTrainer(feature_dtype=feature_dtype, matrix_cache=matrix_cache)
+
+        # Optionally prune constant, low-variance and redundant features
+        training_data = self.processed_data
+        feature_columns, selection_report = None, None
+        if self.feature_selection.enabled:
+            from feature_selection import select_features
+
+            candidates = self.trainer.get_feature_columns(self.processed_data, target_columns)
+            # Fit the selection on the training split only; training on the rows complete in every
+            # candidate keeps the trainer's holdout splits identical to the excluded rows
+            model_targets = regression_targets + classification_targets
+            training_data = self.processed_data.drop_nulls(
+                candidates + [col for col in model_targets if col in self.processed_data.columns]
+            )
+            selection_rows = self.trainer.training_split_rows(training_data, regression_targets,
+                                                              classification_targets, candidates,
+                                                              multi_output=self.multi_output)
+            selection = select_features(selection_rows, candidates,
+                                        [col for col in model_targets if col in selection_rows.columns],
+                                        self.feature_selection)
+            feature_columns, selection_report = selection.selected, selection.to_dict()
+            logger.info(f"Feature selection kept {len(feature_columns)} of {len(candidates)} features "
+                        f"(fitted on {selection_rows.height} training rows)")
 
         # Train all models
         results = self.trainer.train_all_models(
-            self.processed_data,
+            training_data,
             regression_targets=regression_targets,
             classification_targets=classification_targets,
-            perform_tuning=perform_tuning
+            perform_tuning=perform_tuning,
+            feature_columns=feature_columns,
+            feature_selection=selection_report,
+            multi_output=self.multi_output,
+            stacking=self.stacking
         )
 
         # Print summary
@@ -278,6 +419,175 @@ class PyStockBotPipeline:
         logger.info("✓ Model training completed successfully")
         return results
 
+    def run_external_training(self, target_columns: List[str]) -> Any:
+        """
+        Step 5 (out-of-core): Train XGBoost models streamed from parquet
+
+        Streams the configured parquet store, or the processed dataset written
+        to disk first, in fixed-size batches instead of building the feature matrix.
+
+        Args:
+            target_columns: List of target column names
+        """
+        logger.info("=" * 60)
+        logger.info("STEP 5: OUT-OF-CORE MODEL TRAINING")
+        logger.info("=" * 60)
+
+        from model_training import ModelTrainer
+        from external_training import train_xgboost_external
+
+        source = self.external_memory.source
+        if source is None:
+            if self.processed_data is None:
+                raise ValueError("Processed data not available. Run previous steps first.")
+            logger.info(f"Writing processed dataset to {self.processed_data_path} for streaming")
+            self.processed_data.write_parquet(str(self.processed_data_path),
+                                              row_group_size=self.external_memory.batch_rows)
+            source = str(self.processed_data_path)
+
+        self.trainer = ModelTrainer()
+        results = train_xgboost_external(
+            self.trainer,
+            source,
+            regression_targets=[col for col in target_columns if 'return' in col],
+            classification_targets=[col for col in target_columns if 'direction' in col],
+            config=self.external_memory
+        )
+
+        self.trainer.print_model_summary()
+        logger.info("✓ Out-of-core model training completed successfully")
+        return results
+
+    def run_incremental_training(self, target_columns: List[str], perform_tuning: bool = False) -> Any:
+        """
+        Step 5 (incremental): Update saved models with new rows
+
+        Falls back to full training when no saved models exist or new targets were requested.
+
+        Args:
+            target_columns: List of target column names
+            perform_tuning: Whether to perform hyperparameter tuning on a full fallback
+        """
+        from model_training import ModelTrainer
+
+        if not self.models_path.exists():
+            logger.info("No saved models found; running full training")
+            return self.run_model_training(target_columns, perform_tuning)
+
+        self.trainer = ModelTrainer()
+        self.trainer.load_models(str(self.models_path))
+
+        missing_targets = [target for target in target_columns if target not in self.trainer.models]
+        if missing_targets:
+            logger.info(f"Saved models lack targets {missing_targets}; running full training")
+            return self.run_model_training(target_columns, perform_tuning)
+
+        logger.info("=" * 60)
+        logger.info("STEP 5: INCREMENTAL MODEL UPDATE")
+        logger.info("=" * 60)
+
+        from incremental_training import update_models
+
+        if self.processed_data is None:
+            raise ValueError("Processed data not available. Run previous steps first.")
+
+        report = update_models(self.trainer, self.processed_data, self.incremental)
+        for row in report.iter_rows(named=True):
+            logger.info(
+                f"{row['target']:<25} {row['mode']:<12} {row['reason']:<20} "
+                f"{row['update_method'] or '-':<20} new rows {row['new_rows']:<5} {row['seconds']:.2f}s"
+            )
+
+        logger.info("✓ Incremental model update completed successfully")
+        return report
+
+    def run_backtest(self, config: Optional[BacktestConfig] = None) -> Any:
+        """
+        Step 5b: Backtest model predictions over the processed dataset
+
+        Note that the dataset includes the rows the models were trained on, so
+        this measures strategy mechanics rather than out-of-sample performance.
+
+        Args:
+            config: Strategy assumptions (thresholds, holding period, costs)
+        """
+        logger.info("=" * 60)
+        logger.info("STEP 5b: BACKTESTING")
+        logger.info("=" * 60)
+
+        from backtesting import backtest_predictions, summarize_backtests
+        import polars as pl
+
+        if self.trainer is None or self.processed_data is None:
+            raise ValueError("Trained models not available. Run model training first.")
+
+        predictions = self.trainer.predict_frame(self.processed_data)
+        prices = self.processed_data.select(["date", "close"])
+        results = backtest_predictions(predictions, prices, config, symbol=self.symbol)
+
+        for row in summarize_backtests(results).iter_rows(named=True):
+            logger.info(
+                f"{row['target']:<25} Sharpe {row['sharpe']:6.2f}  Return {row['total_return']:8.2%}  "
+                f"Max DD {row['max_drawdown']:8.2%}  Turnover {row['avg_daily_turnover']:.3f}"
+            )
+
+        pl.concat([result.to_frame() for result in results.values()]).write_parquet(str(self.backtest_path))
+        logger.info(f"Saved equity curves to {self.backtest_path}")
+        logger.info("✓ Backtesting completed successfully")
+        return results
+
+    def run_backtest_sweep(self, sweep: Optional[BacktestSweepConfig] = None) -> Any:
+        """
+        Step 5c: Sweep strategy parameters over model predictions
+
+        Args:
+            sweep: Parameter grid (thresholds, holding periods, sizing, costs) and worker count
+        """
+        logger.info("=" * 60)
+        logger.info("STEP 5c: BACKTEST PARAMETER SWEEP")
+        logger.info("=" * 60)
+
+        from backtest_sweep import run_sweep, rank_sweep
+
+        if self.trainer is None or self.processed_data is None:
+            raise ValueError("Trained models not available. Run model training first.")
+
+        predictions = self.trainer.predict_frame(self.processed_data)
+        prices = self.processed_data.select(["date", "close"])
+        results = run_sweep(predictions, prices, sweep, output_path=str(self.sweep_path),
+                            symbol=self.symbol, work_dir=str(self.data_dir))
+
+        for row in rank_sweep(results, top=3).iter_rows(named=True):
+            logger.info(
+                f"{row['target']:<25} threshold {row['threshold']:<5} short {str(row['allow_short']):<5} "
+                f"hold {row['holding_period']:<3} {row['position_sizing']:<10} Sharpe {row['sharpe']:6.2f}"
+            )
+
+        logger.info(f"Saved {results.height} sweep results to {self.sweep_path}")
+        logger.info("✓ Backtest sweep completed successfully")
+        return results
+
+    def run_attribution(self) -> None:
+        """
+        Step 5d: Explain every prediction with per-feature contributions
+
+        Writes one row per (row, target) with a Float32 column per feature to
+        attributions.parquet, chunk by chunk.
+        """
+        logger.info("=" * 60)
+        logger.info("STEP 5d: FEATURE ATTRIBUTION")
+        logger.info("=" * 60)
+
+        from attribution import explain_frame
+
+        if self.trainer is None or self.processed_data is None:
+            raise ValueError("Trained models not available. Run model training first.")
+
+        explain_frame(self.trainer, self.processed_data, config=self.attribution,
+                      output_path=str(self.attribution_path))
+        logger.info(f"Saved attributions to {self.attribution_path}")
+        logger.info("✓ Feature attribution completed successfully")
+
     def save_results(self) -> None:
         """
         Step 6: Save processed data and trained models
@@ -296,6 +606,25 @@ class PyStockBotPipeline:
             logger.info(f"Saving trained models to {self.models_path}")
             self.trainer.save_models(str(self.models_path))
 
+            # Save lightweight manifest for fast status/analysis
+            logger.info(f"Saving model manifest to {self.manifest_path}")
+            write_manifest(
+                str(self.manifest_path),
+                self.trainer.models,
+                self.trainer.feature_importance,
+                dataset_path=str(self.processed_data_path),
+                extra={'symbol': self.symbol, 'feature_names': self.trainer.feature_names},
+            )
+
+        # Merge the latest features and predictions into the hot cache (atomic replace); the
+        # frame from before target truncation keeps the last max_horizon bars
+        latest = self.latest_features if self.latest_features is not None else self.processed_data
+        if latest is not None:
+            from hot_cache import update_hot_cache
+
+            version = update_hot_cache(str(self.hot_cache_path), latest, self.trainer, symbol=self.symbol)
+            logger.info(f"Updated latest-features hot cache {self.hot_cache_path} (version {version})")
+
         logger.info("✓ Results saved successfully")
 
     def _load_existing_results(self) -> bool:
@@ -304,6 +633,9 @@ class PyStockBotPipeline:
             logger.error("No existing models found. Run the full pipeline first.")
             return False
 
+        from data_ingestion import load_stock_data
+        from model_training import ModelTrainer
+
         self.trainer = ModelTrainer()
         self.trainer.load_models(str(self.models_path))
 
@@ -318,6 +650,8 @@ class PyStockBotPipeline:
         prediction_horizons: Optional[List[int]] = None,
         perform_tuning: bool = False,
         force_refresh: bool = False,
+        backtest: bool = False,
+        sweep: bool = False,
     ) -> bool:
         """
         Run the complete ML pipeline
@@ -327,6 +661,8 @@ class PyStockBotPipeline:
             prediction_horizons: Days ahead to predict
             perform_tuning: Whether to perform hyperparameter tuning
             force_refresh: Force refresh of all data
+            backtest: Backtest model predictions after training
+            sweep: Sweep backtest parameters after training
         """
         start_time = datetime.now()
         logger.info("🚀 Starting PyStockBot ML Pipeline")
@@ -340,7 +676,7 @@ class PyStockBotPipeline:
             self.run_data_ingestion(years_back, force_refresh)
 
             # Step 2: Technical Indicators
-            self.run_technical_indicators()
+            self.run_technical_indicators(rebuild=force_refresh)
 
             # Step 3: Feature Engineering
             self.run_feature_engineering()
@@ -349,7 +685,21 @@ class PyStockBotPipeline:
             target_columns = self.run_target_creation(prediction_horizons)
 
             # Step 5: Model Training
-            self.run_model_training(target_columns, perform_tuning)
+            if self.incremental.enabled:
+                self.run_incremental_training(target_columns, perform_tuning)
+            elif self.external_memory.enabled:
+                self.run_external_training(target_columns)
+            else:
+                self.run_model_training(target_columns, perform_tuning)
+
+            if self.attribution.enabled:
+                self.run_attribution()
+
+            if backtest:
+                self.run_backtest()
+
+            if sweep:
+                self.run_backtest_sweep()
 
             # Step 6: Save Results
             self.save_results()
@@ -401,15 +751,91 @@ class PyStockBotPipeline:
             logger.info(f"Date range: {self.processed_data['date'].min()} to {self.processed_data['date'].max()}")
 
 
+    def analyze_from_manifest(self) -> bool:
+        """
+        Analyze results using only the run manifest and parquet footer statistics
+
+        Returns:
+            False when no manifest is available
+        """
+        if not self.manifest_path.exists():
+            logger.warning(f"No manifest found at {self.manifest_path}")
+            return False
+
+        manifest = load_manifest(str(self.manifest_path))
+
+        logger.info("=" * 60)
+        logger.info("PIPELINE RESULTS ANALYSIS")
+        logger.info("=" * 60)
+
+        print_manifest_summary(manifest)
+
+        # Feature importance analysis
+        logger.info("\nTOP FEATURES BY MODEL:")
+        for target, summary in manifest['models'].items():
+            if summary['top_features']:
+                logger.info(f"\n{target}:")
+                for i, (feature, score) in enumerate(summary['top_features'][:10], 1):
+                    logger.info(f"  {i:2d}. {feature:<40} {score:.4f}")
+
+        self._log_dataset_stats(manifest)
+        return True
+
+    def print_status(self) -> bool:
+        """Report which pipeline artifacts exist, using metadata only"""
+        logger.info("=" * 60)
+        logger.info("PIPELINE STATUS")
+        logger.info("=" * 60)
+
+        artifacts = {
+            'Stock data': self.stock_data_path,
+            'Processed dataset': self.processed_data_path,
+            'Trained models': self.models_path,
+            'Model manifest': self.manifest_path,
+            'Hot cache': self.hot_cache_path,
+            'Indicator store': self.indicator_store_dir,
+        }
+        for name, path in artifacts.items():
+            logger.info(f"{name:<20} {'✓' if path.exists() else '✗'} {path}")
+
+        if not self.manifest_path.exists():
+            return self.models_path.exists()
+
+        manifest = load_manifest(str(self.manifest_path))
+        logger.info(f"Symbol: {manifest.get('symbol')}")
+        logger.info(f"Created: {manifest.get('created_at')}")
+        logger.info(f"Models: {len(manifest['models'])}")
+        logger.info(f"Model features: {len(manifest.get('feature_names', []))}")
+        self._log_dataset_stats(manifest)
+        return True
+
+    def _log_dataset_stats(self, manifest: dict) -> None:
+        """Log dataset statistics from the manifest snapshot or parquet footer"""
+        stats = get_dataset_stats(manifest, str(self.processed_data_path))
+        if stats is None:
+            return
+        logger.info(f"\nDATASET STATISTICS:")
+        logger.info(f"Total rows: {stats['rows']:,}")
+        logger.info(f"Total features: {stats['columns']:,}")
+        logger.info(f"Date range: {stats['date_min']} to {stats['date_max']}")
+
+
 def run_pipeline_mode(pipeline: PyStockBotPipeline, args: argparse.Namespace) -> bool:
-    if args.analyze_only:
-        success = pipeline._load_existing_results() and pipeline.analyze_results() is None
+    if args.status:
+        success = pipeline.print_status()
+    elif args.analyze_only:
+        # Prefer the metadata-only path; fall back to unpickling older runs
+        success = pipeline.analyze_from_manifest() or (
+            pipeline._load_existing_results() and pipeline.analyze_results() is None
+        )
     else:
         success = pipeline.run_full_pipeline(
             years_back=args.years,
             prediction_horizons=args.horizons,
             perform_tuning=args.tune,
-            force_refresh=args.force_refresh
+            force_refresh=args.force_refresh,
+            backtest=args.backtest,
+            sweep=args.sweep
         ) and pipeline.analyze_results() is None
     return success
 
@@ -424,9 +850,51 @@ def main() -> int:
     parser.add_argument("--tune", action="store_true", help="Perform hyperparameter tuning")
     parser.add_argument("--force-refresh", action="store_true", help="Force refresh all data")
     parser.add_argument("--analyze-only", action="store_true", help="Only run analysis on existing results")
+    parser.add_argument("--status", action="store_true", help="Show pipeline artifacts and dataset stats")
+    parser.add_argument("--compact-dtypes", action="store_true", help="Apply the Float32/Int8 dtype policy")
+    parser.add_argument("--no-matrix-cache", action="store_true", help="Disable the memory-mapped training matrix cache")
+    parser.add_argument("--select-features", action="store_true", help="Prune redundant features before training")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Warm-start saved models with new rows; full retrain on schedule or drift")
+    parser.add_argument("--external-memory", action="store_true",
+                        help="Train XGBoost out-of-core from parquet batches")
+    parser.add_argument("--feature-store", default=None,
+                        help="Parquet file or partitioned directory to train from (implies --external-memory)")
+    parser.add_argument("--multi-output", action="store_true",
+                        help="Train one model per task type across all horizons")
+    parser.add_argument("--stacking", action="store_true",
+                        help="Add a stacking ensemble over cached out-of-fold predictions")
+    parser.add_argument("--explain", action="store_true",
+                        help="Write per-prediction feature attributions (TreeSHAP) after training")
+    parser.add_argument("--timescale", action="store_true",
+                        help="Upsert ingested bars into the TimescaleDB market_data hypertable")
+    parser.add_argument("--timescale-source", action="store_true",
+                        help="Read bars from the TimescaleDB market_data hypertable instead of downloading")
+    parser.add_argument("--timescale-dsn", default=None, help="TimescaleDB connection string")
+    parser.add_argument("--indicator-store", action="store_true",
+                        help="Read precomputed indicators, computing only bars newer than the stored ones")
+    parser.add_argument("--triple-barrier", action="store_true", help="Add triple-barrier labels and meta-labels")
+    parser.add_argument("--backtest", action="store_true", help="Backtest model predictions after training")
+    parser.add_argument("--sweep", action="store_true", help="Sweep backtest parameters after training")
     args = parser.parse_args()
 
-    pipeline = PyStockBotPipeline(data_dir=args.data_dir, symbol=args.symbol)
+    pipeline = PyStockBotPipeline(
+        data_dir=args.data_dir,
+        symbol=args.symbol,
+        dtype_policy=DtypePolicyConfig(enabled=args.compact_dtypes),
+        use_matrix_cache=not args.no_matrix_cache,
+        feature_selection=FeatureSelectionConfig(enabled=args.select_features),
+        labeling=LabelingConfig(enabled=args.triple_barrier),
+        incremental=IncrementalTrainingConfig(enabled=args.incremental),
+        external_memory=ExternalMemoryConfig(enabled=args.external_memory or bool(args.feature_store),
+                                             source=args.feature_store),
+        multi_output=args.multi_output,
+        stacking=args.stacking,
+        attribution=AttributionConfig(enabled=args.explain),
+        timescale=TimescaleConfig(enabled=args.timescale, source=args.timescale_source,
+                                  dsn=args.timescale_dsn or TimescaleConfig.dsn),
+        indicator_store=IndicatorStoreConfig(enabled=args.indicator_store),
+    )
 
     try:
         success = run_pipeline_mode(pipeline, args)
@@ -0,0 +1,156 @@
+"""
+Memory-mapped feature matrix cache for model training
+
+prepare_data_for_training selects, null-filters and converts the full feature
+set to NumPy on every run. This cache persists the cleaned, column-ordered
+feature matrix as a C-contiguous float32 .npy file, and the target vectors in
+their source dtype (so models fit identical labels with and without the
+cache), keyed by a fingerprint of the dataset contents and the feature/target
+column lists.
+Later runs map them read-only with np.load(mmap_mode='r'), so there is no
+conversion cost, and joblib workers (GridSearchCV, cross_val_score) share the
+same OS pages instead of each holding a private copy.
+"""
+import hashlib
+import json
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import polars as pl
+
+CACHE_VERSION = 2
+MATRIX_DTYPE = np.float32
+
+
+class FeatureMatrixCache:
+    """Directory of memory-mapped feature matrices keyed by fingerprint"""
+
+    def __init__(self, cache_dir: str, chunk_rows: int = 65536, max_entries: int = 4):
+        """
+        Args:
+            cache_dir: Directory holding one sub-directory per cached matrix
+            chunk_rows: Rows converted per chunk when writing a new entry
+            max_entries: Most recently used entries to keep on disk
+        """
+        self.cache_dir = Path(cache_dir)
+        self.chunk_rows = chunk_rows
+        self.max_entries = max_entries
+
+    def __repr__(self) -> str:
+        return f"FeatureMatrixCache(cache_dir='{self.cache_dir}', max_entries={self.max_entries})"
+
+    def fingerprint(self, df: pl.DataFrame, feature_columns: List[str], target_columns: List[str]) -> str:
+        """
+        Fingerprint the dataset contents and the feature/target column lists
+
+        Row hashes are computed by Polars without converting the frame, so
+        this is much cheaper than building the matrix itself.
+        """
+        columns = feature_columns + [col for col in target_columns if col in df.columns]
+        selected = df.select(columns)
+
+        digest = hashlib.sha256()
+        digest.update(json.dumps({
+            'version': CACHE_VERSION,
+            'polars': pl.__version__,
+            'columns': columns,
+            'dtypes': [str(dtype) for dtype in selected.dtypes],
+            'rows': selected.height,
+        }).encode())
+        digest.update(selected.hash_rows(seed=0).to_numpy().tobytes())
+        return digest.hexdigest()[:20]
+
+    def load(self, key: str) -> Optional[Tuple[np.ndarray, Dict[str, np.ndarray], List[str]]]:
+        """
+        Map a cached entry read-only
+
+        Returns:
+            Tuple of (features, targets, feature_names) or None on a cache miss
+        """
+        entry_dir = self.cache_dir / key
+        meta_path = entry_dir / "meta.json"
+        if not meta_path.exists():
+            return None
+
+        meta = json.loads(meta_path.read_text())
+        features = np.load(entry_dir / "features.npy", mmap_mode='r')
+        targets = {
+            target: np.load(entry_dir / f"target_{i}.npy", mmap_mode='r')
+            for i, target in enumerate(meta['targets'])
+        }
+        meta_path.touch()  # mark as recently used
+        return features, targets, meta['feature_names']
+
+    def save(self, key: str, df_clean: pl.DataFrame, feature_columns: List[str],
+             target_columns: List[str]) -> Tuple[np.ndarray, Dict[str, np.ndarray], List[str]]:
+        """
+        Write a cleaned frame to the cache in row chunks and map it back
+
+        Args:
+            key: Fingerprint from fingerprint()
+            df_clean: Null-free frame containing feature and target columns
+            feature_columns: Feature columns in matrix column order
+            target_columns: Target columns to store as vectors
+
+        Returns:
+            Tuple of (features, targets, feature_names) backed by the cache files
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        targets = [col for col in target_columns if col in df_clean.columns]
+
+        # Build in a temporary directory and rename so readers never see partial entries
+        tmp_dir = self.cache_dir / f".{key}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir()
+
+        self._write_matrix(tmp_dir / "features.npy", df_clean, feature_columns)
+        for i, target in enumerate(targets):
+            self._write_matrix(tmp_dir / f"target_{i}.npy", df_clean, [target], flatten=True, dtype=None)
+
+        (tmp_dir / "meta.json").write_text(json.dumps({
+            'feature_names': feature_columns,
+            'targets': targets,
+            'rows': df_clean.height,
+        }))
+
+        entry_dir = self.cache_dir / key
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        tmp_dir.rename(entry_dir)
+        print(f"Cached feature matrix {df_clean.height} x {len(feature_columns)} at {entry_dir}")
+
+        self.prune()
+        return self.load(key)
+
+    def _write_matrix(self, path: Path, df: pl.DataFrame, columns: List[str], flatten: bool = False,
+                      dtype: Optional[np.dtype] = MATRIX_DTYPE):
+        """Convert columns chunk by chunk into a .npy memmap (dtype None keeps the source dtype)"""
+        shape = (df.height,) if flatten else (df.height, len(columns))
+        if dtype is None:
+            dtype = df.select(columns).head(0).to_numpy().dtype
+            cast_exprs = pl.col(columns)
+        else:
+            cast_exprs = pl.col(columns).cast(pl.Float32)
+        matrix = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=shape)
+
+        for start in range(0, df.height, self.chunk_rows):
+            chunk = df.slice(start, self.chunk_rows).select(cast_exprs).to_numpy()
+            matrix[start:start + chunk.shape[0]] = chunk.ravel() if flatten else chunk
+
+        matrix.flush()
+        del matrix
+
+    def prune(self):
+        """Remove least recently used entries beyond max_entries"""
+        entries = sorted(
+            (path for path in self.cache_dir.iterdir() if (path / "meta.json").exists()),
+            key=lambda path: (path / "meta.json").stat().st_mtime_ns,
+            reverse=True
+        )
+        for stale in entries[self.max_entries:]:
+            shutil.rmtree(stale, ignore_errors=True)
+
+    def clear(self):
+        """Remove every cached entry"""
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
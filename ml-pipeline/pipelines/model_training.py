@@ -16,21 +16,90 @@ from sklearn.metrics import (
 )
 import xgboost as xgb
 import warnings
+
+from matrix_cache import FeatureMatrixCache
+from incremental_training import build_drift_reference, training_record
+from multi_output import fit_multi_output, holdout_split
+from stacking import train_stacked_candidates
+
 warnings.filterwarnings('ignore')
 
 
 class ModelTrainer:
     """Handles model training and evaluation for stock prediction"""
     
-    def __init__(self, random_state: int = 42):
+    def __init__(self, random_state: int = 42, feature_dtype: Optional[str] = None,
+                 matrix_cache: Optional[FeatureMatrixCache] = None):
+        """
+        Args:
+            random_state: Random state for splits and models
+            feature_dtype: NumPy dtype name for feature matrices (e.g. 'float32');
+                None keeps the dtype Polars produces
+            matrix_cache: Optional memory-mapped cache for prepared matrices;
+                cached feature matrices are always float32, targets keep their dtype
+        """
         self.random_state = random_state
+        self.feature_dtype = feature_dtype
+        self.matrix_cache = matrix_cache
+        self.feature_names = []
+        self.feature_selection = None
+        self.drift_reference = None
+        self._oof_cache = {}
+        self._oof_path = None
         self.models = {}
         self.model_scores = {}
         self.feature_importance = {}
     
+    @staticmethod
+    def oof_cache_path(filepath: str) -> Path:
+        """Out-of-fold cache file stored next to a models file"""
+        path = Path(filepath)
+        return path.with_name(f"{path.stem}_oof.pkl")
+    
+    @property
+    def oof_cache(self) -> Dict[str, Any]:
+        """Stacking out-of-fold caches per target, read on first use after load_models"""
+        if self._oof_cache is None:
+            self._oof_cache = {}
+            if self._oof_path is not None and self._oof_path.exists():
+                with open(self._oof_path, 'rb') as f:
+                    self._oof_cache = pickle.load(f)
+        return self._oof_cache
+    
+    @oof_cache.setter
+    def oof_cache(self, value: Dict[str, Any]):
+        self._oof_cache = value
+    
+    def _to_feature_matrix(self, df: pl.DataFrame, feature_columns: List[str]) -> np.ndarray:
+        """Convert feature columns to a NumPy matrix in the configured dtype"""
+        if self.feature_dtype is None:
+            return df.select(feature_columns).to_numpy()
+        
+        # Cast in Polars so no Float64 intermediate is allocated
+        polars_dtype = pl.Float32 if np.dtype(self.feature_dtype) == np.float32 else pl.Float64
+        return df.select(pl.col(feature_columns).cast(polars_dtype)).to_numpy()
+    
+    def get_feature_columns(self, df: pl.DataFrame, target_columns: List[str],
+                            exclude_patterns: List[str] = None) -> List[str]:
+        """Get candidate feature columns (exclude date, targets, and specified patterns)"""
+        if exclude_patterns is None:
+            exclude_patterns = ['target_', 'future_', 'up_down_']
+        
+        # Event names are free-form strings whose category codes depend on the
+        # frame they were cast in, so they never enter the feature matrix; the
+        # event value, sentiment and decay columns carry the event signal
+        return [
+            col for col in df.columns 
+            if col != 'date' 
+            and col not in target_columns 
+            and not col.endswith('_event_name')
+            and not any(pattern in col for pattern in exclude_patterns)
+        ]
+    
     def prepare_data_for_training(self, df: pl.DataFrame, 
                                 target_columns: List[str],
-                                exclude_patterns: List[str] = None) -> Tuple[np.ndarray, Dict[str, np.ndarray], List[str]]:
+                                exclude_patterns: List[str] = None,
+                                feature_columns: Optional[List[str]] = None) -> Tuple[np.ndarray, Dict[str, np.ndarray], List[str]]:
         """
         Prepare Polars DataFrame for scikit-learn training
         
@@ -38,23 +107,25 @@ class ModelTrainer:
             df: Input Polars DataFrame with features and targets
             target_columns: List of target column names
             exclude_patterns: Patterns to exclude from features (e.g., ['target_', 'future_'])
+            feature_columns: Explicit feature list (e.g. from feature selection);
+                derived from the frame when None
         
         Returns:
             Tuple of (features_array, targets_dict, feature_names)
         """
-        if exclude_patterns is None:
-            exclude_patterns = ['target_', 'future_', 'up_down_']
-        
-        # Get feature columns (exclude date, targets, and specified patterns)
-        feature_columns = [
-            col for col in df.columns 
-            if col != 'date' 
-            and col not in target_columns 
-            and not any(pattern in col for pattern in exclude_patterns)
-        ]
+        if feature_columns is None:
+            feature_columns = self.get_feature_columns(df, target_columns, exclude_patterns)
         
         print(f"Selected {len(feature_columns)} feature columns for training")
         
+        # Map previously prepared matrices for identical data and columns
+        if self.matrix_cache is not None:
+            cache_key = self.matrix_cache.fingerprint(df, feature_columns, target_columns)
+            cached = self.matrix_cache.load(cache_key)
+            if cached is not None:
+                print(f"Loaded cached feature matrix {cached[0].shape} ({cache_key})")
+                return cached
+        
         # Remove rows with any null values in features or targets
         columns_to_check = feature_columns + target_columns
         df_clean = df.select(columns_to_check).drop_nulls()
@@ -64,8 +135,11 @@ class ModelTrainer:
         if df_clean.height == 0:
             raise ValueError("No data remaining after removing nulls")
         
+        if self.matrix_cache is not None:
+            return self.matrix_cache.save(cache_key, df_clean, feature_columns, target_columns)
+        
         # Extract features
-        features = df_clean.select(feature_columns).to_numpy()
+        features = self._to_feature_matrix(df_clean, feature_columns)
         
         # Extract targets
         targets = {
@@ -81,6 +155,49 @@ class ModelTrainer:
         
         return features, targets, feature_columns
     
+    def training_split_rows(self, df: pl.DataFrame, regression_targets: List[str],
+                            classification_targets: List[str], feature_columns: List[str],
+                            multi_output: bool = False) -> pl.DataFrame:
+        """
+        Rows that no target holds out for evaluation
+        
+        Replicates the holdout splits of train_all_models (plain, multi-output and
+        stratified per classification target) on the rows complete in
+        feature_columns and the targets, so statistics fitted on the result, such
+        as feature selection, never see a row the reported metrics are computed on.
+        Train on a frame with the same complete rows for the splits to line up.
+        
+        Args:
+            multi_output: Replicate the joint splits of multi-output training
+        
+        Returns:
+            The complete rows outside every holdout split (features and targets only)
+        """
+        present = [target for target in regression_targets + classification_targets if target in df.columns]
+        df_clean = df.select(feature_columns + present).drop_nulls()
+        rows = np.arange(df_clean.height)
+        holdout = np.zeros(df_clean.height, dtype=bool)
+        
+        if multi_output:
+            for target_list, task_type in [(regression_targets, 'regression'), (classification_targets, 'classification')]:
+                group = [target for target in target_list if target in present]
+                if group:
+                    Y = df_clean.select(group).to_numpy()
+                    _, test_index = holdout_split(Y.astype(int) if task_type == 'classification' else Y,
+                                                  task_type, self.random_state)
+                    holdout[test_index] = True
+            return df_clean.filter(pl.Series(~holdout))
+        
+        _, test_index = train_test_split(rows, test_size=0.2, random_state=self.random_state)
+        holdout[test_index] = True
+        for target in classification_targets:
+            if target in present:
+                _, test_index = train_test_split(rows, test_size=0.2, random_state=self.random_state,
+                                                 stratify=df_clean.get_column(target).to_numpy().astype(int))
+                holdout[test_index] = True
+        
+        return df_clean.filter(pl.Series(~holdout))
+    
     def _get_model_configs(self, task_type: str) -> Dict[str, Any]:
         """Get model configurations for a given task type"""
         base_config = {'random_state': self.random_state}
@@ -98,47 +215,55 @@ class ModelTrainer:
                 'xgboost': xgb.XGBClassifier(n_estimators=100, verbosity=0, **base_config)
             }
     
-    def _evaluate_model(self, model: Any, X_test: np.ndarray, y_test: np.ndarray, 
-                       X_train: np.ndarray, y_train: np.ndarray, task_type: str) -> Dict[str, float]:
-        """Evaluate a model based on task type"""
-        y_pred = model.predict(X_test)
-        
+    def _prediction_metrics(self, y_test: np.ndarray, y_pred: np.ndarray, task_type: str) -> Dict[str, float]:
+        """Holdout metrics of predictions based on task type"""
         if task_type == 'regression':
-            cv_scores = cross_val_score(model, X_train, y_train, cv=5, scoring='r2')
             return {
                 'mse': mean_squared_error(y_test, y_pred),
                 'mae': mean_absolute_error(y_test, y_pred),
                 'r2': r2_score(y_test, y_pred),
-                'cv_mean': cv_scores.mean(),
-                'cv_std': cv_scores.std(),
                 'main_score': r2_score(y_test, y_pred)
             }
         else:  # classification
-            cv_scores = cross_val_score(model, X_train, y_train, cv=5, scoring='accuracy')
             return {
                 'accuracy': accuracy_score(y_test, y_pred),
                 'precision': precision_score(y_test, y_pred, average='weighted', zero_division=0),
                 'recall': recall_score(y_test, y_pred, average='weighted', zero_division=0),
                 'f1': f1_score(y_test, y_pred, average='weighted', zero_division=0),
-                'cv_mean': cv_scores.mean(),
-                'cv_std': cv_scores.std(),
                 'main_score': f1_score(y_test, y_pred, average='weighted', zero_division=0)
             }
+    
+    def _evaluate_model(self, model: Any, X_test: np.ndarray, y_test: np.ndarray, 
+                       X_train: np.ndarray, y_train: np.ndarray, task_type: str) -> Dict[str, float]:
+        """Evaluate a model based on task type"""
+        y_pred = model.predict(X_test)
+        scoring = 'r2' if task_type == 'regression' else 'accuracy'
+        cv_scores = cross_val_score(model, X_train, y_train, cv=5, scoring=scoring)
+        return {
+            **self._prediction_metrics(y_test, y_pred, task_type),
+            'cv_mean': cv_scores.mean(),
+            'cv_std': cv_scores.std()
+        }
 
     def train_models_by_type(self, X: np.ndarray, y: np.ndarray, 
                             target_name: str, feature_names: List[str], 
-                            task_type: str) -> Dict[str, Any]:
+                            task_type: str, stacking: bool = False) -> Dict[str, Any]:
         """Train models for either regression or classification"""
         models = self._get_model_configs(task_type)
         
         split_args = {'test_size': 0.2, 'random_state': self.random_state}
         if task_type == 'classification':
             split_args['stratify'] = y
-            
-        X_train, X_test, y_train, y_test = train_test_split(X, y, **split_args)
         
         print(f"\nTraining {task_type} models for {target_name}:")
         
+        if stacking:
+            # Same split and folds, with out-of-fold predictions cached for the stack
+            results = train_stacked_candidates(self, X, y, target_name, models, task_type, split_args)
+            return self._select_best_model(results, target_name, feature_names, task_type)
+            
+        X_train, X_test, y_train, y_test = train_test_split(X, y, **split_args)
+        
         # Train and evaluate all models
         results = {}
         for name, model in models.items():
@@ -154,6 +279,11 @@ class ModelTrainer:
             else:
                 print(f"    Accuracy: {metrics['accuracy']:.4f}, F1: {metrics['f1']:.4f}, CV Acc: {metrics['cv_mean']:.4f} ± {metrics['cv_std']:.4f}")
         
+        return self._select_best_model(results, target_name, feature_names, task_type)
+    
+    def _select_best_model(self, results: Dict[str, Dict[str, Any]], target_name: str,
+                           feature_names: List[str], task_type: str) -> Dict[str, Any]:
+        """Pick the candidate with the best main score and record its feature importance"""
         # Find best model
         best_name = max(results.keys(), key=lambda k: results[k]['main_score'])
         best_result = results[best_name]
@@ -170,14 +300,14 @@ class ModelTrainer:
         return best_result
     
     def train_regression_models(self, X: np.ndarray, y: np.ndarray, 
-                              target_name: str, feature_names: List[str]) -> Dict[str, Any]:
+                              target_name: str, feature_names: List[str], stacking: bool = False) -> Dict[str, Any]:
         """Train multiple regression models and return the best one"""
-        return self.train_models_by_type(X, y, target_name, feature_names, 'regression')
+        return self.train_models_by_type(X, y, target_name, feature_names, 'regression', stacking)
     
     def train_classification_models(self, X: np.ndarray, y: np.ndarray, 
-                                  target_name: str, feature_names: List[str]) -> Dict[str, Any]:
+                                  target_name: str, feature_names: List[str], stacking: bool = False) -> Dict[str, Any]:
         """Train multiple classification models and return the best one"""
-        return self.train_models_by_type(X, y, target_name, feature_names, 'classification')
+        return self.train_models_by_type(X, y, target_name, feature_names, 'classification', stacking)
     
     def hyperparameter_tuning(self, X: np.ndarray, y: np.ndarray, 
                             model_type: str = 'xgboost', 
@@ -245,7 +375,11 @@ class ModelTrainer:
     def train_all_models(self, df: pl.DataFrame, 
                         regression_targets: List[str] = None,
                         classification_targets: List[str] = None,
-                        perform_tuning: bool = False) -> Dict[str, Any]:
+                        perform_tuning: bool = False,
+                        feature_columns: Optional[List[str]] = None,
+                        feature_selection: Optional[Dict[str, Any]] = None,
+                        multi_output: bool = False,
+                        stacking: bool = False) -> Dict[str, Any]:
         """
         Train all models for given targets
         
@@ -254,6 +388,10 @@ class ModelTrainer:
             regression_targets: List of regression target columns
             classification_targets: List of classification target columns  
             perform_tuning: Whether to perform hyperparameter tuning
+            feature_columns: Optional explicit feature list (e.g. selected features)
+            feature_selection: Optional selection report saved with the models
+            multi_output: Fit one model per task type across all horizons instead of one per target
+            stacking: Add a stacking ensemble over cached out-of-fold predictions as a candidate
         
         Returns:
             Dictionary containing all trained models and results
@@ -267,15 +405,47 @@ class ModelTrainer:
         
         if not all_targets:
             raise ValueError("No targets specified for training")
+        if multi_output and perform_tuning:
+            raise ValueError("Hyperparameter tuning is not supported for multi-output training")
+        if multi_output and stacking:
+            raise ValueError("Stacking is not supported for multi-output training")
         
         print(f"Preparing data for training with {len(all_targets)} targets...")
         
         # Prepare data
-        X, targets, feature_names = self.prepare_data_for_training(df, all_targets)
+        X, targets, feature_names = self.prepare_data_for_training(df, all_targets, feature_columns=feature_columns)
+        self.feature_names = feature_names
+        self.feature_selection = feature_selection
         
         print(f"Training data shape: {X.shape}")
         print(f"Feature count: {len(feature_names)}")
         
+        # Record what the models were trained on for later incremental updates;
+        # each target keeps its own reference because targets retrain separately
+        self.drift_reference = build_drift_reference(X)
+        trained_through = (
+            df.select(['date'] + feature_names + all_targets).drop_nulls().get_column('date').max()
+            if 'date' in df.columns else None
+        )
+        full_record = training_record('full', trained_through, trained_through, 0,
+                                      drift_reference=self.drift_reference)
+        
+        if multi_output:
+            results = {}
+            for target_list, task_type in [(regression_targets, 'regression'), (classification_targets, 'classification')]:
+                present = [target for target in target_list if target in targets]
+                if not present:
+                    continue
+                Y = np.column_stack([targets[target] for target in present])
+                Y = Y.astype(int) if task_type == 'classification' else Y
+                group = fit_multi_output(self, X, Y, present, feature_names, task_type)
+                results.update({
+                    target: {**result, 'type': task_type, 'tuned': False, **full_record, 'multi_output': True}
+                    for target, result in group.items()
+                })
+            self.models = results
+            return results
+        
         # Consolidated training for both regression and classification
         from functools import reduce
         
@@ -294,10 +464,11 @@ class ModelTrainer:
                 
                 if perform_tuning:
                     tuned_model = self.hyperparameter_tuning(X, y, 'xgboost', task_type)
-                    res[target] = {'model': tuned_model, 'type': task_type, 'tuned': True}
+                    res[target] = {'model': tuned_model, 'type': task_type, 'tuned': True, **full_record}
                 else:
-                    best_result = train_func(X, y, target, feature_names)
-                    res[target] = {**best_result, 'type': task_type, 'tuned': False}
+                    best_result = train_func(X, y, target, feature_names, stacking=stacking)
+                    res[target] = {**best_result, 'type': task_type, 'tuned': False, **full_record,
+                                   **({'stacking': True} if stacking else {})}
                 
                 return res
             
@@ -319,12 +490,25 @@ class ModelTrainer:
         model_data = {
             'models': self.models,
             'feature_importance': self.feature_importance,
-            'random_state': self.random_state
+            'random_state': self.random_state,
+            'feature_dtype': self.feature_dtype,
+            'feature_names': self.feature_names,
+            'feature_selection': self.feature_selection,
+            'drift_reference': self.drift_reference
         }
         
         with open(filepath, 'wb') as f:
             pickle.dump(model_data, f)
         
+        # Out-of-fold predictions are only needed to re-blend stacks, so serving
+        # and hot-cache loads do not read them
+        oof_path = self.oof_cache_path(filepath)
+        if self.oof_cache:
+            with open(oof_path, 'wb') as f:
+                pickle.dump(self.oof_cache, f)
+        elif oof_path.exists():
+            oof_path.unlink()
+        
         print(f"Models saved to {filepath}")
     
     def load_models(self, filepath: str):
@@ -335,6 +519,13 @@ class ModelTrainer:
         self.models = model_data['models']
         self.feature_importance = model_data.get('feature_importance', {})
         self.random_state = model_data.get('random_state', 42)
+        self.feature_dtype = model_data.get('feature_dtype')
+        self.feature_names = model_data.get('feature_names', [])
+        self.feature_selection = model_data.get('feature_selection')
+        self.drift_reference = model_data.get('drift_reference')
+        # Files saved before the cache moved out of the models file still carry it
+        self._oof_cache = model_data.get('oof_cache')
+        self._oof_path = self.oof_cache_path(filepath)
         
         print(f"Models loaded from {filepath}")
         print(f"Loaded {len(self.models)} models")
@@ -345,17 +536,48 @@ class ModelTrainer:
             raise ValueError(f"Model for target '{target_name}' not found")
         
         # Prepare features (this should match training preparation)
-        exclude_patterns = ['target_', 'future_', 'up_down_']
-        feature_columns = [
-            col for col in df.columns 
-            if col != 'date' and not any(pattern in col for pattern in exclude_patterns)
-        ]
+        feature_columns = self.feature_names or self.get_feature_columns(df, [])
         
-        X = df.select(feature_columns).drop_nulls().to_numpy()
+        X = self._to_feature_matrix(df.select(feature_columns).drop_nulls(), feature_columns)
         model = self.models[target_name]['model']
         
         return model.predict(X)
     
+    def predict_frame(self, df: pl.DataFrame, target_names: Optional[List[str]] = None,
+                      id_columns: Optional[List[str]] = None) -> pl.DataFrame:
+        """
+        Predict several targets and return them aligned to their rows
+        
+        Args:
+            df: DataFrame with feature columns and identifier columns
+            target_names: Targets to predict (default: all trained models)
+            id_columns: Columns identifying each row (default: ['date'], plus
+                'symbol' when present)
+        
+        Returns:
+            Long DataFrame with id columns, 'target' and 'prediction'
+        """
+        target_names = target_names or list(self.models.keys())
+        if id_columns is None:
+            id_columns = ['date'] + (['symbol'] if 'symbol' in df.columns else [])
+        
+        feature_columns = self.feature_names or self.get_feature_columns(df, [])
+        df_clean = df.select(id_columns + [col for col in feature_columns if col not in id_columns]).drop_nulls()
+        X = self._to_feature_matrix(df_clean, feature_columns)
+        ids = df_clean.select(id_columns)
+        
+        frames = []
+        for target in target_names:
+            if target not in self.models:
+                raise ValueError(f"Model for target '{target}' not found")
+            predictions = self.models[target]['model'].predict(X)
+            frames.append(ids.with_columns([
+                pl.lit(target).alias('target'),
+                pl.Series('prediction', predictions, dtype=pl.Float64)
+            ]))
+        
+        return pl.concat(frames)
+    
     def get_feature_importance(self, target_name: str, top_n: int = 10) -> List[Tuple[str, float]]:
         """Get feature importance for a specific target"""
         if target_name in self.feature_importance:
@@ -372,7 +594,9 @@ class ModelTrainer:
         for target, result in self.models.items():
             print(f"\nTarget: {target}")
             print(f"Type: {result['type']}")
-            print(f"Model: {type(result['model']).__name__}")
+            print(f"Model: {result.get('model_name', type(result['model']).__name__)}")
+            if 'training_mode' in result:
+                print(f"Training: {result['training_mode']} (through {result['trained_through']})")
             
             if result['type'] == 'regression':
                 if 'r2' in result:
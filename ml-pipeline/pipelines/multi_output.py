@@ -0,0 +1,247 @@
+"""
+Multi-output training across prediction horizons
+
+train_all_models fits linear, random forest and XGBoost candidates separately
+for every target_return_{h}d and target_direction_{h}d, repeating tree
+construction over the same feature matrix for each horizon. This module fits
+each candidate once per task type on the stacked (rows x horizons) target
+matrix instead:
+
+- regression: LinearRegression and RandomForestRegressor are natively
+  multi-output; XGBoost grows vector-leaf trees (multi_output_tree)
+- classification: RandomForestClassifier is natively multi-output; XGBoost
+  is trained as a multi-label model; logistic regression is wrapped in
+  MultiOutputClassifier (one cheap fit per horizon)
+
+The best candidate is still chosen per horizon, and each target gets an
+OutputSlice that exposes predict/predict_proba for its column, so
+predict_frame, backtesting and the manifest work unchanged.
+"""
+import json
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import polars as pl
+import xgboost as xgb
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.linear_model import LinearRegression, LogisticRegression
+from sklearn.model_selection import KFold, train_test_split
+from sklearn.multioutput import MultiOutputClassifier
+
+# Vector-leaf trees are slower per node than scalar trees on CPU, so they are
+# kept shallower; one depth-4 multi-output model still costs less than five
+# depth-6 single-output models
+XGBOOST_MULTI_OUTPUT_PARAMS = {'tree_method': 'hist', 'multi_strategy': 'multi_output_tree', 'max_depth': 4}
+
+
+def split_count_importances(model: xgb.XGBModel) -> np.ndarray:
+    """
+    Normalized split counts per feature of an XGBoost model
+
+    Vector-leaf (multi_output_tree) boosters store no split gains and crash
+    XGBoost's built-in importance, so splits are counted from the JSON dump.
+    """
+    dump = json.loads(model.get_booster().save_raw('json'))
+    counts = np.zeros(model.n_features_in_)
+    for tree in dump['learner']['gradient_booster']['model']['trees']:
+        is_split = np.array(tree['left_children']) != -1
+        np.add.at(counts, np.array(tree['split_indices'])[is_split], 1)
+    return counts / max(counts.sum(), 1)
+
+
+class OutputSlice:
+    """One target's view of a model trained jointly on several horizons"""
+
+    def __init__(self, model: Any, index: int, n_outputs: int):
+        self.model = model
+        self.index = index
+        self.n_outputs = n_outputs
+
+    def __repr__(self) -> str:
+        return f"OutputSlice({type(self.model).__name__}, output={self.index} of {self.n_outputs})"
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Predictions for this output"""
+        predictions = np.asarray(self.model.predict(X))
+        return predictions[:, self.index] if predictions.ndim == 2 else predictions
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Class probabilities for this output as an (n_samples, n_classes) array"""
+        probabilities = self.model.predict_proba(X)
+        if isinstance(probabilities, list):
+            return probabilities[self.index]
+        positive = probabilities[:, self.index]
+        return np.column_stack([1 - positive, positive])
+
+    @property
+    def feature_importances_(self) -> np.ndarray:
+        """Feature importances of the shared model"""
+        if isinstance(self.model, xgb.XGBModel) and self.model.get_params().get('multi_strategy') == 'multi_output_tree':
+            return split_count_importances(self.model)
+        return self.model.feature_importances_
+
+
+def get_multi_output_configs(task_type: str, random_state: int = 42) -> Dict[str, Any]:
+    """Multi-output counterparts of ModelTrainer's candidate models"""
+    base_config = {'random_state': random_state}
+
+    if task_type == 'regression':
+        return {
+            'linear_regression': LinearRegression(),
+            'random_forest': RandomForestRegressor(n_estimators=100, **base_config),
+            'xgboost': xgb.XGBRegressor(n_estimators=100, verbosity=0, **XGBOOST_MULTI_OUTPUT_PARAMS, **base_config)
+        }
+    else:  # classification
+        return {
+            'logistic_regression': MultiOutputClassifier(LogisticRegression(max_iter=1000, **base_config)),
+            'random_forest': RandomForestClassifier(n_estimators=100, **base_config),
+            'xgboost': xgb.XGBClassifier(n_estimators=100, verbosity=0, **XGBOOST_MULTI_OUTPUT_PARAMS, **base_config)
+        }
+
+
+def holdout_split(Y: np.ndarray, task_type: str, random_state: int = 42) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Train and holdout row indices of a joint fit
+
+    Regression uses the plain split of single-target training. Classification
+    is stratified like single-target training, on the label combination across
+    horizons; if a combination occurs only once the first target's labels are
+    used instead.
+
+    Returns:
+        Tuple of (train_index, test_index)
+    """
+    rows = np.arange(len(Y))
+    if task_type == 'regression':
+        return train_test_split(rows, test_size=0.2, random_state=random_state)
+
+    _, combination, counts = np.unique(Y.reshape(len(Y), -1), axis=0, return_inverse=True, return_counts=True)
+    stratify = combination.ravel() if counts.min() > 1 else Y.reshape(len(Y), -1)[:, 0]
+    return train_test_split(rows, test_size=0.2, random_state=random_state, stratify=stratify)
+
+
+def _cross_validated_scores(model: Any, X: np.ndarray, Y: np.ndarray, trainer: Any,
+                            task_type: str, cv_folds: int) -> np.ndarray:
+    """Per-fold, per-output scores (R² or accuracy) of one joint model, as (folds, outputs)"""
+    metric = 'r2' if task_type == 'regression' else 'accuracy'
+    scores = []
+    for train_index, test_index in KFold(n_splits=cv_folds).split(X):
+        fold_model = clone(model).fit(X[train_index], Y[train_index])
+        predictions = np.asarray(fold_model.predict(X[test_index])).reshape(len(test_index), -1)
+        scores.append([
+            trainer._prediction_metrics(Y[test_index, i], predictions[:, i], task_type)[metric]
+            for i in range(Y.shape[1])
+        ])
+    return np.array(scores)
+
+
+def fit_multi_output(trainer: Any, X: np.ndarray, Y: np.ndarray, target_names: List[str],
+                     feature_names: List[str], task_type: str, cv_folds: int = 5) -> Dict[str, Dict[str, Any]]:
+    """
+    Fit every candidate once on all horizons and pick the best candidate per horizon
+
+    Args:
+        trainer: ModelTrainer providing the random state, metrics and feature importance store
+        X: Feature matrix
+        Y: (rows, horizons) target matrix, columns ordered like target_names
+        target_names: Target column names
+        feature_names: Feature column names
+        task_type: 'regression' or 'classification'
+        cv_folds: Folds of the joint cross-validation on the training split
+
+    Returns:
+        Dictionary mapping each target to its result (OutputSlice model and metrics)
+    """
+    train_index, test_index = holdout_split(Y, task_type, trainer.random_state)
+    X_train, X_test, Y_train, Y_test = X[train_index], X[test_index], Y[train_index], Y[test_index]
+    print(f"\nTraining multi-output {task_type} models for {len(target_names)} targets:")
+
+    candidates = {}
+    for name, model in get_multi_output_configs(task_type, trainer.random_state).items():
+        print(f"  Training {name}...")
+        start = time.perf_counter()
+        model.fit(X_train, Y_train)
+        fit_seconds = time.perf_counter() - start
+
+        predictions = np.asarray(model.predict(X_test)).reshape(len(X_test), -1)
+        cv_scores = _cross_validated_scores(model, X_train, Y_train, trainer, task_type, cv_folds)
+        metrics = [
+            {
+                **trainer._prediction_metrics(Y_test[:, i], predictions[:, i], task_type),
+                'cv_mean': cv_scores[:, i].mean(),
+                'cv_std': cv_scores[:, i].std(),
+            }
+            for i in range(len(target_names))
+        ]
+        candidates[name] = (model, metrics, fit_seconds)
+        print(f"    Fit: {fit_seconds:.2f}s, mean main score: {np.mean([m['main_score'] for m in metrics]):.4f}")
+
+    results = {}
+    for i, target in enumerate(target_names):
+        best_name = max(candidates, key=lambda name: candidates[name][1][i]['main_score'])
+        model, metrics, fit_seconds = candidates[best_name]
+        print(f"  {target}: best model {best_name} (main score = {metrics[i]['main_score']:.4f})")
+
+        output = OutputSlice(model, i, len(target_names))
+        if best_name in ['random_forest', 'xgboost']:
+            importance = sorted(zip(feature_names, output.feature_importances_), key=lambda x: x[1], reverse=True)
+            trainer.feature_importance[target] = importance[:20]
+
+        results[target] = {
+            'model': output,
+            **metrics[i],
+            'model_name': f"{type(model).__name__} (multi-output)",
+            'fit_seconds': fit_seconds,
+        }
+    return results
+
+
+def benchmark_multi_output(df: pl.DataFrame, regression_targets: List[str],
+                           classification_targets: List[str], random_state: int = 42) -> pl.DataFrame:
+    """
+    Compare per-horizon and multi-output training on holdout score and wall time
+
+    Returns:
+        One row per (mode, target) with the holdout main score, chosen model and
+        the total training time of that mode
+    """
+    from model_training import ModelTrainer
+
+    rows = []
+    for mode, multi_output in [('per_horizon', False), ('multi_output', True)]:
+        trainer = ModelTrainer(random_state=random_state)
+        start = time.perf_counter()
+        results = trainer.train_all_models(df, regression_targets, classification_targets, multi_output=multi_output)
+        seconds = time.perf_counter() - start
+        rows.extend({
+            'mode': mode,
+            'target': target,
+            'model': result.get('model_name', type(result['model']).__name__),
+            'main_score': float(result['main_score']),
+            'total_seconds': seconds,
+        } for target, result in results.items())
+    return pl.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    # Benchmark five horizons on synthetic features
+    np.random.seed(42)
+    n_rows, n_features = 2000, 60
+    horizons = [1, 3, 5, 10, 20]
+    features = np.random.randn(n_rows, n_features)
+    drift = np.cumsum(features[:, :5] @ np.random.randn(5) * 0.1 + np.random.randn(n_rows))
+
+    df = pl.DataFrame({f"f{i}": features[:, i] for i in range(n_features)}).with_columns(
+        [pl.Series(f"target_return_{h}d", np.roll(drift, -h) - drift) for h in horizons] +
+        [pl.Series(f"target_direction_{h}d", (np.roll(drift, -h) > drift).astype(np.int32)) for h in horizons]
+    ).head(n_rows - max(horizons))
+
+    report = benchmark_multi_output(df, [f"target_return_{h}d" for h in horizons],
+                                    [f"target_direction_{h}d" for h in horizons])
+    with pl.Config(tbl_rows=30):
+        print(report)
+    print(report.group_by('mode', maintain_order=True).agg(
+        pl.col('total_seconds').first(), pl.col('main_score').mean().alias('mean_main_score')
+    ))
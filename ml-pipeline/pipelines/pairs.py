@@ -0,0 +1,324 @@
+"""
+Parallel screener for mean-reverting (cointegrated) pairs
+
+Testing every pair of a universe with an Engle-Granger regression per
+rolling window is O(N^2) regressions per date. The screener instead:
+
+- prefilters pairs by the correlation of daily log returns, computed as one
+  matrix multiply per pair of symbol blocks, so the full N x N correlation
+  matrix never exists at once
+- runs the cointegrating regressions of the surviving pairs as a batch: the
+  hedge ratios are column dot products, and the ADF regressions of all
+  spreads are stacked (pairs x days x regressors) normal equations inverted
+  in one batched np.linalg.inv call
+- shards the (block, block) tasks across a process pool whose workers map
+  the log-close panel read-only from one .npy file, like backtest_sweep
+
+Both regression directions are tested and the one with the more negative
+ADF statistic is kept. Results (hedge ratio, half-life, ADF statistic,
+spread z-score) go to a Parquet partition per screening date,
+<data_dir>/pairs/as_of=YYYY-MM-DD/data.parquet; PairsScreener.update only
+screens dates newer than the last stored one.
+"""
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import polars as pl
+
+from backtest_sweep import resolve_workers
+from backtesting import build_price_panel
+from config import PairsConfig
+from indicator_store import PARTITION_FILE, write_atomic
+
+# Log-close panel mapped by each worker process (filled by _attach_panel)
+_SHARED: Dict[str, np.ndarray] = {}
+# Pairs per batch of stacked ADF regressions
+PAIR_CHUNK = 4096
+INDEX_COLUMNS = ['first', 'second', 'dependent']
+RESULT_COLUMNS = ['correlation', 'hedge_ratio', 'intercept', 'adf_stat', 'half_life', 'spread_zscore']
+
+
+def _attach_panel(panel_path: str):
+    """Map the shared log-close panel read-only in the current process"""
+    _SHARED['log_close'] = np.load(panel_path, mmap_mode='r')
+
+
+def engle_granger(dependent: np.ndarray, independent: np.ndarray, adf_lags: int = 1) -> Dict[str, np.ndarray]:
+    """
+    Batched Engle-Granger regressions of log-price series
+
+    Args:
+        dependent: (pairs x days) log prices regressed on `independent`
+        independent: (pairs x days) log prices
+        adf_lags: Lagged spread differences in the ADF regression
+
+    Returns:
+        Arrays per pair: hedge_ratio, intercept, adf_stat (t-statistic of the
+        lagged spread, no constant), half_life (days, from the AR(1) fit of
+        the spread; NaN when it does not mean-revert) and spread_zscore of
+        the last day
+    """
+    y = dependent - dependent.mean(axis=1, keepdims=True)
+    x = independent - independent.mean(axis=1, keepdims=True)
+    hedge = np.einsum('pt,pt->p', y, x) / np.einsum('pt,pt->p', x, x)
+    intercept = dependent.mean(axis=1) - hedge * independent.mean(axis=1)
+    spread = y - hedge[:, None] * x
+
+    # ADF: diff_t = gamma * spread_{t-1} + sum_l phi_l * diff_{t-l} + e_t, as batched normal equations
+    diff = np.diff(spread, axis=1)
+    days = diff.shape[1]
+    target = diff[:, adf_lags:]
+    regressors = [spread[:, adf_lags:days]] + [diff[:, adf_lags - lag:days - lag] for lag in range(1, adf_lags + 1)]
+    k = len(regressors)
+    gram = np.empty((len(spread), k, k))
+    for i in range(k):
+        for j in range(i, k):
+            gram[:, i, j] = gram[:, j, i] = np.einsum('pn,pn->p', regressors[i], regressors[j])
+    moments = np.stack([np.einsum('pn,pn->p', regressor, target) for regressor in regressors], axis=1)
+    inverse = np.linalg.inv(gram)
+    theta = np.einsum('pij,pj->pi', inverse, moments)
+    # Residual sum of squares without forming the residuals: y'y - theta'X'y
+    residual_ss = np.einsum('pn,pn->p', target, target) - np.einsum('pi,pi->p', theta, moments)
+    variance = residual_ss / (target.shape[1] - k)
+
+    lagged = spread[:, :-1]
+    gamma = np.einsum('pn,pn->p', diff, lagged) / np.einsum('pn,pn->p', lagged, lagged)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        adf = theta[:, 0] / np.sqrt(variance * inverse[:, 0, 0])
+        half_life = np.where((gamma < 0) & (gamma > -1), -np.log(2) / np.log1p(gamma), np.nan)
+        zscore = spread[:, -1] / spread.std(axis=1)
+    return {'hedge_ratio': hedge, 'intercept': intercept, 'adf_stat': adf, 'half_life': half_life,
+            'spread_zscore': zscore}
+
+
+def _screen_block(end: int, first: List[int], second: List[int], config: PairsConfig) -> Dict[str, np.ndarray]:
+    """Correlation prefilter and Engle-Granger tests for the pairs of two symbol blocks"""
+    window = _SHARED['log_close'][end - config.lookback:end + 1]
+    left, right = np.asarray(window[:, first]), np.asarray(window[:, second])
+    first, second = np.asarray(first), np.asarray(second)
+
+    def standardized(prices: np.ndarray) -> np.ndarray:
+        returns = np.diff(prices, axis=0)
+        returns = returns - returns.mean(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return returns / np.sqrt((returns ** 2).sum(axis=0))
+
+    # Names with a gap in the window are skipped (NaN correlations fail the threshold)
+    correlation = standardized(left).T @ standardized(right)
+    rows, cols = np.nonzero(correlation >= config.min_correlation)
+    if first[0] == second[0]:
+        # Diagonal block: each pair once, without self-pairs
+        upper = rows < cols
+        rows, cols = rows[upper], cols[upper]
+
+    results = {key: [np.empty(0, dtype=np.int64)] for key in INDEX_COLUMNS}
+    results.update({key: [np.empty(0)] for key in RESULT_COLUMNS})
+    for start in range(0, len(rows), PAIR_CHUNK):
+        a, b = rows[start:start + PAIR_CHUNK], cols[start:start + PAIR_CHUNK]
+        # Both regression directions in one batch; keep the one with the stronger ADF statistic
+        forward = engle_granger(np.vstack([left[:, a].T, right[:, b].T]),
+                                np.vstack([right[:, b].T, left[:, a].T]), config.adf_lags)
+        flipped = forward['adf_stat'][len(a):] < forward['adf_stat'][:len(a)]
+        pick = np.where(flipped, np.arange(len(a)) + len(a), np.arange(len(a)))
+        results['first'].append(first[a])
+        results['second'].append(second[b])
+        results['dependent'].append(np.where(flipped, second[b], first[a]))
+        results['correlation'].append(correlation[a, b])
+        for key, values in forward.items():
+            results[key].append(values[pick])
+    return {key: np.concatenate(values) for key, values in results.items()}
+
+
+def screen_pairs(prices: pl.DataFrame, as_of: Optional[List[date]] = None,
+                 config: Optional[PairsConfig] = None, work_dir: Optional[str] = None) -> pl.DataFrame:
+    """
+    Screen every pair of the universe on one or more dates
+
+    Args:
+        prices: Frame with symbol, date and close columns
+        as_of: Screening dates (default: the last price date); each needs
+            config.lookback earlier price dates
+        config: Window, correlation threshold, block size and workers
+        work_dir: Directory for the temporary shared panel (defaults to the system temp dir)
+
+    Returns:
+        One row per prefiltered pair and date: as_of, symbol (dependent leg),
+        pair_symbol, correlation, hedge_ratio, intercept (log prices),
+        adf_stat, half_life, spread_zscore and cointegrated (adf_stat below
+        config.critical_value), strongest ADF statistic first
+    """
+    config = config or PairsConfig()
+    panel = build_price_panel(prices)
+    dates = panel.dates.to_list()
+    ends = [len(dates) - 1] if as_of is None else [dates.index(day) for day in as_of if day in dates]
+    ends = [end for end in ends if end >= config.lookback]
+
+    n = len(panel.symbols)
+    blocks = [list(range(start, min(start + config.block_size, n))) for start in range(0, n, config.block_size)]
+    tasks = [(end, first, second) for end in ends
+             for i, first in enumerate(blocks) for second in blocks[i:]]
+    workers = resolve_workers(config.n_jobs, len(tasks))
+
+    with tempfile.TemporaryDirectory(dir=work_dir, prefix="pairs_") as panel_dir:
+        panel_path = str(Path(panel_dir) / "log_close.npy")
+        with np.errstate(divide='ignore', invalid='ignore'):
+            np.save(panel_path, np.log(panel.close))
+        if workers == 1:
+            _attach_panel(panel_path)
+            try:
+                results = [_screen_block(*task, config) for task in tasks]
+            finally:
+                _SHARED.clear()
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_attach_panel,
+                                     initargs=(panel_path,)) as executor:
+                futures = [executor.submit(_screen_block, *task, config) for task in tasks]
+                results = [future.result() for future in futures]
+
+    symbols = pl.Series(panel.symbols)
+    frames = [
+        pl.DataFrame({
+            'as_of': pl.Series([dates[end]] * len(result['first']), dtype=pl.Date),
+            'symbol': symbols.gather(result['dependent']),
+            'pair_symbol': symbols.gather(np.where(result['dependent'] == result['first'],
+                                                   result['second'], result['first'])),
+            **{key: result[key].astype(np.float64) for key in RESULT_COLUMNS},
+        })
+        for (end, _, _), result in zip(tasks, results)
+    ]
+    schema = {'as_of': pl.Date, 'symbol': pl.String, 'pair_symbol': pl.String,
+              **{key: pl.Float64 for key in RESULT_COLUMNS}}
+    return (
+        pl.concat([pl.DataFrame(schema=schema)] + frames)
+        .with_columns(pl.col(RESULT_COLUMNS).fill_nan(None))
+        .with_columns((pl.col('adf_stat') < config.critical_value).alias('cointegrated'))
+        .sort(['as_of', 'adf_stat'])
+    )
+
+
+class PairsScreener:
+    """Daily pairs screens stored as one Parquet partition per screening date"""
+
+    def __init__(self, root: str, config: Optional[PairsConfig] = None):
+        self.root = Path(root)
+        self.config = config or PairsConfig()
+
+    def __repr__(self) -> str:
+        return f"PairsScreener('{self.root}', dates={len(self.dates)})"
+
+    @property
+    def dates(self) -> List[date]:
+        """Screening dates with stored results"""
+        if not self.root.exists():
+            return []
+        return sorted(date.fromisoformat(path.parent.name.split('=', 1)[1])
+                      for path in self.root.glob(f"as_of=*/{PARTITION_FILE}"))
+
+    def update(self, prices: pl.DataFrame, start: Optional[date] = None) -> Dict[date, int]:
+        """
+        Screen the price dates after the last stored screen
+
+        Args:
+            prices: Frame with symbol, date and close columns
+            start: First date to screen when nothing is stored yet (default:
+                only the last price date)
+
+        Returns:
+            Pairs written per screened date
+        """
+        stored = self.dates
+        # Dates with a full lookback window of earlier prices
+        available = prices.get_column('date').unique().sort().slice(self.config.lookback)
+        if stored:
+            pending = available.filter(available > stored[-1]).to_list()
+        elif start is not None:
+            pending = available.filter(available >= start).to_list()
+        else:
+            pending = available.tail(1).to_list()
+        if not pending:
+            return {}
+
+        results = screen_pairs(prices, pending, self.config)
+        written = {}
+        # Dates without pairs still get an (empty) partition, so they are not screened again
+        for day in pending:
+            frame = results.filter(pl.col('as_of') == day).drop('as_of')
+            write_atomic(frame, self.root / f"as_of={day.isoformat()}" / PARTITION_FILE)
+            written[day] = frame.height
+        return written
+
+    def read(self, start: Optional[date] = None, end: Optional[date] = None,
+             cointegrated_only: bool = False) -> pl.DataFrame:
+        """Stored screens in [start, end] with an as_of column"""
+        files = [self.root / f"as_of={day.isoformat()}" / PARTITION_FILE for day in self.dates
+                 if (start is None or day >= start) and (end is None or day <= end)]
+        if not files:
+            return pl.DataFrame()
+        frames = [pl.read_parquet(path).select(pl.lit(date.fromisoformat(path.parent.name.split('=', 1)[1]))
+                                               .alias('as_of'), pl.all())
+                  for path in files]
+        result = pl.concat(frames)
+        return result.filter(pl.col('cointegrated')) if cointegrated_only else result
+
+
+def synthetic_pairs(n_symbols: int, n_days: int, n_pairs: int = 10, seed: int = 42) -> pl.DataFrame:
+    """
+    Random-walk closes in long format where symbol 2k+1 is cointegrated with 2k for k < n_pairs
+
+    The planted pairs share a random walk (times a hedge ratio) and differ by a
+    mean-reverting AR(1) spread; every other symbol is an independent walk
+    with a common market component.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pl.date_range(pl.date(2000, 1, 3), pl.date(2000, 1, 3) + pl.duration(days=n_days - 1), "1d",
+                          eager=True)
+    log_close = np.cumsum(rng.normal(0.0003, 0.01, n_days)[None, :]
+                          + rng.normal(0, 0.015, (n_symbols, n_days)), axis=1) + np.log(50)
+    spread = np.zeros((n_pairs, n_days))
+    noise = rng.normal(0, 0.004, (n_pairs, n_days))
+    for t in range(1, n_days):
+        spread[:, t] = 0.9 * spread[:, t - 1] + noise[:, t]
+    hedge = rng.uniform(0.5, 1.5, n_pairs)
+    leader = log_close[0:2 * n_pairs:2]
+    log_close[1:2 * n_pairs:2] = 0.5 + hedge[:, None] * (leader - np.log(50)) + np.log(50) + spread
+    return pl.DataFrame({
+        'symbol': np.repeat([f"S{i:05d}" for i in range(n_symbols)], n_days),
+        'date': np.tile(dates.to_numpy(), n_symbols),
+        'close': np.exp(log_close).ravel(),
+    })
+
+
+if __name__ == "__main__":
+    # Example: 1,500 symbols (~1.1M pairs) screened on one date
+    import time
+
+    prices = synthetic_pairs(1500, 300, n_pairs=50)
+    config = PairsConfig(min_correlation=0.3)
+
+    start = time.perf_counter()
+    screened = screen_pairs(prices, config=config)
+    seconds = time.perf_counter() - start
+    print(f"Screened {1500 * 1499 // 2:,} pairs in {seconds:.2f}s: {screened.height:,} above correlation "
+          f"{config.min_correlation}, {screened['cointegrated'].sum():,} cointegrated")
+
+    # Reference: hedge-ratio and ADF least squares per prefiltered pair (one direction) in a Python loop
+    panel = build_price_panel(prices)
+    log_close = np.log(panel.close[-(config.lookback + 1):])
+    index = {symbol: i for i, symbol in enumerate(panel.symbols)}
+    sample = screened.head(2000)
+    start = time.perf_counter()
+    for a, b in zip(sample['symbol'], sample['pair_symbol']):
+        y, x = log_close[:, index[a]], log_close[:, index[b]]
+        (_, hedge), *_ = np.linalg.lstsq(np.column_stack([np.ones_like(x), x]), y, rcond=None)
+        spread = y - hedge * x
+        diff = np.diff(spread)
+        design = np.column_stack([spread[1:-1], diff[:-1]])
+        theta, residual_ss, *_ = np.linalg.lstsq(design, diff[1:], rcond=None)
+        stat = theta[0] / np.sqrt(residual_ss[0] / (len(design) - 2) * np.linalg.inv(design.T @ design)[0, 0])
+    loop_seconds = (time.perf_counter() - start) / sample.height * screened.height
+    print(f"Per-pair loop over the prefiltered pairs (extrapolated): {loop_seconds:.2f}s")
+    print(screened.filter(pl.col('cointegrated')).head())
@@ -0,0 +1,442 @@
+"""
+Vectorized portfolio valuation and P&L over the transactions table
+
+Computes holdings, FIFO cost basis, realized/unrealized P&L, time-weighted
+returns and exposure for every portfolio of db/init/schema.sql at once,
+without a per-transaction loop:
+
+- transactions are sorted by (portfolio, symbol, executed_at) and turned into
+  running totals (bought/sold quantity, buy cost, sale proceeds) with grouped
+  cumulative sums
+- FIFO matching is a piecewise-linear lookup: the cost of the first S shares
+  ever sold is the buy cost accumulated up to cumulative bought quantity S, so
+  one as-of join of the cumulative sold quantity against the buy lots'
+  starting quantity gives the cost of every sale
+- daily positions come from an as-of join of the end-of-day ledger state onto
+  a (portfolio, symbol) x trading-date grid built with numpy index arithmetic,
+  with closes gathered from a forward-filled (symbol, trading-date) matrix;
+  portfolios and symbols travel as integer codes
+- per-portfolio series are grouped sums, and time-weighted returns are
+  cumulative products of daily returns net of trade flows
+
+Positions are long-only: a sale larger than the open position raises.
+Transactions load with one COPY ... TO STDOUT (FORMAT CSV) and prices through
+timescale.MarketDataReader; psycopg is imported only for database reads.
+"""
+import io
+from datetime import date, datetime
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+import polars as pl
+
+from config import PortfolioConfig, TimescaleConfig
+
+KEYS = ['portfolio_id', 'symbol']
+TRANSACTION_SCHEMA = {
+    'portfolio_id': pl.String,
+    'symbol': pl.String,
+    'transaction_type': pl.String,
+    'quantity': pl.Float64,
+    'price': pl.Float64,
+    'executed_at': pl.Datetime('us', 'UTC'),
+}
+STATE_COLUMNS = ['position', 'cum_buy_cost', 'cum_proceeds', 'cost_basis', 'realized_pnl']
+
+
+def load_transactions(config: Optional[PortfolioConfig] = None, timescale: Optional[TimescaleConfig] = None,
+                      portfolio_ids: Optional[List[str]] = None,
+                      start: Optional[Union[date, datetime]] = None,
+                      end: Optional[Union[date, datetime]] = None) -> pl.DataFrame:
+    """
+    Transactions in [start, end) as one CSV COPY (range filters prune the executed_at partitions)
+
+    Args:
+        config: Transactions table settings
+        timescale: Connection settings (dsn, connect_timeout)
+        portfolio_ids: Portfolios to load (default: all)
+        start: Inclusive lower bound of executed_at
+        end: Exclusive upper bound of executed_at
+
+    Returns:
+        Frame with the TRANSACTION_SCHEMA columns
+    """
+    import psycopg
+    from psycopg import sql
+
+    from timescale import as_utc
+
+    config = config or PortfolioConfig()
+    timescale = timescale or TimescaleConfig()
+    filters, params = [sql.SQL("TRUE")], {}
+    if portfolio_ids is not None:
+        filters.append(sql.SQL("portfolio_id = ANY(%(portfolio_ids)s::uuid[])"))
+        params['portfolio_ids'] = list(portfolio_ids)
+    if start is not None:
+        filters.append(sql.SQL("executed_at >= %(start)s"))
+        params['start'] = as_utc(start)
+    if end is not None:
+        filters.append(sql.SQL("executed_at < %(end)s"))
+        params['end'] = as_utc(end)
+    query = sql.SQL(
+        "COPY (SELECT portfolio_id::text, symbol, transaction_type, quantity::float8, price::float8, "
+        "to_char(executed_at AT TIME ZONE 'UTC', 'YYYY-MM-DD\"T\"HH24:MI:SS.US') "
+        "FROM {table} WHERE {filters}) TO STDOUT (FORMAT CSV)"
+    ).format(table=sql.Identifier(config.transactions_table), filters=sql.SQL(" AND ").join(filters))
+
+    with psycopg.connect(timescale.dsn, connect_timeout=max(int(timescale.connect_timeout), 1)) as conn:
+        with conn.cursor() as cur, cur.copy(query, params) as copy:
+            payload = b"".join(copy)
+    return pl.read_csv(io.BytesIO(payload), has_header=False, new_columns=list(TRANSACTION_SCHEMA),
+                       schema_overrides={**TRANSACTION_SCHEMA, 'executed_at': pl.String}).with_columns(
+        pl.col('executed_at').str.to_datetime('%Y-%m-%dT%H:%M:%S%.f', time_unit='us', time_zone='UTC')
+    )
+
+
+def build_ledger(transactions: pl.DataFrame, config: Optional[PortfolioConfig] = None) -> pl.DataFrame:
+    """
+    Running position, FIFO cost basis and realized P&L after every transaction
+
+    Args:
+        transactions: portfolio_id, symbol, transaction_type ('buy'/'sell'),
+            quantity, price and executed_at columns
+        config: Quantity tolerance for closed positions and oversells
+
+    Returns:
+        Transactions sorted by (portfolio, symbol, executed_at) with
+        position, cum_buy_cost, cum_proceeds, cost_basis (of the open
+        position) and realized_pnl (cumulative) columns
+
+    Raises:
+        ValueError: If a sale exceeds the open position
+    """
+    config = config or PortfolioConfig()
+    is_buy = pl.col('transaction_type') == 'buy'
+    # Buys before sells at equal timestamps
+    ledger = transactions.sort(KEYS + ['executed_at', 'transaction_type']).with_columns(
+        pl.when(is_buy).then(pl.col('quantity')).otherwise(0.0).cum_sum().over(KEYS).alias('cum_bought'),
+        pl.when(is_buy).then(pl.col('quantity') * pl.col('price')).otherwise(0.0).cum_sum().over(KEYS)
+        .alias('cum_buy_cost'),
+        pl.when(is_buy).then(0.0).otherwise(pl.col('quantity')).cum_sum().over(KEYS).alias('cum_sold'),
+        pl.when(is_buy).then(0.0).otherwise(pl.col('quantity') * pl.col('price')).cum_sum().over(KEYS)
+        .alias('cum_proceeds'),
+    ).with_columns((pl.col('cum_bought') - pl.col('cum_sold')).alias('position'))
+
+    oversold = ledger.filter(pl.col('position') < -config.quantity_tolerance)
+    if oversold.height:
+        first = oversold.row(0, named=True)
+        raise ValueError(f"{oversold.height} sales exceed the open position "
+                         f"(first: {first['symbol']} in portfolio {first['portfolio_id']} at {first['executed_at']})")
+
+    # Buy lots cover the cumulative quantity range [lot_start, lot_start + quantity)
+    lots = ledger.filter(is_buy).select(
+        *KEYS,
+        (pl.col('cum_bought') - pl.col('quantity')).alias('lot_start'),
+        (pl.col('cum_buy_cost') - pl.col('quantity') * pl.col('price')).alias('lot_cost'),
+        pl.col('price').alias('lot_price'),
+    ).sort('lot_start')
+    ledger = (
+        ledger.with_row_index('_order')
+        .sort('cum_sold')
+        .join_asof(lots, left_on='cum_sold', right_on='lot_start', by=KEYS, strategy='backward')
+        .sort('_order')
+        # FIFO cost of everything sold so far
+        .with_columns((pl.col('lot_cost') + (pl.col('cum_sold') - pl.col('lot_start')) * pl.col('lot_price'))
+                      .fill_null(0.0).alias('_sold_cost'))
+        .with_columns(
+            pl.when(pl.col('position').abs() <= config.quantity_tolerance).then(0.0)
+            .otherwise(pl.col('position')).alias('position'),
+            pl.when(pl.col('position').abs() <= config.quantity_tolerance).then(0.0)
+            .otherwise(pl.col('cum_buy_cost') - pl.col('_sold_cost')).alias('cost_basis'),
+            (pl.col('cum_proceeds') - pl.col('_sold_cost')).alias('realized_pnl'),
+        )
+    )
+    return ledger.drop(['_order', '_sold_cost', 'lot_start', 'lot_cost', 'lot_price', 'cum_bought', 'cum_sold'])
+
+
+def current_positions(ledger: pl.DataFrame, prices: pl.DataFrame,
+                      as_of: Optional[Union[date, datetime]] = None) -> pl.DataFrame:
+    """
+    Holdings and P&L per (portfolio, symbol) at the latest (or as_of) close
+
+    Args:
+        ledger: build_ledger output
+        prices: symbol, date and close columns
+        as_of: Valuation date (default: latest price date)
+
+    Returns:
+        Frame with position, avg_cost, cost_basis, close, market_value,
+        unrealized_pnl and realized_pnl per (portfolio, symbol)
+    """
+    if as_of is not None:
+        as_of = as_of.date() if isinstance(as_of, datetime) else as_of
+        ledger = ledger.filter(pl.col('executed_at').dt.date() <= as_of)
+        prices = prices.filter(pl.col('date') <= as_of)
+    latest_prices = prices.sort('date').group_by('symbol').last().select('symbol', 'close')
+    return (
+        ledger.group_by(KEYS, maintain_order=True).last()
+        .select(KEYS + STATE_COLUMNS)
+        .join(latest_prices, on='symbol', how='left')
+        .with_columns(
+            (pl.col('cost_basis') / pl.col('position')).fill_nan(None).alias('avg_cost'),
+            (pl.col('position') * pl.col('close')).alias('market_value'),
+        )
+        .with_columns((pl.col('market_value') - pl.col('cost_basis')).alias('unrealized_pnl'))
+        .select(KEYS + ['position', 'avg_cost', 'cost_basis', 'close', 'market_value',
+                        'unrealized_pnl', 'realized_pnl'])
+    )
+
+
+def daily_positions(ledger: pl.DataFrame, prices: pl.DataFrame,
+                    start: Optional[date] = None, end: Optional[date] = None) -> pl.DataFrame:
+    """
+    End-of-day state of every (portfolio, symbol) from its first trade on
+
+    Args:
+        ledger: build_ledger output
+        prices: symbol, date and close columns; their dates form the calendar
+        start: First valuation date (default: first price date); the trading
+            day before it is included as a baseline
+        end: Last valuation date (default: last price date)
+
+    Returns:
+        Long frame sorted by (portfolio, symbol, date) with pf_id,
+        portfolio_id and symbol (categorical), date, position, close,
+        market_value, cost_basis, realized_pnl, cum_buy_cost and cum_proceeds
+    """
+    full_calendar = prices.get_column('date').unique().sort()
+    calendar = full_calendar
+    if start is not None:
+        # Keep the previous trading day as the baseline of the first day's flows and P&L
+        before = calendar.filter(calendar < start)
+        calendar = calendar.filter(calendar >= (before.max() if len(before) else start))
+    if end is not None:
+        calendar = calendar.filter(calendar <= end)
+
+    # Integer codes keep the grid and the as-of join keys narrow
+    pairs = (
+        ledger.group_by(KEYS).agg(pl.col('executed_at').min().dt.date().alias('first_date'))
+        .sort(KEYS)
+        .with_row_index('pair_id')
+        .with_columns((pl.col('portfolio_id').rank('dense') - 1).cast(pl.UInt32).alias('pf_id'),
+                      (pl.col('symbol').rank('dense') - 1).cast(pl.UInt32).alias('symbol_id'))
+    )
+    states = (
+        ledger.join(pairs.select(KEYS + ['pair_id']), on=KEYS)
+        .with_columns(pl.col('executed_at').dt.date().alias('date'))
+        .group_by(['pair_id', 'date']).agg(pl.col(STATE_COLUMNS).last())
+        .sort(['pair_id', 'date'])
+    )
+    # Dense (symbol, trading day) close matrix, carrying the last close over missing days
+    symbols = pairs.select('symbol', 'symbol_id').unique().sort('symbol_id')
+    closes = (
+        symbols.join(pl.DataFrame({'date': full_calendar}), how='cross')
+        .join(prices.select('symbol', 'date', 'close'), on=['symbol', 'date'], how='left')
+        .sort(['symbol_id', 'date'])
+        .select(pl.col('close').forward_fill().over('symbol_id'))
+        .get_column('close').to_numpy().reshape(symbols.height, len(full_calendar))
+    )
+
+    # Grid rows: each pair from the calendar index of its first trade date, pair-major so
+    # every as-of group is already sorted by date and the result is in output order
+    dates = calendar.to_numpy()
+    first = np.searchsorted(dates, pairs.get_column('first_date').to_numpy())
+    lengths = len(dates) - first
+    pair_index = np.repeat(np.arange(pairs.height), lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    grid_dates = dates[first[pair_index] + offsets]
+    symbol_id = pairs.get_column('symbol_id').to_numpy()[pair_index]
+    grid = pl.DataFrame({
+        'pair_id': pairs.get_column('pair_id').to_numpy()[pair_index],
+        'pf_id': pairs.get_column('pf_id').to_numpy()[pair_index],
+        'date': pl.Series(grid_dates).cast(pl.Date),
+        'close': closes[symbol_id, np.searchsorted(full_calendar.to_numpy(), grid_dates)],
+    })
+
+    daily = (
+        grid.join_asof(states, on='date', by='pair_id', strategy='backward', check_sortedness=False)
+        .with_columns((pl.col('position') * pl.col('close')).fill_null(0.0).alias('market_value'))
+    )
+    names = pairs.select(pl.col('portfolio_id').cast(pl.Categorical), pl.col('symbol').cast(pl.Categorical))
+    return daily.with_columns(
+        names.get_column('portfolio_id').gather(daily.get_column('pair_id')),
+        names.get_column('symbol').gather(daily.get_column('pair_id')),
+    ).select(['pf_id', 'portfolio_id', 'symbol', 'date', 'position', 'close', 'market_value',
+              'cost_basis', 'realized_pnl', 'cum_buy_cost', 'cum_proceeds'])
+
+
+def portfolio_timeseries(daily: pl.DataFrame, config: Optional[PortfolioConfig] = None,
+                         start: Optional[date] = None) -> pl.DataFrame:
+    """
+    Daily value, P&L, exposure and time-weighted return per portfolio
+
+    The daily return is the day's P&L over the capital at risk that day
+    (previous market value plus the day's purchases); the time-weighted return
+    chains daily returns, so it is unaffected by the size and timing of trades.
+
+    Args:
+        daily: daily_positions output
+        config: Quantity tolerance for counting open positions
+        start: First reported date; earlier (baseline) rows only seed the differences
+
+    Returns:
+        Frame per (portfolio_id, date) with market_value, cost_basis,
+        realized_pnl, unrealized_pnl, total_pnl, net_flow, daily_pnl,
+        daily_return, twr, positions and max_weight
+    """
+    config = config or PortfolioConfig()
+
+    # Dense (portfolio, trading day) bins: sums are bincounts, the largest holding a maximum.at
+    calendar = daily.get_column('date').unique().sort()
+    pf_id = daily.get_column('pf_id').to_numpy().astype(np.int64)
+    day = np.searchsorted(calendar.to_numpy(), daily.get_column('date').to_numpy())
+    key = pf_id * len(calendar) + day
+    size = (int(pf_id.max()) + 1) * len(calendar) if len(pf_id) else 0
+    present = np.flatnonzero(np.bincount(key, minlength=size))
+    sums = {col: np.bincount(key, weights=daily.get_column(col).to_numpy(), minlength=size)[present]
+            for col in ['market_value', 'cost_basis', 'realized_pnl', 'cum_buy_cost', 'cum_proceeds']}
+    open_positions = np.abs(daily.get_column('position').to_numpy()) > config.quantity_tolerance
+    largest = np.full(size, -np.inf)
+    np.maximum.at(largest, key, daily.get_column('market_value').to_numpy())
+
+    # Portfolio names from the first row of every run of equal pf_id
+    starts = np.flatnonzero(np.r_[True, pf_id[1:] != pf_id[:-1]]) if len(pf_id) else np.empty(0, dtype=np.int64)
+    names = dict(zip(pf_id[starts].tolist(), daily.get_column('portfolio_id').cast(pl.String).gather(starts).to_list()))
+
+    series = (
+        pl.DataFrame({
+            'pf_id': present // len(calendar),
+            'date': calendar.gather(present % len(calendar)),
+            **sums,
+            'positions': np.bincount(key, weights=open_positions, minlength=size)[present].astype(np.uint32),
+            '_largest': largest[present],
+        })
+        .with_columns(pl.col('pf_id').replace_strict(names, return_dtype=pl.String).alias('portfolio_id'))
+        .with_columns(
+            (pl.col('market_value') - pl.col('cost_basis')).alias('unrealized_pnl'),
+            (pl.col('market_value') - pl.col('cum_buy_cost') + pl.col('cum_proceeds')).alias('total_pnl'),
+            (pl.col('cum_buy_cost') - pl.col('cum_proceeds')).diff().over('pf_id')
+            .fill_null(pl.col('cum_buy_cost') - pl.col('cum_proceeds')).alias('net_flow'),
+            pl.col('cum_buy_cost').diff().over('pf_id').fill_null(pl.col('cum_buy_cost')).alias('_buys'),
+            pl.col('market_value').shift(1).over('pf_id').fill_null(0.0).alias('_previous_value'),
+        )
+        .with_columns(pl.col('total_pnl').diff().over('pf_id').fill_null(pl.col('total_pnl')).alias('daily_pnl'))
+        .filter(pl.col('date') >= start if start is not None else pl.lit(True))
+        .with_columns(
+            pl.when(pl.col('_previous_value') + pl.col('_buys') > 0)
+            .then(pl.col('daily_pnl') / (pl.col('_previous_value') + pl.col('_buys')))
+            .otherwise(0.0).alias('daily_return'),
+            pl.when(pl.col('market_value') > 0).then(pl.col('_largest') / pl.col('market_value'))
+            .otherwise(0.0).alias('max_weight'),
+        )
+        .with_columns(((1 + pl.col('daily_return')).cum_prod().over('pf_id') - 1).alias('twr'))
+    )
+    return series.select(['portfolio_id', 'date', 'market_value', 'cost_basis', 'realized_pnl', 'unrealized_pnl',
+                          'total_pnl', 'net_flow', 'daily_pnl', 'daily_return', 'twr', 'positions', 'max_weight'])
+
+
+def value_portfolios(transactions: pl.DataFrame, prices: pl.DataFrame,
+                     start: Optional[date] = None, end: Optional[date] = None,
+                     config: Optional[PortfolioConfig] = None) -> Dict[str, pl.DataFrame]:
+    """
+    Ledger, current positions, daily positions and portfolio series in one call
+
+    Returns:
+        Dictionary with 'ledger', 'positions', 'daily' and 'timeseries' frames
+    """
+    ledger = build_ledger(transactions, config)
+    daily = daily_positions(ledger, prices, start, end)
+    return {
+        'ledger': ledger,
+        'positions': current_positions(ledger, prices, end),
+        'daily': daily,
+        'timeseries': portfolio_timeseries(daily, config, start),
+    }
+
+
+def value_from_database(start: Union[date, datetime], end: Union[date, datetime],
+                        portfolio_ids: Optional[List[str]] = None,
+                        config: Optional[PortfolioConfig] = None,
+                        timescale: Optional[TimescaleConfig] = None) -> Dict[str, pl.DataFrame]:
+    """Value portfolios from the transactions table and market_data closes in [start, end)"""
+    from timescale import MarketDataReader
+
+    # datetime is a subclass of date, so it has to be checked explicitly
+    start = start.date() if isinstance(start, datetime) else start
+    timescale = timescale or TimescaleConfig()
+    transactions = load_transactions(config, timescale, portfolio_ids, end=end)
+    if transactions.is_empty():
+        prices = pl.DataFrame(schema={'symbol': pl.String, 'date': pl.Date, 'close': pl.Float64})
+        return value_portfolios(transactions, prices, start=start, config=config)
+
+    symbols = transactions.get_column('symbol').unique().sort().to_list()
+    first_trade = transactions.get_column('executed_at').min()
+    with MarketDataReader(timescale) as reader:
+        prices = reader.read(symbols, min(first_trade.date(), start), end, columns=['close'], as_date=True)
+    return value_portfolios(transactions, prices, start=start, config=config)
+
+
+def synthetic_transactions(n_portfolios: int, n_transactions: int, n_symbols: int, n_days: int,
+                           seed: int = 42) -> Dict[str, pl.DataFrame]:
+    """Random long-only trading (sells never exceed the position) and a price history"""
+    rng = np.random.default_rng(seed)
+    dates = pl.date_range(date(2020, 1, 1), date(2020, 1, 1) + pl.duration(days=n_days - 1), "1d", eager=True)
+    closes = 50 * np.exp(np.cumsum(rng.normal(0, 0.015, (n_symbols, n_days)), axis=1))
+    symbols = np.array([f"S{i:04d}" for i in range(n_symbols)])
+    prices = pl.DataFrame({
+        'symbol': np.repeat(symbols, n_days),
+        'date': np.tile(dates.to_numpy(), n_symbols),
+        'close': closes.ravel(),
+    })
+
+    portfolio = rng.integers(0, n_portfolios, n_transactions)
+    # Each portfolio trades a handful of symbols
+    symbol_index = (portfolio * 7 + rng.integers(0, 8, n_transactions)) % n_symbols
+    day = np.sort(rng.integers(0, n_days, n_transactions))
+    quantity = rng.integers(1, 100, n_transactions).astype(np.float64)
+    frame = pl.DataFrame({
+        'portfolio_id': np.array([f"P{i:05d}" for i in range(n_portfolios)])[portfolio],
+    }).with_columns(
+        pl.Series('symbol', symbols[symbol_index]),
+        pl.Series('quantity', quantity),
+        pl.Series('price', closes[symbol_index, day] * (1 + rng.normal(0, 0.002, n_transactions))),
+        (pl.lit(datetime(2020, 1, 1, 15, 30)).dt.replace_time_zone('UTC')
+         + pl.duration(days=pl.Series(day))).alias('executed_at'),
+        pl.Series('_sell', rng.random(n_transactions) < 0.4),
+    )
+    # A sale is kept only while the running position covers it; the rest become buys
+    frame = frame.sort(KEYS + ['executed_at']).with_columns(
+        pl.when(pl.col('_sell')).then(-pl.col('quantity')).otherwise(pl.col('quantity')).alias('_signed')
+    ).with_columns(
+        (pl.col('_signed').cum_sum().over(KEYS) - pl.col('_signed')).alias('_before')
+    ).with_columns(
+        pl.when(pl.col('_sell') & (pl.col('_before') >= pl.col('quantity'))).then(pl.lit('sell'))
+        .otherwise(pl.lit('buy')).alias('transaction_type')
+    )
+    return {'transactions': frame.select(list(TRANSACTION_SCHEMA)), 'prices': prices}
+
+
+if __name__ == "__main__":
+    # Example: 1,000,000 transactions across 5,000 portfolios, 500 symbols x 2 years of closes
+    import time
+
+    data = synthetic_transactions(5000, 1_000_000, 500, 730)
+    print(f"{data['transactions'].height:,} transactions, {data['prices'].height:,} closes")
+
+    start = time.perf_counter()
+    ledger = build_ledger(data['transactions'])
+    ledger_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    positions = current_positions(ledger, data['prices'])
+    positions_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    daily = daily_positions(ledger, data['prices'], start=date(2021, 1, 1))
+    series = portfolio_timeseries(daily, start=date(2021, 1, 1))
+    series_seconds = time.perf_counter() - start
+
+    print(f"Ledger (FIFO cost basis, realized P&L): {ledger_seconds:.2f}s")
+    print(f"Current positions ({positions.height:,} holdings): {positions_seconds:.2f}s")
+    print(f"Daily positions and series ({daily.height:,} rows, 2021): {series_seconds:.2f}s")
+    print(series.filter(pl.col('date') == series.get_column('date').max()).sort('total_pnl').tail(3))
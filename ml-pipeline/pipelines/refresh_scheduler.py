@@ -0,0 +1,365 @@
+"""
+Watchlist-driven prioritized refresh scheduler
+
+Ingestion used to refresh whatever symbol a run was started for, with no
+notion of which symbols users actually look at. This daemon derives the
+refresh universe from the watchlists, watchlist_assets and user_assets tables
+of db/migrations/001_initial_schema.sql:
+
+- one aggregate query ranks symbols by the number of watchlists referencing
+  them (then by the number of users holding them as active assets); symbols
+  are upper-cased and grouped, so the same ticker on many users' lists is
+  refreshed once
+- ranks map to hot/warm/cold tiers with their own refresh intervals, so
+  compute goes to the symbols the dashboards need fresh
+- due symbols are refreshed in batches, highest rank first: ingestion (one
+  TimescaleDB read or a download per symbol), an indicator store upsert of
+  the new bars, then features and predictions merged into the hot cache
+"""
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import polars as pl
+
+from config import IndicatorStoreConfig, RefreshSchedulerConfig, TimescaleConfig
+
+TIERS = ['hot', 'warm', 'cold']
+
+# Watchlist references first, active user assets as the tie-breaker
+UNIVERSE_QUERY = """
+SELECT symbol,
+       min(asset_type) AS asset_type,
+       count(DISTINCT watchlist_id) AS watchlists,
+       count(DISTINCT user_id) AS users
+FROM (
+    SELECT upper(trim(wa.symbol)) AS symbol, wa.asset_type, wa.watchlist_id, w.user_id
+    FROM watchlist_assets wa
+    JOIN watchlists w ON w.id = wa.watchlist_id
+    UNION ALL
+    SELECT upper(trim(symbol)), asset_type, NULL, user_id
+    FROM user_assets
+    WHERE is_active
+) refs
+GROUP BY symbol
+ORDER BY watchlists DESC, users DESC, symbol
+"""
+UNIVERSE_SCHEMA = {'symbol': pl.String, 'asset_type': pl.String, 'watchlists': pl.Int64, 'users': pl.Int64}
+
+
+def load_universe(dsn: str, connect_timeout: float = 10.0) -> pl.DataFrame:
+    """
+    Symbols referenced by watchlists or active user assets
+
+    Returns:
+        One row per symbol with asset_type, watchlists and users counts
+    """
+    import psycopg
+
+    with psycopg.connect(dsn, connect_timeout=max(int(connect_timeout), 1)) as conn:
+        rows = conn.execute(UNIVERSE_QUERY).fetchall()
+    return pl.DataFrame(rows, schema=UNIVERSE_SCHEMA, orient='row')
+
+
+def assign_tiers(universe: pl.DataFrame, config: Optional[RefreshSchedulerConfig] = None) -> pl.DataFrame:
+    """
+    Rank symbols and map ranks to refresh tiers
+
+    Args:
+        universe: Frame with symbol, watchlists and users columns
+        config: Tier sizes and refresh intervals
+
+    Returns:
+        Universe sorted by priority with rank, tier and refresh_seconds columns
+    """
+    config = config or RefreshSchedulerConfig()
+    hot, warm = config.hot_symbols, config.hot_symbols + config.warm_symbols
+    return (
+        universe.sort(['watchlists', 'users', 'symbol'], descending=[True, True, False])
+        .with_row_index('rank')
+        .with_columns(
+            pl.when(pl.col('rank') < hot).then(pl.lit('hot'))
+            .when(pl.col('rank') < warm).then(pl.lit('warm'))
+            .otherwise(pl.lit('cold')).alias('tier'),
+            pl.when(pl.col('rank') < hot).then(pl.lit(config.hot_refresh_seconds))
+            .when(pl.col('rank') < warm).then(pl.lit(config.warm_refresh_seconds))
+            .otherwise(pl.lit(config.cold_refresh_seconds)).alias('refresh_seconds'),
+        )
+    )
+
+
+class BatchRefresher:
+    """Ingestion, indicators and predictions for a batch of symbols"""
+
+    def __init__(self, data_dir: str, config: Optional[RefreshSchedulerConfig] = None,
+                 timescale: Optional[TimescaleConfig] = None,
+                 indicator_store: Optional[IndicatorStoreConfig] = None):
+        from indicator_store import IndicatorStore
+
+        self.data_dir = Path(data_dir)
+        self.config = config or RefreshSchedulerConfig()
+        self.timescale = timescale or TimescaleConfig()
+        indicator_store = indicator_store or IndicatorStoreConfig()
+        self.store = IndicatorStore(str(self.data_dir / indicator_store.directory), indicator_store)
+        self.models_path = self.data_dir / "trained_models.pkl"
+        self.hot_cache_path = self.data_dir / "latest_features.arrow"
+        self._trainer = None
+        self._trainer_mtime = None
+
+    def __call__(self, symbols: List[str]) -> Dict[str, int]:
+        """Refresh a batch; returns the new indicator rows per symbol"""
+        bars = self.ingest(symbols)
+        written = self.store.update(bars) if bars.height else {}
+        updated = [symbol for symbol in symbols if written.get(symbol)]
+        if updated:
+            self.predict(updated)
+        return written
+
+    def _start(self, symbol: str, now: datetime) -> datetime:
+        """Last stored date (re-fetched so a partial bar is revised) or the full history start"""
+        last = self.store.last_date(symbol)
+        if last is None:
+            # Feb 29 has no counterpart in most earlier years
+            day = 28 if (now.month, now.day) == (2, 29) else now.day
+            return datetime(now.year - self.config.years_back, now.month, day)
+        return datetime.combine(last, datetime.min.time()) if not isinstance(last, datetime) else last
+
+    def ingest(self, symbols: List[str]) -> pl.DataFrame:
+        """New bars of a batch with a symbol column"""
+        now = datetime.now()
+        starts = {symbol: self._start(symbol, now) for symbol in symbols}
+
+        if self.timescale.source:
+            from timescale import MarketDataReader
+
+            # One partitioned read for the whole batch
+            with MarketDataReader(self.timescale) as reader:
+                return reader.read(symbols, min(starts.values()), now + timedelta(days=1), as_date=True)
+
+        from data_ingestion import download_stock_data
+
+        frames = []
+        for symbol, start in starts.items():
+            try:
+                bars = download_stock_data(symbol, start, now + timedelta(days=1))
+            except Exception as e:
+                print(f"  {symbol}: download failed ({e})")
+                continue
+            frames.append(bars.with_columns(pl.lit(symbol).alias('symbol')))
+        if not frames:
+            return pl.DataFrame()
+        bars = pl.concat(frames, how='diagonal_relaxed')
+
+        if self.timescale.enabled:
+            from timescale import MarketDataSink
+
+            with MarketDataSink(self.timescale) as sink:
+                sink.write(bars)
+        return bars
+
+    def _load_trainer(self):
+        """Trained models, reloaded when trained_models.pkl changes"""
+        if not self.models_path.exists():
+            return None
+        mtime = self.models_path.stat().st_mtime_ns
+        if mtime != self._trainer_mtime:
+            from model_training import ModelTrainer
+
+            trainer = ModelTrainer()
+            trainer.load_models(str(self.models_path))
+            self._trainer, self._trainer_mtime = trainer, mtime
+        return self._trainer
+
+    def predict(self, symbols: List[str]) -> str:
+        """
+        Features from the stored indicator tail, merged into the hot cache with predictions
+
+        With trained models only their features (and the inputs of those) are
+        computed; without models every feature is built for the cache.
+
+        Returns:
+            Version of the written hot cache snapshot
+        """
+        from feature_engineering import create_comprehensive_features
+        from feature_plan import BASE_COLUMNS, compute_features
+        from hot_cache import update_hot_cache
+
+        histories = {symbol: self.store.tail(symbol, self.config.feature_rows) for symbol in symbols}
+        histories = {symbol: history for symbol, history in histories.items() if history.height}
+
+        trainer, frames = self._load_trainer(), None
+        if trainer is not None:
+            try:
+                frames = [
+                    compute_features(history, trainer.feature_names,
+                                     keep_columns=[col for col in BASE_COLUMNS if col in history.columns])
+                    for history in histories.values()
+                ]
+            except ValueError as e:
+                # e.g. event features of a run trained with dividends and splits
+                print(f"  Models need features the refresh does not build ({e}); caching features only")
+                trainer = None
+        if frames is None:
+            frames = [create_comprehensive_features(history) for history in histories.values()]
+
+        df = pl.concat([frame.with_columns(pl.lit(symbol).alias('symbol'))
+                        for symbol, frame in zip(histories, frames)], how='diagonal_relaxed')
+        return update_hot_cache(str(self.hot_cache_path), df, trainer)
+
+
+class RefreshScheduler:
+    """Due-time scheduler over the tiered watchlist universe"""
+
+    def __init__(self, refresh: Callable[[List[str]], Dict[str, int]],
+                 universe_loader: Callable[[], pl.DataFrame],
+                 config: Optional[RefreshSchedulerConfig] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.refresh = refresh
+        self.universe_loader = universe_loader
+        self.config = config or RefreshSchedulerConfig()
+        self.clock = clock
+        self.universe = pl.DataFrame()
+        self.refresh_counts: Dict[str, int] = {}
+        self._entries: Dict[str, Tuple[int, float]] = {}
+        self._next_due: Dict[str, float] = {}
+        self._last_refresh: Dict[str, float] = {}
+        self._universe_loaded_at: Optional[float] = None
+
+    def sync_universe(self, now: Optional[float] = None) -> pl.DataFrame:
+        """
+        Reload the universe: new symbols are due at once, dropped ones are
+        forgotten and promotions shorten the next due time immediately
+        """
+        now = self.clock() if now is None else now
+        universe = assign_tiers(self.universe_loader(), self.config)
+        entries = dict(zip(universe['symbol'].to_list(),
+                           zip(universe['rank'].to_list(), universe['refresh_seconds'].to_list())))
+
+        for symbol in set(self._next_due) - set(entries):
+            self._next_due.pop(symbol)
+            self._last_refresh.pop(symbol, None)
+        for symbol, (_, interval) in entries.items():
+            if symbol not in self._next_due:
+                self._next_due[symbol] = now
+            elif symbol in self._last_refresh:
+                self._next_due[symbol] = min(self._next_due[symbol], self._last_refresh[symbol] + interval)
+
+        self.universe, self._entries, self._universe_loaded_at = universe, entries, now
+        return universe
+
+    def due(self, now: Optional[float] = None) -> List[str]:
+        """Symbols due for a refresh, highest priority first"""
+        now = self.clock() if now is None else now
+        return sorted((symbol for symbol, due_at in self._next_due.items() if due_at <= now),
+                      key=lambda symbol: self._entries[symbol][0])
+
+    def run_once(self, now: Optional[float] = None) -> Dict[str, int]:
+        """
+        Refresh one batch of due symbols
+
+        Returns:
+            Result of the refresh callable (empty when nothing was due)
+        """
+        now = self.clock() if now is None else now
+        if self._universe_loaded_at is None or now - self._universe_loaded_at >= self.config.universe_refresh_seconds:
+            try:
+                self.sync_universe(now)
+            except Exception as e:
+                # Keep scheduling the last known universe
+                print(f"Universe reload failed: {e}")
+                self._universe_loaded_at = now
+
+        batch = self.due(now)[:self.config.batch_size]
+        if not batch:
+            return {}
+        try:
+            result = self.refresh(batch)
+        except Exception as e:
+            print(f"Refresh of {len(batch)} symbols failed: {e}")
+            for symbol in batch:
+                self._next_due[symbol] = now + self.config.retry_seconds
+            return {}
+
+        for symbol in batch:
+            self._last_refresh[symbol] = now
+            self._next_due[symbol] = now + self._entries[symbol][1]
+            self.refresh_counts[symbol] = self.refresh_counts.get(symbol, 0) + 1
+        return result
+
+    def run_forever(self, stop: Optional[Callable[[], bool]] = None) -> None:
+        """Run batches back to back while symbols are due; poll otherwise"""
+        while stop is None or not stop():
+            self.run_once()
+            if not self.due():
+                time.sleep(self.config.poll_seconds)
+
+
+def simulate(n_symbols: int = 2000, hours: float = 6.5, batch_seconds: float = 4.0,
+             config: Optional[RefreshSchedulerConfig] = None) -> pl.DataFrame:
+    """
+    Simulated trading session over a Zipf-like synthetic universe
+
+    Args:
+        n_symbols: Referenced symbols
+        hours: Simulated wall-clock hours
+        batch_seconds: Simulated cost of one refresh batch
+
+    Returns:
+        Refreshes per tier
+    """
+    import numpy as np
+
+    config = config or RefreshSchedulerConfig()
+    rng = np.random.default_rng(42)
+    universe = pl.DataFrame({
+        'symbol': [f"SYM{i:04d}" for i in range(n_symbols)],
+        'asset_type': ['stock'] * n_symbols,
+        'watchlists': np.minimum(rng.zipf(1.6, n_symbols), 10_000),
+        'users': rng.integers(0, 50, n_symbols),
+    })
+
+    clock = [0.0]
+    scheduler = RefreshScheduler(lambda batch: {symbol: 1 for symbol in batch}, lambda: universe,
+                                 config, clock=lambda: clock[0])
+    while clock[0] < hours * 3600:
+        ran = scheduler.run_once(clock[0])
+        clock[0] += batch_seconds if ran else config.poll_seconds
+
+    counts = pl.DataFrame({'symbol': list(scheduler.refresh_counts),
+                           'refreshes': list(scheduler.refresh_counts.values())})
+    return (
+        scheduler.universe.join(counts, on='symbol', how='left')
+        .group_by('tier')
+        .agg(pl.len().alias('symbols'), pl.col('watchlists').sum(),
+             pl.col('refreshes').sum(), pl.col('refreshes').mean().alias('refreshes_per_symbol'))
+        .with_columns((pl.col('refreshes') / pl.col('refreshes').sum()).alias('compute_share'))
+        .sort(pl.col('tier').replace_strict(TIERS, list(range(len(TIERS)))))
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Watchlist-driven refresh scheduler")
+    parser.add_argument("--data-dir", default="../../data", help="Data directory path")
+    parser.add_argument("--dsn", default=None, help="Database with the watchlist tables")
+    parser.add_argument("--timescale-source", action="store_true", help="Ingest bars from market_data")
+    parser.add_argument("--once", action="store_true", help="Refresh one batch and exit")
+    parser.add_argument("--simulate", action="store_true",
+                        help="Simulate a trading session over a synthetic universe (no database)")
+    args = parser.parse_args()
+
+    if args.simulate:
+        # Example: where a session's refreshes go for 2,000 referenced symbols
+        print(simulate())
+    else:
+        config = RefreshSchedulerConfig(dsn=args.dsn)
+        timescale = TimescaleConfig(source=args.timescale_source)
+        dsn = config.dsn or timescale.dsn
+        scheduler = RefreshScheduler(BatchRefresher(args.data_dir, config, timescale),
+                                     lambda: load_universe(dsn, timescale.connect_timeout), config)
+        if args.once:
+            print(scheduler.run_once())
+        else:
+            scheduler.run_forever()
@@ -0,0 +1,399 @@
+"""
+Rolling betas, correlations and shrinkage covariance matrices for a universe
+
+Risk inputs for features and for portfolio risk, computed from long close
+prices (symbol, date, close):
+
+- rolling_betas: beta, correlation and residual volatility of every symbol
+  against a benchmark for every date, from windowed sums taken as differences
+  of cumulative sums, so each date costs O(symbols) regardless of the window
+- rolling_covariances: pairwise-complete covariance matrices every `step`
+  days. The window's cross-product matrix X'X is updated by adding the rows
+  entering the window and subtracting the rows leaving it in one NumPy
+  matmul instead of recomputing every window; per-pair sums and counts are
+  only needed for the (few) names with missing days in the window
+- shrink_covariance: Oracle Approximating Shrinkage towards the scaled
+  identity, which keeps 3,000-name matrices from 252 observations invertible
+- RiskMatrixStore: the matrix time series as memory-mapped .npy files,
+  float32 volatilities plus the upper correlation triangle as int16 fixed
+  point, an eighth of the float64 covariance matrices; the correlation of one
+  pair over time is a single column of the triangle file
+"""
+import json
+import shutil
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import polars as pl
+from scipy.linalg import blas
+
+from backtesting import build_price_panel
+from config import RiskConfig
+
+# Correlations are stored as int16 fixed point (resolution 3e-5)
+CORRELATION_SCALE = 32767
+
+
+def return_panel(prices: pl.DataFrame) -> Tuple[pl.Series, List[str], np.ndarray, np.ndarray]:
+    """
+    Dense daily returns of long close prices
+
+    Args:
+        prices: Frame with symbol, date and close columns
+
+    Returns:
+        Tuple of (dates, symbols, returns, observed) from the second price
+        date on: returns are zero where either close of the day pair is
+        missing and observed marks the others
+    """
+    panel = build_price_panel(prices)
+    observed = np.isfinite(panel.close[1:]) & np.isfinite(panel.close[:-1])
+    return panel.dates.slice(1), panel.symbols, np.where(observed, panel.returns[1:], 0.0), observed
+
+
+def _windowed_sum(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing window sums along axis 0 from one cumulative sum"""
+    cumulative = np.cumsum(values, axis=0)
+    cumulative[window:] -= cumulative[:-window].copy()
+    return cumulative
+
+
+def rolling_betas(prices: pl.DataFrame, config: Optional[RiskConfig] = None) -> pl.DataFrame:
+    """
+    Rolling beta, benchmark correlation and residual volatility per (symbol, date)
+
+    Args:
+        prices: Frame with symbol, date and close columns, including config.benchmark
+        config: Window, minimum observations and benchmark symbol
+
+    Returns:
+        Long frame with symbol, date, beta_{w}, benchmark_corr_{w} and
+        residual_vol_{w} (daily; residual sum of squares over n - 2 degrees
+        of freedom, as the regression fits an intercept and a slope) for
+        every observed return; null with fewer than config.min_periods (and
+        at least 3) joint observations in the window
+
+    Raises:
+        ValueError: If the benchmark is not in the price frame
+    """
+    config = config or RiskConfig()
+    dates, symbols, returns, observed = return_panel(prices)
+    if config.benchmark not in symbols:
+        raise ValueError(f"Benchmark {config.benchmark} is not in the price frame")
+
+    column = symbols.index(config.benchmark)
+    both = observed & observed[:, [column]]
+    x = np.where(both, returns, 0.0)
+    y = np.where(both, returns[:, [column]], 0.0)
+    n, sx, sy, sxx, syy, sxy = (_windowed_sum(values, config.window)
+                                for values in (both.astype(np.float64), x, y, x * x, y * y, x * y))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covariance = sxy - sx * sy / n
+        benchmark_variance = syy - sy * sy / n
+        variance = sxx - sx * sx / n
+        beta = covariance / benchmark_variance
+        correlation = covariance / np.sqrt(variance * benchmark_variance)
+        residual = np.sqrt(np.maximum(variance - beta * covariance, 0.0) / (n - 2))
+    enough = n >= max(config.min_periods, 3)
+
+    rows, cols = np.nonzero(observed)
+    window = config.window
+    return pl.DataFrame({
+        'symbol': pl.Series(symbols).gather(cols),
+        'date': dates.gather(rows),
+        **{name: pl.Series(np.where(enough, values, np.nan)[rows, cols]).fill_nan(None)
+           for name, values in [(f"beta_{window}", beta), (f"benchmark_corr_{window}", correlation),
+                                (f"residual_vol_{window}", residual)]},
+    }).sort(['symbol', 'date'])
+
+
+def _window_covariance(cross: np.ndarray, returns: np.ndarray, missing: np.ndarray,
+                       min_periods: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pairwise-complete sample covariance of a window from its X'X
+
+    Pairs of fully observed names use the window mean; only the columns
+    with missing rows need per-pair sums and counts, an (all names x gap
+    names) block.
+
+    Returns:
+        Tuple of (covariance, observations per name); NaN below min_periods
+    """
+    rows = len(returns)
+    totals = returns.sum(axis=0)
+    misses = missing.sum(axis=0)
+    # (X'X - t t' / rows) / (rows - 1), the rank-1 update in place
+    covariance = blas.dger(-1.0 / (rows * (rows - 1)), totals, totals, a=(cross / (rows - 1)).T, overwrite_a=1).T
+
+    gaps = np.flatnonzero(misses)
+    if len(gaps):
+        z = missing[:, gaps].astype(np.float64)
+        counts = rows - misses[:, None] - misses[gaps][None, :].astype(np.float64)
+        counts[gaps] += z.T @ z
+        # sums[i, j]: i's returns on the rows where gap name j is observed, and the reverse
+        sums = totals[:, None] - returns.T @ z
+        reverse = np.repeat(totals[gaps][None, :], len(totals), axis=0)
+        reverse[gaps] -= (returns[:, gaps].T @ z).T
+        with np.errstate(divide='ignore', invalid='ignore'):
+            block = (cross[:, gaps] - sums * reverse / counts) / (counts - 1)
+        block[counts < min_periods] = np.nan
+        covariance[:, gaps] = block
+        covariance[gaps, :] = block.T
+    return covariance, rows - misses
+
+
+def rolling_covariances(returns: np.ndarray, observed: np.ndarray,
+                        config: Optional[RiskConfig] = None) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+    """
+    Covariance matrices of trailing windows ending every config.step rows
+
+    Window ends are aligned to the last row, so the latest date is always
+    included. Between refreshes, X'X of a window is the previous window's
+    plus the rows that entered minus the rows that left, as one matmul.
+
+    Args:
+        returns: Dense (dates x symbols) returns, zero where not observed
+        observed: Mask of observed returns
+        config: Window, step, minimum observations and refresh interval
+
+    Yields:
+        Tuples of (window end row, covariance, observations per name)
+    """
+    config = config or RiskConfig()
+    missing = ~observed
+    ends = np.arange(len(returns) - 1, config.min_periods - 2, -config.step)[::-1]
+
+    cross, previous = None, None
+    for i, end in enumerate(ends):
+        start = max(0, end - config.window + 1)
+        if cross is None or i % config.refresh_every == 0 or end - previous >= config.window:
+            window = returns[start:end + 1]
+            cross = window.T @ window
+        else:
+            previous_start = max(0, previous - config.window + 1)
+            entered, left = returns[previous + 1:end + 1], returns[previous_start:start]
+            # X'X += E'E - L'L, accumulated in place by one BLAS call
+            blas.dgemm(1.0, np.vstack([entered, left]), np.vstack([entered, -left]), beta=1.0, c=cross.T,
+                       trans_a=1, overwrite_c=1)
+        previous = end
+        covariance, n_obs = _window_covariance(cross, returns[start:end + 1], missing[start:end + 1],
+                                               config.min_periods)
+        yield int(end), covariance, n_obs
+
+
+def _oas_shrinkage(trace: float, sum_squares: float, n_features: int, n_obs: float) -> float:
+    """Oracle Approximating Shrinkage intensity (Chen et al., 2010) from tr(S) and ||S||_F^2"""
+    mu = trace / n_features
+    alpha = sum_squares / n_features ** 2
+    denominator = (n_obs + 1.0) * (alpha - mu ** 2 / n_features)
+    return 1.0 if denominator == 0 else float(min((alpha + mu ** 2) / denominator, 1.0))
+
+
+def shrink_covariance(covariance: np.ndarray, n_obs: float,
+                      shrinkage: Optional[float] = None) -> Tuple[np.ndarray, float]:
+    """
+    Shrink a covariance matrix towards the scaled identity
+
+    Args:
+        covariance: Complete (no NaN) covariance matrix
+        n_obs: Observations behind the estimate
+        shrinkage: Fixed intensity in [0, 1]; None uses the OAS estimate
+
+    Returns:
+        Tuple of (shrunk covariance, shrinkage intensity)
+    """
+    n_features = covariance.shape[0]
+    mu = np.trace(covariance) / n_features
+    if shrinkage is None:
+        shrinkage = _oas_shrinkage(np.trace(covariance), np.vdot(covariance, covariance), n_features, n_obs)
+    shrunk = (1.0 - shrinkage) * covariance
+    shrunk.flat[::n_features + 1] += shrinkage * mu
+    return shrunk, float(shrinkage)
+
+
+def _pair_index(first: np.ndarray, second: np.ndarray, n: int) -> np.ndarray:
+    """Position of pairs (first < second) in the row-major upper triangle of an n x n matrix"""
+    return first * (2 * n - first - 1) // 2 + (second - first - 1)
+
+
+class RiskMatrixStore:
+    """Memory-mapped time series of shrunk covariance matrices"""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        meta = json.loads((self.root / "meta.json").read_text())
+        self.symbols: List[str] = meta['symbols']
+        self.dates = pl.Series('date', meta['dates']).str.to_date()
+        self.shrinkage = np.array(meta['shrinkage'])
+        self.window = meta['window']
+        self.volatility = np.load(self.root / "volatility.npy", mmap_mode='r')
+        self.correlations = np.load(self.root / "correlation.npy", mmap_mode='r')
+        self._position = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+    def __repr__(self) -> str:
+        return f"RiskMatrixStore('{self.root}', dates={len(self.dates)}, symbols={len(self.symbols)})"
+
+    def _row(self, as_of: Optional[date]) -> int:
+        """Latest stored matrix on or before as_of (default: the latest)"""
+        if as_of is None:
+            return len(self.dates) - 1
+        row = int(np.searchsorted(self.dates.to_numpy(), np.datetime64(as_of, 'D'), side='right')) - 1
+        if row < 0:
+            raise ValueError(f"No risk matrix on or before {as_of}")
+        return row
+
+    def _columns(self, symbols: Optional[List[str]]) -> np.ndarray:
+        return np.arange(len(self.symbols)) if symbols is None else np.array([self._position[s] for s in symbols])
+
+    def correlation(self, as_of: Optional[date] = None, symbols: Optional[List[str]] = None) -> np.ndarray:
+        """Shrunk correlation matrix (NaN rows for names without enough history)"""
+        row, columns = self._row(as_of), self._columns(symbols)
+        first, second = np.meshgrid(columns, columns, indexing='ij')
+        index = _pair_index(np.minimum(first, second), np.maximum(first, second), len(self.symbols))
+        matrix = self.correlations[row][np.where(first == second, 0, index)] / CORRELATION_SCALE
+        np.fill_diagonal(matrix, 1.0)
+        inactive = ~np.isfinite(self.volatility[row][columns])
+        matrix[inactive] = np.nan
+        matrix[:, inactive] = np.nan
+        return matrix
+
+    def covariance(self, as_of: Optional[date] = None, symbols: Optional[List[str]] = None) -> np.ndarray:
+        """Shrunk daily covariance matrix"""
+        volatility = self.volatility[self._row(as_of)][self._columns(symbols)].astype(np.float64)
+        return self.correlation(as_of, symbols) * np.outer(volatility, volatility)
+
+    def pair_correlation(self, first: str, second: str) -> pl.DataFrame:
+        """Correlation of two symbols at every stored date (one column of the triangle)"""
+        i, j = sorted((self._position[first], self._position[second]))
+        correlation = self.correlations[:, _pair_index(i, j, len(self.symbols))] / CORRELATION_SCALE
+        active = np.isfinite(self.volatility[:, i]) & np.isfinite(self.volatility[:, j])
+        return pl.DataFrame({
+            'date': self.dates,
+            'correlation': np.where(active, correlation, np.nan),
+        }).with_columns(pl.col('correlation').fill_nan(None))
+
+    def portfolio_volatility(self, weights: Dict[str, float], as_of: Optional[date] = None) -> float:
+        """Daily volatility of a portfolio of symbol weights"""
+        symbols = list(weights)
+        w = np.array([weights[symbol] for symbol in symbols])
+        return float(np.sqrt(w @ self.covariance(as_of, symbols) @ w))
+
+
+def compute_risk_matrices(prices: pl.DataFrame, root: str, config: Optional[RiskConfig] = None) -> RiskMatrixStore:
+    """
+    Write the shrunk covariance matrix time series of a universe
+
+    Names with fewer than config.min_periods observations in a window are
+    left out of that window's matrix (NaN volatility); pairs of active names
+    without enough overlap get zero covariance before shrinkage.
+
+    Args:
+        prices: Frame with symbol, date and close columns
+        root: Store directory (replaced)
+        config: Window, step, refresh interval and shrinkage
+
+    Returns:
+        RiskMatrixStore over the written files
+    """
+    config = config or RiskConfig()
+    dates, symbols, returns, observed = return_panel(prices)
+    n = len(symbols)
+    ends = np.arange(len(dates) - 1, config.min_periods - 2, -config.step)[::-1]
+
+    # Build in a temporary directory and rename so readers never see a partial store
+    root = Path(root)
+    tmp_dir = root.with_name(f".{root.name}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    volatility = np.lib.format.open_memmap(tmp_dir / "volatility.npy", mode='w+', dtype=np.float32,
+                                           shape=(len(ends), n))
+    correlations = np.lib.format.open_memmap(tmp_dir / "correlation.npy", mode='w+', dtype=np.int16,
+                                             shape=(len(ends), n * (n - 1) // 2))
+    offsets = _pair_index(np.arange(n), np.arange(n) + 1, n)
+    shrinkage = []
+
+    for row, (end, covariance, n_obs) in enumerate(rolling_covariances(returns, observed, config)):
+        diagonal = np.diag(covariance).copy()
+        active = np.isfinite(diagonal)
+        # Only names with missing days in the window can have NaN covariances
+        gaps = np.flatnonzero(n_obs < min(end + 1, config.window))
+        covariance[:, gaps] = np.nan_to_num(covariance[:, gaps])
+        covariance[gaps, :] = np.nan_to_num(covariance[gaps, :])
+        n_active = int(active.sum())
+        trace = float(diagonal[active].sum())
+        intensity = config.shrinkage
+        if intensity is None:
+            intensity = _oas_shrinkage(trace, float(np.vdot(covariance, covariance)), max(n_active, 1),
+                                       float(np.median(n_obs[active])) if n_active else 0.0)
+
+        # Shrunk variances; off-diagonal shrunk correlations are (1 - rho) c_ij / (sigma_i sigma_j)
+        sigma = np.sqrt((1.0 - intensity) * diagonal + intensity * trace / max(n_active, 1))
+        scale = np.where(active, np.sqrt(1.0 - intensity) / sigma, 0.0)
+        volatility[row] = sigma
+        target = np.asarray(correlations[row])
+        for i in range(n - 1):
+            values = covariance[i, i + 1:] * scale[i + 1:]
+            values *= scale[i] * CORRELATION_SCALE
+            np.rint(values, out=values)
+            if len(gaps):
+                # Pairwise-complete estimates are not jointly consistent and can exceed |1|
+                np.clip(values, -CORRELATION_SCALE, CORRELATION_SCALE, out=values)
+            target[offsets[i]:offsets[i] + n - i - 1] = values
+        shrinkage.append(intensity)
+
+    volatility.flush()
+    correlations.flush()
+    del volatility, correlations
+    (tmp_dir / "meta.json").write_text(json.dumps({
+        'symbols': symbols,
+        'dates': [str(day) for day in dates.gather(ends).to_list()],
+        'window': config.window,
+        'step': config.step,
+        'shrinkage': shrinkage,
+    }))
+    shutil.rmtree(root, ignore_errors=True)
+    tmp_dir.rename(root)
+    return RiskMatrixStore(str(root))
+
+
+if __name__ == "__main__":
+    # Example: 3,000 names x 2 years, a 252-day window stored weekly
+    import tempfile
+    import time
+
+    from cross_sectional import synthetic_universe
+
+    universe = synthetic_universe(3000, 504).select('symbol', 'date', 'close')
+    # Equal-weight index as the benchmark
+    index = (universe.sort(['symbol', 'date']).with_columns(pl.col('close').pct_change().over('symbol'))
+             .group_by('date').agg(pl.col('close').mean()).sort('date')
+             .select(pl.lit('SPY').alias('symbol'), 'date',
+                     (100 * (1 + pl.col('close').fill_null(0.0)).cum_prod()).alias('close')))
+    prices = pl.concat([universe, index])
+    config = RiskConfig(window=252, step=5)
+
+    start = time.perf_counter()
+    betas = rolling_betas(prices, config)
+    print(f"Rolling betas ({betas.height:,} rows): {time.perf_counter() - start:.2f}s")
+
+    _, _, returns, observed = return_panel(prices)
+    start = time.perf_counter()
+    windows = sum(1 for _ in rolling_covariances(returns, observed, config))
+    incremental_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for end in range(len(returns) - 1, config.min_periods - 2, -config.step):
+        np.cov(returns[max(0, end - config.window + 1):end + 1], rowvar=False)
+    print(f"{windows} covariance matrices: {incremental_seconds:.2f}s incremental, "
+          f"{time.perf_counter() - start:.2f}s with np.cov per window")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        start = time.perf_counter()
+        store = compute_risk_matrices(prices, f"{tmp_dir}/risk", config)
+        print(f"{store} with OAS shrinkage and storage: {time.perf_counter() - start:.2f}s")
+        print(f"Stored bytes per date: {store.correlations[0].nbytes + store.volatility[0].nbytes:,} "
+              f"(float64 covariance: {8 * len(store.symbols) ** 2:,})")
+        print(f"Mean shrinkage: {store.shrinkage.mean():.3f}, equal-weight daily volatility: "
+              f"{store.portfolio_volatility({symbol: 1 / 3000 for symbol in store.symbols[:3000]}):.5f}")
@@ -0,0 +1,216 @@
+"""
+Lightweight run manifest for PyStockBot pipeline results
+
+The manifest is a small JSON file written next to the pickled models. It holds
+model summaries (type, estimator name, metrics, top features) and a snapshot of
+the processed dataset's parquet footer statistics, so status and analysis
+commands can run without importing scikit-learn/XGBoost, unpickling models or
+loading the full dataset. This module only depends on the standard library;
+pyarrow is imported lazily when the parquet footer has to be read.
+"""
+import json
+import math
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+MANIFEST_VERSION = 1
+
+# Metric keys copied from the training results into the manifest
+METRIC_KEYS = [
+    'mse', 'mae', 'r2', 'accuracy', 'precision', 'recall', 'f1',
+    'cv_mean', 'cv_std', 'main_score'
+]
+
+# Keys describing how each model was produced (full retrain or incremental update)
+TRAINING_KEYS = [
+    'training_mode', 'update_method', 'trained_through', 'last_full_train',
+    'updates_since_full', 'new_rows', 'new_rows_score'
+]
+
+
+def _to_json_value(value: Any) -> Any:
+    """Convert numpy scalars and dates into JSON-friendly values"""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def summarize_models(models: Dict[str, Dict[str, Any]],
+                     feature_importance: Dict[str, List[tuple]],
+                     top_n: int = 20) -> Dict[str, Dict[str, Any]]:
+    """
+    Build JSON-friendly summaries of trained models
+
+    Args:
+        models: ModelTrainer.models mapping target -> result dict
+        feature_importance: ModelTrainer.feature_importance mapping
+        top_n: Number of top features to keep per target
+
+    Returns:
+        Dictionary mapping target name to its summary
+    """
+    summaries = {}
+    for target, result in models.items():
+        summary = {
+            'type': result.get('type'),
+            'model': result.get('model_name', type(result['model']).__name__),
+            'tuned': bool(result.get('tuned', False)),
+        }
+        summary.update({
+            key: _to_json_value(result[key]) for key in METRIC_KEYS + TRAINING_KEYS if key in result
+        })
+        summary['top_features'] = [
+            [feature, _to_json_value(score)]
+            for feature, score in feature_importance.get(target, [])[:top_n]
+        ]
+        summaries[target] = summary
+    return summaries
+
+
+def _file_fingerprint(path: Path) -> Dict[str, int]:
+    """Size and modification time used to detect a rewritten file"""
+    stat = path.stat()
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def read_parquet_stats(path: str, date_column: str = "date") -> Dict[str, Any]:
+    """
+    Read dataset statistics from the parquet footer without loading any data
+
+    Args:
+        path: Path to a parquet file
+        date_column: Column whose min/max statistics give the date range
+
+    Returns:
+        Dictionary with row count, column count and date range
+    """
+    import pyarrow.parquet as pq
+
+    metadata = pq.ParquetFile(path).metadata
+    schema_names = [metadata.schema.column(i).name for i in range(metadata.num_columns)]
+
+    date_min, date_max = None, None
+    if date_column in schema_names:
+        column_index = schema_names.index(date_column)
+        for row_group in range(metadata.num_row_groups):
+            stats = metadata.row_group(row_group).column(column_index).statistics
+            if stats is None or not stats.has_min_max:
+                continue
+            date_min = stats.min if date_min is None else min(date_min, stats.min)
+            date_max = stats.max if date_max is None else max(date_max, stats.max)
+
+    return {
+        'rows': metadata.num_rows,
+        'columns': metadata.num_columns,
+        'date_min': _to_json_value(date_min),
+        'date_max': _to_json_value(date_max),
+    }
+
+
+def write_manifest(manifest_path: str,
+                   models: Dict[str, Dict[str, Any]],
+                   feature_importance: Dict[str, List[tuple]],
+                   dataset_path: Optional[str] = None,
+                   extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Write the run manifest for a set of trained models
+
+    Args:
+        manifest_path: Destination JSON file
+        models: ModelTrainer.models mapping
+        feature_importance: ModelTrainer.feature_importance mapping
+        dataset_path: Optional processed dataset parquet to snapshot stats from
+        extra: Optional additional top-level fields (e.g. symbol)
+
+    Returns:
+        The manifest dictionary that was written
+    """
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        **(extra or {}),
+        'models': summarize_models(models, feature_importance),
+    }
+
+    if dataset_path is not None and Path(dataset_path).exists():
+        manifest['dataset'] = {
+            'path': Path(dataset_path).name,
+            **_file_fingerprint(Path(dataset_path)),
+            **read_parquet_stats(dataset_path),
+        }
+
+    Path(manifest_path).write_text(json.dumps(manifest, indent=2))
+    print(f"Manifest saved to {manifest_path}")
+    return manifest
+
+
+def load_manifest(manifest_path: str) -> Dict[str, Any]:
+    """Load a run manifest from JSON"""
+    manifest = json.loads(Path(manifest_path).read_text())
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported manifest version: {manifest.get('version')}")
+    return manifest
+
+
+def get_dataset_stats(manifest: Dict[str, Any], dataset_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Get dataset statistics, preferring the manifest snapshot
+
+    The snapshot is reused only while the dataset file is unchanged; otherwise
+    the parquet footer is read again.
+
+    Args:
+        manifest: Loaded manifest dictionary
+        dataset_path: Path to the processed dataset parquet
+
+    Returns:
+        Dataset statistics, or None when the dataset does not exist
+    """
+    path = Path(dataset_path)
+    if not path.exists():
+        return None
+
+    cached = manifest.get('dataset')
+    if cached is not None and all(cached.get(k) == v for k, v in _file_fingerprint(path).items()):
+        return cached
+
+    return read_parquet_stats(dataset_path)
+
+
+def print_manifest_summary(manifest: Dict[str, Any], top_n: int = 5):
+    """Print model summaries from a manifest in the same layout as ModelTrainer"""
+    print("\n" + "="*80)
+    print("MODEL TRAINING SUMMARY")
+    print("="*80)
+
+    metric_labels = {
+        'regression': [('r2', 'R² Score', '.4f'), ('mse', 'MSE', '.6f')],
+        'classification': [('accuracy', 'Accuracy', '.4f'), ('f1', 'F1 Score', '.4f')],
+    }
+    cv_labels = {'regression': 'CV R²', 'classification': 'CV Accuracy'}
+
+    for target, summary in manifest.get('models', {}).items():
+        task_type = summary.get('type')
+        print(f"\nTarget: {target}")
+        print(f"Type: {task_type}")
+        print(f"Model: {summary.get('model')}")
+        if summary.get('training_mode'):
+            print(f"Training: {summary['training_mode']} (through {summary.get('trained_through')})")
+
+        for key, label, fmt in metric_labels.get(task_type, []):
+            if summary.get(key) is not None:
+                print(f"{label}: {summary[key]:{fmt}}")
+        if summary.get('cv_mean') is not None:
+            print(f"{cv_labels.get(task_type, 'CV')}: {summary['cv_mean']:.4f} ± {summary['cv_std']:.4f}")
+
+        if summary.get('top_features'):
+            print(f"Top {top_n} features:")
+            for i, (feature, importance) in enumerate(summary['top_features'][:top_n]):
+                print(f"  {i+1}. {feature}: {importance:.4f}")
+
+    print("\n" + "="*80)
@@ -0,0 +1,607 @@
+"""
+Local prediction-serving HTTP service for PyStockBot models
+
+A dependency-free asyncio HTTP/1.1 server (keep-alive, JSON) for the
+dashboards. The trained models and the latest feature row of every symbol are
+loaded once and stay resident as a float matrix. Concurrent requests are
+queued and micro-batched: the batch loop waits at most max_wait_ms after the
+first request, gathers the requested rows and runs one vectorized predict
+(and one attribution pass) per model for the whole batch in a worker thread.
+
+Endpoints:
+    GET /predict/<symbol>       predictions + top features for one symbol
+    GET /predict?symbols=A,B    several symbols in one response
+    GET /metrics                request counts, batch sizes, p50/p99 latency
+    GET /health                 loaded models, symbols and data version
+
+Responses carry an ETag derived from the model and dataset fingerprints, so a
+client sending If-None-Match gets 304 without any prediction work.
+
+When the run directory has a latest-features hot cache (latest_features.arrow)
+the latest rows come from it instead of dataset.parquet, and the server polls
+the run's fingerprint every reload_interval_seconds, swapping in the new
+models and rows when a pipeline run lands.
+
+Usage:
+    python serving.py --data-dir ../../data            # serve a pipeline run
+    python serving.py --demo                           # synthetic models + load test
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import polars as pl
+
+from attribution import build_explainer
+from backtesting import horizon_from_target
+from config import ServingConfig
+from hot_cache import HOT_CACHE_FILE, HotCache, latest_rows
+
+STATUS_TEXT = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+               405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class UnknownSymbolError(LookupError):
+    """Symbol missing from the serving state that handled its batch"""
+
+
+def make_etag(version: str, symbols: List[str]) -> str:
+    """Entity tag of a response for the given symbols at a data version"""
+    key = hashlib.sha1(",".join(symbols).encode()).hexdigest()[:8]
+    return f'"{version}-{key}"'
+
+
+def latest_feature_rows(df: pl.DataFrame, feature_columns: List[str],
+                        symbol: Optional[str] = None) -> pl.DataFrame:
+    """Most recent complete feature row per symbol (date, symbol, close, features)"""
+    if 'symbol' not in df.columns:
+        df = df.with_columns(pl.lit(symbol or "SYMBOL").alias('symbol'))
+    close = ['close'] if 'close' in df.columns and 'close' not in feature_columns else []
+    return latest_rows(df.select(['date', 'symbol'] + close + feature_columns), required=feature_columns)
+
+
+@dataclass
+class ServingState:
+    """Resident models, latest feature matrix and data version"""
+    trainer: Any
+    rows: pl.DataFrame
+    matrix: np.ndarray
+    index: Dict[str, int]
+    explainers: Dict[str, Callable[[np.ndarray], np.ndarray]]
+    version: str
+    data_dir: Optional[str] = None
+    symbol: Optional[str] = None
+
+    @classmethod
+    def from_trainer(cls, trainer: Any, latest: pl.DataFrame, version: str,
+                     exact_attribution: bool = False) -> 'ServingState':
+        """Build the serving state from a trained ModelTrainer and latest feature rows"""
+        feature_columns = trainer.feature_names
+        explainers = {}
+        for target, result in trainer.models.items():
+            try:
+                explainers[target] = build_explainer(result['model'], len(feature_columns),
+                                                     approximate=not exact_attribution)
+            except ValueError:
+                pass  # Falls back to the global feature importance
+        return cls(
+            trainer=trainer,
+            rows=latest,
+            matrix=trainer._to_feature_matrix(latest, feature_columns),
+            index={symbol: i for i, symbol in enumerate(latest.get_column('symbol').to_list())},
+            explainers=explainers,
+            version=version,
+        )
+
+    @staticmethod
+    def data_version(data_dir: str) -> str:
+        """Fingerprint of the models and latest rows of a pipeline run"""
+        data_dir = Path(data_dir)
+        data_path = data_dir / HOT_CACHE_FILE
+        if not data_path.exists():
+            data_path = data_dir / "dataset.parquet"
+        fingerprint = "-".join(f"{path.stat().st_size}:{path.stat().st_mtime_ns}"
+                               for path in (data_dir / "trained_models.pkl", data_path))
+        return hashlib.sha1(fingerprint.encode()).hexdigest()[:12]
+
+    @classmethod
+    def from_data_dir(cls, data_dir: str, symbol: Optional[str] = None,
+                      exact_attribution: bool = False) -> 'ServingState':
+        """
+        Load trained_models.pkl and the latest rows of a pipeline run
+
+        Latest rows come from the hot cache when it has every model feature,
+        otherwise from dataset.parquet. The symbol of single-symbol datasets is
+        taken from model_manifest.json unless given.
+        """
+        from model_training import ModelTrainer
+
+        data_dir = Path(data_dir)
+        models_path, dataset_path = data_dir / "trained_models.pkl", data_dir / "dataset.parquet"
+        manifest_path = data_dir / "model_manifest.json"
+        if symbol is None and manifest_path.exists():
+            symbol = json.loads(manifest_path.read_text()).get('symbol')
+
+        version = cls.data_version(str(data_dir))
+        trainer = ModelTrainer()
+        trainer.load_models(str(models_path))
+        cache = HotCache(str(data_dir / HOT_CACHE_FILE))
+        if len(cache) and set(trainer.feature_names) <= set(cache.frame.columns):
+            latest = latest_feature_rows(cache.frame, trainer.feature_names)
+        else:
+            schema = pl.read_parquet_schema(dataset_path)
+            columns = [col for col in ['date', 'symbol', 'close'] if col in schema]
+            dataset = pl.scan_parquet(dataset_path).select(
+                columns + [col for col in trainer.feature_names if col not in columns]
+            ).collect()
+            latest = latest_feature_rows(dataset, trainer.feature_names, symbol)
+
+        state = cls.from_trainer(trainer, latest, version, exact_attribution)
+        state.data_dir, state.symbol = str(data_dir), symbol
+        return state
+
+    def etag(self, symbols: List[str]) -> str:
+        """Entity tag of a response for the given symbols"""
+        return make_etag(self.version, symbols)
+
+    def predict_symbols(self, symbols: List[str], top_features: int = 5) -> Dict[str, Dict[str, Any]]:
+        """
+        One vectorized predict (and attribution) per model for a batch of symbols
+
+        Returns:
+            Dictionary mapping symbol to its response payload
+        """
+        rows = [self.index[symbol] for symbol in symbols]
+        X = self.matrix[rows]
+        latest = self.rows[rows]
+        feature_names = self.trainer.feature_names
+        closes = latest.get_column('close').to_numpy() if 'close' in latest.columns else None
+
+        payloads = {
+            symbol: {
+                'symbol': symbol,
+                'date': str(latest.get_column('date')[i]),
+                'close': float(closes[i]) if closes is not None else None,
+                'version': self.version,
+                'predictions': [],
+            }
+            for i, symbol in enumerate(symbols)
+        }
+
+        for target, result in self.trainer.models.items():
+            model = result['model']
+            values = np.asarray(model.predict(X), dtype=np.float64)
+            probabilities = (np.asarray(model.predict_proba(X))[:, -1]
+                             if result.get('type') == 'classification' and hasattr(model, 'predict_proba') else None)
+
+            if target in self.explainers:
+                contributions = np.asarray(self.explainers[target](X))[:, :-1]
+                order = np.argsort(-np.abs(contributions), axis=1)[:, :top_features]
+                top = [[{'feature': feature_names[j], 'contribution': float(contributions[i, j])} for j in order[i]]
+                       for i in range(len(symbols))]
+            else:
+                global_top = [{'feature': name, 'importance': float(value)}
+                              for name, value in self.trainer.get_feature_importance(target, top_features)]
+                top = [global_top] * len(symbols)
+
+            horizon = horizon_from_target(target)
+            for i, symbol in enumerate(symbols):
+                prediction = {
+                    'target': target,
+                    'type': result.get('type'),
+                    'horizon': horizon,
+                    'value': float(values[i]),
+                    'top_features': top[i],
+                }
+                if probabilities is not None:
+                    prediction['probability'] = float(probabilities[i])
+                elif closes is not None and 'return' in target:
+                    prediction['predicted_close'] = float(closes[i] * (1 + values[i] / 100))
+                payloads[symbol]['predictions'].append(prediction)
+
+        return payloads
+
+
+class ServingMetrics:
+    """Request counts, batch sizes and a rolling latency window"""
+
+    def __init__(self, window: int = 10000):
+        self.latencies = deque(maxlen=window)
+        self.batch_sizes = deque(maxlen=window)
+        self.status_counts = Counter()
+        self.started = time.time()
+
+    def record_request(self, status: int, seconds: float):
+        """Count a response and its server-side latency"""
+        self.status_counts[status] += 1
+        self.latencies.append(seconds)
+
+    def record_batch(self, size: int):
+        """Record the number of requests served by one predict batch"""
+        self.batch_sizes.append(size)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current metrics as a JSON-serializable dictionary"""
+        latencies_ms = np.array(self.latencies) * 1000
+        percentiles = (dict(zip(['p50', 'p90', 'p99'], np.percentile(latencies_ms, [50, 90, 99]).round(3).tolist()))
+                       if len(latencies_ms) else {})
+        return {
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'requests': sum(self.status_counts.values()),
+            'status': {str(status): count for status, count in sorted(self.status_counts.items())},
+            'batches': len(self.batch_sizes),
+            'mean_batch_size': float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.0,
+            'max_batch_size': max(self.batch_sizes, default=0),
+            'latency_ms': percentiles,
+        }
+
+
+class MicroBatcher:
+    """Collects concurrent symbol requests into single vectorized predict calls"""
+
+    def __init__(self, state: ServingState, config: ServingConfig, metrics: ServingMetrics):
+        self.state = state
+        self.config = config
+        self.metrics = metrics
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="predict")
+
+    async def submit(self, symbol: str) -> Dict[str, Any]:
+        """Queue one symbol and wait for its batch"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((symbol, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[str, asyncio.Future]]:
+        """First queued request plus everything arriving within max_wait_ms"""
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.config.max_wait_ms / 1000
+        while len(batch) < self.config.max_batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self):
+        """Batch loop: one predict per model for every collected batch"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # A reload may have dropped symbols since they were routed; only
+            # their own requests fail
+            state = self.state
+            symbols = [symbol for symbol in dict.fromkeys(symbol for symbol, _ in batch) if symbol in state.index]
+            self.metrics.record_batch(len(batch))
+            try:
+                payloads = await loop.run_in_executor(
+                    self.executor, state.predict_symbols, symbols, self.config.top_features
+                ) if symbols else {}
+                for symbol, future in batch:
+                    if future.done():
+                        continue
+                    if symbol in payloads:
+                        future.set_result(payloads[symbol])
+                    else:
+                        future.set_exception(UnknownSymbolError(symbol))
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+
+class PredictionServer:
+    """Asyncio HTTP/1.1 server in front of the micro-batcher"""
+
+    def __init__(self, state: ServingState, config: Optional[ServingConfig] = None):
+        self.state = state
+        self.config = config or ServingConfig()
+        self.metrics = ServingMetrics(self.config.latency_window)
+        self.batcher: Optional[MicroBatcher] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        self._batch_task: Optional[asyncio.Task] = None
+        self._reload_task: Optional[asyncio.Task] = None
+
+    @property
+    def port(self) -> int:
+        """Bound port (useful with port 0)"""
+        return self.server.sockets[0].getsockname()[1]
+
+    async def start(self):
+        """Start the batch loop and begin accepting connections"""
+        self.batcher = MicroBatcher(self.state, self.config, self.metrics)
+        self._batch_task = asyncio.create_task(self.batcher.run())
+        if self.state.data_dir and self.config.reload_interval_seconds > 0:
+            self._reload_task = asyncio.create_task(self._reload_loop())
+        self.server = await asyncio.start_server(self._handle_connection, self.config.host, self.config.port)
+        print(f"Serving {len(self.state.trainer.models)} models for {len(self.state.index)} symbols "
+              f"on http://{self.config.host}:{self.port}")
+
+    async def stop(self):
+        """Stop accepting connections and cancel the batch loop"""
+        self.server.close()
+        await self.server.wait_closed()
+        self._batch_task.cancel()
+        if self._reload_task is not None:
+            self._reload_task.cancel()
+        self.batcher.executor.shutdown(wait=False)
+
+    def swap_state(self, state: ServingState):
+        """Serve a new state; batches already running finish on the old one"""
+        self.state = state
+        if self.batcher is not None:
+            self.batcher.state = state
+
+    async def reload(self) -> bool:
+        """
+        Swap in the run directory's models and rows if its fingerprint changed
+
+        Returns:
+            True if a new state was loaded
+        """
+        data_dir = self.state.data_dir
+        if data_dir is None or ServingState.data_version(data_dir) == self.state.version:
+            return False
+        state = await asyncio.get_running_loop().run_in_executor(
+            None, ServingState.from_data_dir, data_dir, self.state.symbol, self.config.exact_attribution
+        )
+        self.swap_state(state)
+        print(f"Reloaded {data_dir} (version {state.version}, {len(state.index)} symbols)")
+        return True
+
+    async def _reload_loop(self):
+        """Poll for new pipeline runs"""
+        while True:
+            await asyncio.sleep(self.config.reload_interval_seconds)
+            try:
+                await self.reload()
+            except Exception as e:
+                # Files may be mid-write; keep serving the current state and retry
+                print(f"Reload failed: {e}")
+
+    async def serve_forever(self):
+        """Start and serve until cancelled"""
+        await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def _route(self, method: str, target: str, headers: Dict[str, str]) -> Tuple[int, Dict[str, str], Any]:
+        """Dispatch a request to (status, extra headers, JSON body)"""
+        if method != 'GET':
+            return 405, {}, {'error': f"{method} not supported"}
+
+        url = urlsplit(target)
+        if url.path == '/health':
+            return 200, {}, {'status': 'ok', 'version': self.state.version,
+                             'models': list(self.state.trainer.models), 'symbols': len(self.state.index)}
+        if url.path == '/metrics':
+            return 200, {}, self.metrics.snapshot()
+
+        if url.path.startswith('/predict'):
+            path_symbol = url.path[len('/predict'):].strip('/')
+            query = parse_qs(url.query).get('symbols', [''])[0]
+            symbols = [path_symbol] if path_symbol else [s for s in query.split(',') if s]
+            symbols = [symbol.upper() for symbol in symbols]
+            if not symbols:
+                return 400, {}, {'error': "No symbol requested"}
+            unknown = [symbol for symbol in symbols if symbol not in self.state.index]
+            if unknown:
+                return 404, {}, {'error': f"Unknown symbol(s): {', '.join(unknown)}"}
+
+            etag = self.state.etag(symbols)
+            cache_headers = {'ETag': etag, 'Cache-Control': f"max-age={self.config.max_age_seconds}"}
+            if headers.get('if-none-match') == etag:
+                return 304, cache_headers, None
+
+            payloads = await asyncio.gather(*(self.batcher.submit(symbol) for symbol in symbols),
+                                            return_exceptions=True)
+            unknown = [symbol for symbol, payload in zip(symbols, payloads) if isinstance(payload, UnknownSymbolError)]
+            if unknown:
+                return 404, {}, {'error': f"Unknown symbol(s): {', '.join(unknown)}"}
+            for payload in payloads:
+                if isinstance(payload, BaseException):
+                    raise payload
+
+            # Tag the response with the state(s) that produced it, not the one it was routed on
+            versions = list(dict.fromkeys(payload['version'] for payload in payloads))
+            cache_headers['ETag'] = make_etag("+".join(versions), symbols)
+            body = payloads[0] if path_symbol else {'predictions': payloads}
+            return 200, cache_headers, body
+
+        return 404, {}, {'error': f"No route for {url.path}"}
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve requests on one keep-alive connection"""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                start = time.perf_counter()
+                request_line, *header_lines = head.decode('latin-1').split("\r\n")
+                try:
+                    method, target, version = request_line.split(" ", 2)
+                except ValueError:
+                    break
+                headers = {}
+                for line in header_lines:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                if int(headers.get('content-length', 0)):
+                    await reader.readexactly(int(headers['content-length']))
+
+                try:
+                    status, extra_headers, body = await self._route(method, target, headers)
+                except Exception as e:
+                    status, extra_headers, body = 500, {}, {'error': str(e)}
+
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                payload = json.dumps(body).encode() if body is not None else b""
+                response_headers = {
+                    'Content-Type': 'application/json',
+                    'Content-Length': str(len(payload)),
+                    'Connection': 'keep-alive' if keep_alive else 'close',
+                    'Access-Control-Allow-Origin': self.config.cors_origin,
+                    'Access-Control-Expose-Headers': 'ETag',
+                    **extra_headers,
+                }
+                writer.write(
+                    f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n".encode()
+                    + "".join(f"{name}: {value}\r\n" for name, value in response_headers.items()).encode()
+                    + b"\r\n" + payload
+                )
+                await writer.drain()
+                self.metrics.record_request(status, time.perf_counter() - start)
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+
+async def http_get(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, path: str,
+                   headers: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, str], Any]:
+    """Minimal keep-alive GET on an open connection; returns (status, headers, JSON body)"""
+    extra = "".join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n{extra}\r\n".encode())
+    await writer.drain()
+
+    head = (await reader.readuntil(b"\r\n\r\n")).decode('latin-1').split("\r\n")
+    status = int(head[0].split(" ")[1])
+    response_headers = {name.strip().lower(): value.strip()
+                        for name, value in (line.split(":", 1) for line in head[1:] if ":" in line)}
+    body = await reader.readexactly(int(response_headers.get('content-length', 0)))
+    return status, response_headers, json.loads(body) if body else None
+
+
+async def load_test(host: str, port: int, symbols: List[str], n_requests: int = 2000,
+                    concurrency: int = 64, revalidate: bool = False) -> Dict[str, Any]:
+    """
+    Hammer /predict/<symbol> from concurrent keep-alive connections
+
+    Args:
+        host, port: Server address
+        symbols: Symbols requested round-robin
+        n_requests: Total requests
+        concurrency: Concurrent connections
+        revalidate: Send If-None-Match with the last ETag seen (exercises 304s)
+
+    Returns:
+        Client-side throughput and p50/p99 latency
+    """
+    latencies, statuses = [], Counter()
+    counter = iter(range(n_requests))
+    etags: Dict[str, str] = {}
+
+    async def client():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for i in counter:
+                symbol = symbols[i % len(symbols)]
+                headers = {'If-None-Match': etags[symbol]} if revalidate and symbol in etags else None
+                start = time.perf_counter()
+                status, response_headers, _ = await http_get(reader, writer, f"/predict/{symbol}", headers)
+                latencies.append(time.perf_counter() - start)
+                statuses[status] += 1
+                if 'etag' in response_headers:
+                    etags[symbol] = response_headers['etag']
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'status': {str(status): count for status, count in statuses.items()},
+        'p50_ms': round(float(np.percentile(latencies_ms, 50)), 3),
+        'p99_ms': round(float(np.percentile(latencies_ms, 99)), 3),
+    }
+
+
+def _demo_state(n_symbols: int = 500, n_features: int = 40) -> ServingState:
+    """Synthetic trained models and latest rows for a self-contained demo"""
+    from datetime import date
+    import xgboost as xgb
+    from sklearn.linear_model import LogisticRegression
+    from model_training import ModelTrainer
+
+    np.random.seed(42)
+    history = np.random.randn(5000, n_features)
+    returns = history[:, :3] @ np.array([0.5, -0.3, 0.2]) + np.random.randn(5000) * 0.5
+
+    trainer = ModelTrainer()
+    trainer.feature_names = [f"f{i}" for i in range(n_features)]
+    trainer.models = {
+        'target_return_5d': {'model': xgb.XGBRegressor(n_estimators=100, verbosity=0).fit(history, returns),
+                             'type': 'regression'},
+        'target_direction_5d': {'model': LogisticRegression(max_iter=1000).fit(history, (returns > 0).astype(int)),
+                                'type': 'classification'},
+    }
+    latest = pl.DataFrame({
+        'date': [date(2024, 6, 28)] * n_symbols,
+        'symbol': [f"SYM{i:04d}" for i in range(n_symbols)],
+        'close': 100 * np.exp(np.random.randn(n_symbols) * 0.3),
+        **{f"f{i}": np.random.randn(n_symbols) for i in range(n_features)},
+    })
+    return ServingState.from_trainer(trainer, latest, version="demo")
+
+
+async def _run_demo(config: ServingConfig):
+    """Start a server on synthetic models and load-test it"""
+    server = PredictionServer(_demo_state(), config)
+    await server.start()
+    symbols = list(server.state.index)
+    try:
+        for revalidate in [False, True]:
+            report = await load_test(config.host, server.port, symbols, n_requests=5000,
+                                     concurrency=64, revalidate=revalidate)
+            print(f"Load test ({'If-None-Match' if revalidate else 'cold'}): {report}")
+        print(f"Server metrics: {server.metrics.snapshot()}")
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PyStockBot prediction server")
+    parser.add_argument("--data-dir", default="../../data", help="Pipeline data directory")
+    parser.add_argument("--symbol", default=None, help="Symbol of a single-symbol dataset (default: from manifest)")
+    parser.add_argument("--host", default=None, help="Bind address")
+    parser.add_argument("--port", type=int, default=None, help="Port")
+    parser.add_argument("--demo", action="store_true", help="Serve synthetic models and run a local load test")
+    args = parser.parse_args()
+
+    config = ServingConfig()
+    config.host = args.host or config.host
+    config.port = args.port if args.port is not None else config.port
+
+    if args.demo:
+        config.port = 0
+        asyncio.run(_run_demo(config))
+    else:
+        state = ServingState.from_data_dir(args.data_dir, args.symbol, config.exact_attribution)
+        asyncio.run(PredictionServer(state, config).serve_forever())
+
+
+if __name__ == "__main__":
+    main()
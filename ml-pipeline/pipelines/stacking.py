@@ -0,0 +1,320 @@
+"""
+Stacking ensembles over cached out-of-fold predictions
+
+train_models_by_type already cross-validates every candidate on five folds
+and then keeps only the best one. With stacking enabled the same fold fits
+also record each candidate's out-of-fold predictions (and its predictions on
+the holdout split) in an OutOfFoldCache, so the cross-validation scores come
+for free and a meta-model can be fitted on top without refitting anything:
+
+- regression: non-negative linear blend of the base predictions
+- classification: logistic regression on the base class probabilities
+
+The cache is saved with the models, so adding a base learner only fits that
+learner's folds, and re-weighting or dropping learners only refits the
+meta-model. At inference the base outputs are stacked into one
+(rows x learners) matrix and blended in a single vectorized pass.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sklearn.base import clone
+from sklearn.linear_model import LinearRegression, LogisticRegression
+from sklearn.metrics import accuracy_score, r2_score
+from sklearn.model_selection import KFold, StratifiedKFold, cross_val_score, train_test_split
+
+STACKING_NAME = 'stacking'
+
+
+def base_output(model: Any, X: np.ndarray, task_type: str) -> np.ndarray:
+    """
+    Meta-features of one base model as a 2D block
+
+    Regression models contribute their prediction; classifiers contribute
+    their class probabilities without the redundant first column.
+    """
+    if task_type == 'regression':
+        return np.asarray(model.predict(X), dtype=np.float64).reshape(len(X), 1)
+    return np.asarray(model.predict_proba(X), dtype=np.float64)[:, 1:]
+
+
+def make_folds(y: np.ndarray, task_type: str, n_splits: int = 5) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Fold indices matching cross_val_score(cv=n_splits) for the task type"""
+    splitter = StratifiedKFold(n_splits=n_splits) if task_type == 'classification' else KFold(n_splits=n_splits)
+    return list(splitter.split(np.zeros(len(y)), y))
+
+
+def r2_or_accuracy(task_type: str):
+    """Scoring function used by cross_val_score for the task type"""
+    return r2_score if task_type == 'regression' else accuracy_score
+
+
+class OutOfFoldCache:
+    """Out-of-fold and holdout predictions of every base learner of one target"""
+
+    def __init__(self, task_type: str, train_index: np.ndarray, test_index: np.ndarray,
+                 y_train: np.ndarray, y_test: np.ndarray, n_splits: int = 5):
+        self.task_type = task_type
+        self.train_index = train_index
+        self.test_index = test_index
+        self.y_train = y_train
+        self.y_test = y_test
+        self.folds = make_folds(y_train, task_type, n_splits)
+        self.oof: Dict[str, np.ndarray] = {}
+        self.holdout: Dict[str, np.ndarray] = {}
+        self.models: Dict[str, Any] = {}
+        self.fold_scores: Dict[str, np.ndarray] = {}
+
+    def __repr__(self) -> str:
+        return (f"OutOfFoldCache({self.task_type}, learners={self.learners}, "
+                f"train={len(self.train_index)}, holdout={len(self.test_index)})")
+
+    @property
+    def learners(self) -> List[str]:
+        """Cached base learner names"""
+        return list(self.oof)
+
+    @property
+    def n_rows(self) -> int:
+        """Rows of the feature matrix the cache was built on"""
+        return len(self.train_index) + len(self.test_index)
+
+    def add(self, name: str, estimator: Any, X: np.ndarray, y: np.ndarray) -> bool:
+        """
+        Fit a base learner on every fold and on the whole training split
+
+        Args:
+            name: Learner name
+            estimator: Unfitted estimator (cloned for every fold)
+            X: Full feature matrix the cache was built on
+            y: Full target vector
+
+        Returns:
+            False if the learner was already cached (nothing is refitted)
+        """
+        if name in self.oof:
+            return False
+        if len(y) != self.n_rows:
+            raise ValueError(f"Cache was built on {self.n_rows} rows, got {len(y)}")
+
+        X_train, X_test = X[self.train_index], X[self.test_index]
+        scorer = r2_or_accuracy(self.task_type)
+        oof, scores = None, []
+        for fold_train, fold_test in self.folds:
+            fold_model = clone(estimator).fit(X_train[fold_train], self.y_train[fold_train])
+            fold_output = base_output(fold_model, X_train[fold_test], self.task_type)
+            if oof is None:
+                oof = np.zeros((len(self.y_train), fold_output.shape[1]))
+            oof[fold_test] = fold_output
+            scores.append(scorer(self.y_train[fold_test], fold_model.predict(X_train[fold_test])))
+
+        model = clone(estimator).fit(X_train, self.y_train)
+        self.oof[name] = oof
+        self.holdout[name] = base_output(model, X_test, self.task_type)
+        self.models[name] = model
+        self.fold_scores[name] = np.array(scores)
+        return True
+
+    def remove(self, name: str):
+        """Drop a base learner from the cache"""
+        for store in (self.oof, self.holdout, self.models, self.fold_scores):
+            store.pop(name, None)
+
+    def stacked(self, learners: List[str], holdout: bool = False) -> np.ndarray:
+        """(rows x meta-features) matrix of the given learners' cached predictions"""
+        store = self.holdout if holdout else self.oof
+        return np.hstack([store[name] for name in learners])
+
+
+class StackingEnsemble:
+    """Meta-model blending the outputs of fitted base models"""
+
+    def __init__(self, base_models: Dict[str, Any], meta_model: Any, task_type: str):
+        self.base_models = base_models
+        self.meta_model = meta_model
+        self.task_type = task_type
+
+    def __repr__(self) -> str:
+        return f"StackingEnsemble({self.task_type}, learners={list(self.base_models)})"
+
+    @property
+    def classes_(self) -> np.ndarray:
+        """Class labels of the meta-model (classification only)"""
+        return self.meta_model.classes_
+
+    @property
+    def weights(self) -> Dict[str, float]:
+        """Total meta-model weight per base learner"""
+        coefficients = np.atleast_2d(self.meta_model.coef_)
+        weights, column = {}, 0
+        for name, model in self.base_models.items():
+            width = 1 if self.task_type == 'regression' else len(model.classes_) - 1
+            weights[name] = float(np.abs(coefficients[:, column:column + width]).sum())
+            column += width
+        return weights
+
+    def base_outputs(self, X: np.ndarray) -> np.ndarray:
+        """One pass of every base model, stacked as (rows x meta-features)"""
+        return np.hstack([base_output(model, X, self.task_type) for model in self.base_models.values()])
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Blended prediction"""
+        return self.meta_model.predict(self.base_outputs(X))
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Blended class probabilities"""
+        return self.meta_model.predict_proba(self.base_outputs(X))
+
+
+def make_meta_model(task_type: str, random_state: int = 42) -> Any:
+    """Meta-model fitted on the out-of-fold predictions"""
+    if task_type == 'regression':
+        return LinearRegression(positive=True)
+    return LogisticRegression(max_iter=1000, random_state=random_state)
+
+
+def blend(trainer: Any, cache: OutOfFoldCache, learners: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Fit the meta-model on cached out-of-fold predictions; no base model is refitted
+
+    Args:
+        trainer: ModelTrainer providing the random state and metrics
+        cache: Out-of-fold cache of one target
+        learners: Base learners to blend (default: all cached learners)
+
+    Returns:
+        Result with the StackingEnsemble, holdout metrics and cross-validated
+        meta-model scores
+    """
+    learners = learners or cache.learners
+    oof = cache.stacked(learners)
+    meta_model = make_meta_model(cache.task_type, trainer.random_state)
+
+    scoring = 'r2' if cache.task_type == 'regression' else 'accuracy'
+    cv_scores = cross_val_score(meta_model, oof, cache.y_train, cv=cache.folds, scoring=scoring)
+    meta_model.fit(oof, cache.y_train)
+
+    ensemble = StackingEnsemble({name: cache.models[name] for name in learners}, meta_model, cache.task_type)
+    y_pred = meta_model.predict(cache.stacked(learners, holdout=True))
+    return {
+        'model': ensemble,
+        **trainer._prediction_metrics(cache.y_test, y_pred, cache.task_type),
+        'cv_mean': cv_scores.mean(),
+        'cv_std': cv_scores.std(),
+        'stacking_weights': ensemble.weights,
+    }
+
+
+def train_stacked_candidates(trainer: Any, X: np.ndarray, y: np.ndarray, target_name: str,
+                             models: Dict[str, Any], task_type: str,
+                             split_args: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Evaluate every candidate from cached fold fits and add a stacking candidate
+
+    Uses the same holdout split and folds as train_models_by_type, so base
+    candidates get identical metrics while their out-of-fold predictions are
+    kept in trainer.oof_cache[target_name].
+
+    Returns:
+        Dictionary of candidate name to result, including STACKING_NAME
+    """
+    train_index, test_index = train_test_split(np.arange(len(y)), **split_args)
+    cache = OutOfFoldCache(task_type, train_index, test_index, y[train_index], y[test_index])
+    trainer.oof_cache[target_name] = cache
+
+    results = {}
+    for name, model in models.items():
+        print(f"  Training {name}...")
+        cache.add(name, model, X, y)
+        fitted = cache.models[name]
+        results[name] = {
+            'model': fitted,
+            **trainer._prediction_metrics(cache.y_test, fitted.predict(X[test_index]), task_type),
+            'cv_mean': cache.fold_scores[name].mean(),
+            'cv_std': cache.fold_scores[name].std(),
+        }
+
+    print(f"  Blending {STACKING_NAME}...")
+    results[STACKING_NAME] = blend(trainer, cache)
+
+    for name, result in results.items():
+        if task_type == 'regression':
+            print(f"    {name}: R² Score: {result['r2']:.4f}, CV R²: {result['cv_mean']:.4f} ± {result['cv_std']:.4f}")
+        else:
+            print(f"    {name}: Accuracy: {result['accuracy']:.4f}, F1: {result['f1']:.4f}, "
+                  f"CV Acc: {result['cv_mean']:.4f} ± {result['cv_std']:.4f}")
+    return results
+
+
+def update_stack(trainer: Any, target_name: str, learners: Optional[List[str]] = None,
+                 new_learners: Optional[Dict[str, Any]] = None,
+                 X: Optional[np.ndarray] = None, y: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    """
+    Add base learners and/or re-blend a subset, then use the ensemble for the target
+
+    Only the new learners are fitted (fold fits plus one full fit); existing
+    learners are reused from the cache.
+
+    Args:
+        trainer: ModelTrainer with an oof_cache entry for the target
+        target_name: Target to re-blend
+        learners: Learners to blend (default: all cached learners after adding)
+        new_learners: Unfitted estimators to add to the cache
+        X, y: Full training matrix and target, required when adding learners
+
+    Returns:
+        The new result stored in trainer.models[target_name]
+    """
+    if target_name not in trainer.oof_cache:
+        raise ValueError(f"No out-of-fold cache for '{target_name}'. Train with stacking first.")
+    cache = trainer.oof_cache[target_name]
+
+    if new_learners:
+        if X is None or y is None:
+            raise ValueError("X and y are required to add base learners")
+        for name, estimator in new_learners.items():
+            if cache.add(name, estimator, X, y):
+                print(f"  Added {name} to the {target_name} stack")
+
+    result = blend(trainer, cache, learners)
+    trainer.models[target_name] = {**trainer.models.get(target_name, {}), **result, 'stacking': True}
+    return trainer.models[target_name]
+
+
+if __name__ == "__main__":
+    # Example: stack, add a learner without refitting the others, time inference
+    import time
+    from sklearn.ensemble import ExtraTreesRegressor
+    from model_training import ModelTrainer
+
+    np.random.seed(42)
+    n_rows, n_features = 3000, 40
+    X = np.random.randn(n_rows, n_features)
+    y = np.sin(X[:, 0]) + X[:, 1] * X[:, 2] + 0.5 * X[:, 3] + np.random.randn(n_rows) * 0.5
+
+    trainer = ModelTrainer()
+    start = time.perf_counter()
+    best = trainer.train_models_by_type(X, y, 'target_return_1d', [f"f{i}" for i in range(n_features)],
+                                        'regression', stacking=True)
+    print(f"Candidates + stack: {time.perf_counter() - start:.2f}s, best R² {best['main_score']:.4f}")
+
+    trainer.models['target_return_1d'] = {**best, 'type': 'regression'}
+    start = time.perf_counter()
+    result = update_stack(trainer, 'target_return_1d', learners=['random_forest', 'xgboost'])
+    print(f"Re-blend without linear: {time.perf_counter() - start:.3f}s, R² {result['main_score']:.4f}")
+
+    start = time.perf_counter()
+    result = update_stack(trainer, 'target_return_1d',
+                          new_learners={'extra_trees': ExtraTreesRegressor(n_estimators=100, random_state=42)}, X=X, y=y)
+    print(f"Add extra_trees: {time.perf_counter() - start:.2f}s, R² {result['main_score']:.4f}, "
+          f"weights {result['stacking_weights']}")
+
+    ensemble = result['model']
+    start = time.perf_counter()
+    ensemble.predict(X)
+    ensemble_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for model in ensemble.base_models.values():
+        model.predict(X)
+    print(f"Ensemble inference {ensemble_seconds * 1000:.1f}ms vs base models alone "
+          f"{(time.perf_counter() - start) * 1000:.1f}ms for {n_rows} rows")
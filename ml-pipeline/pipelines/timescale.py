@@ -0,0 +1,601 @@
+"""
+TimescaleDB storage for market data
+
+Bulk-loads OHLCV frames into the market_data hypertable of db/init/schema.sql
+(the db/postgresql-compose.yml instance):
+
+- every symbol is encoded straight from its Arrow column buffers into the
+  PostgreSQL binary COPY format with one numpy structured array (one fixed
+  width record per bar, since the symbol is constant within a batch)
+- the buffer is COPYed into a temporary float8 staging table and merged with
+  INSERT ... SELECT ... ON CONFLICT (symbol, timestamp) DO UPDATE, so reloading
+  overlapping ranges is idempotent
+- a psycopg connection pool loads several symbols in parallel, one
+  transaction per symbol
+
+and reads (symbol set, time range) queries back into Polars without pandas or
+per-row cursors: the range is split into partitions aligned to the 1-day chunk
+interval, and each partition runs one COPY (SELECT ...) TO STDOUT (FORMAT
+BINARY) on its own pooled connection. Only the requested columns are selected;
+prices are cast to float8, NULLs coalesced to sentinels and the symbol replaced
+by its position in the requested list, so every tuple has the same width and a
+partition decodes with one np.frombuffer call.
+
+Resampled reads (read_bars) are routed to the continuous aggregates of
+db/migrations/002 (market_data_1h/_1d/_1w/_1mo): an interval equal to a view's
+bucket reads the view directly, multiples of it (2w, 3mo, 1y) re-bucket the
+view's rows, and anything else buckets the raw hypertable.
+
+Dates become midnight UTC timestamps; naive datetimes are taken as UTC.
+psycopg (3.x) and psycopg_pool are optional dependencies imported when a sink
+is opened, so the encoder works without them.
+"""
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import polars as pl
+
+from config import TimescaleConfig
+
+PRICE_COLUMNS = ['open', 'high', 'low', 'close']
+MARKET_DATA_COLUMNS = PRICE_COLUMNS + ['volume']
+COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+COPY_HEADER = COPY_SIGNATURE + (0).to_bytes(4, 'big') + (0).to_bytes(4, 'big')
+COPY_TRAILER = (-1).to_bytes(2, 'big', signed=True)
+
+# Microseconds between the Unix epoch and the PostgreSQL epoch (2000-01-01)
+POSTGRES_EPOCH_MICROS = 946_684_800_000_000
+
+# Missing volumes travel as this sentinel (prices as NaN) and become NULL on upsert
+VOLUME_NULL = -1
+
+
+def time_column_of(df: pl.DataFrame) -> str:
+    """Name of the bar time column ('timestamp' or 'date')"""
+    return 'timestamp' if 'timestamp' in df.columns else 'date'
+
+
+def postgres_micros(times: pl.Series) -> np.ndarray:
+    """Date/datetime column as microseconds since 2000-01-01 UTC"""
+    if times.dtype == pl.Date:
+        times = times.cast(pl.Datetime('us'))
+    else:
+        times = times.dt.cast_time_unit('us')
+    return times.to_physical().to_numpy() - POSTGRES_EPOCH_MICROS
+
+
+def copy_record_dtype(fields: List[Tuple[str, str]]) -> np.dtype:
+    """Structured dtype of one binary COPY tuple of fixed-width, non-null fields"""
+    layout = [('count', '>i2')]
+    for name, kind in fields:
+        layout += [(f'{name}_size', '>i4'), (name, kind)]
+    return np.dtype(layout)
+
+
+def pack_copy_binary(fields: List[Tuple[str, str]], values: Dict[str, object], n_rows: int) -> bytes:
+    """
+    Binary COPY stream from column arrays (or scalars repeated on every row)
+
+    Args:
+        fields: (name, big-endian numpy type) per field, in COPY column order
+        values: Array or scalar per field name
+        n_rows: Number of tuples
+    """
+    records = np.empty(n_rows, dtype=copy_record_dtype(fields))
+    records['count'] = len(fields)
+    for name, kind in fields:
+        records[f'{name}_size'] = np.dtype(kind).itemsize
+        records[name] = values[name]
+    return COPY_HEADER + records.tobytes() + COPY_TRAILER
+
+
+def decode_copy_binary(payload: bytes, fields: List[Tuple[str, str]]) -> np.ndarray:
+    """
+    Decode a binary COPY stream of fixed-width, non-null fields
+
+    Returns:
+        Structured array (a view of payload) with one record per tuple
+
+    Raises:
+        ValueError: If the stream does not match the field layout
+    """
+    if not payload.startswith(COPY_SIGNATURE):
+        raise ValueError("Not a binary COPY stream")
+    start = len(COPY_HEADER) + int.from_bytes(payload[len(COPY_SIGNATURE) + 4:len(COPY_HEADER)], 'big')
+    dtype = copy_record_dtype(fields)
+    body = len(payload) - start - len(COPY_TRAILER)
+    if body < 0 or body % dtype.itemsize or payload[-len(COPY_TRAILER):] != COPY_TRAILER:
+        raise ValueError(f"COPY stream does not hold whole {dtype.itemsize}-byte tuples")
+
+    records = np.frombuffer(payload, dtype=dtype, count=body // dtype.itemsize, offset=start)
+    sizes_match = (records['count'] == len(fields)).all() and all(
+        (records[f'{name}_size'] == np.dtype(kind).itemsize).all() for name, kind in fields
+    )
+    if not sizes_match:
+        raise ValueError("COPY stream has NULL or variable-width fields")
+    return records
+
+
+def encode_copy_binary(df: pl.DataFrame, symbol: str) -> bytes:
+    """
+    Encode one symbol's bars as a binary COPY stream
+
+    Args:
+        df: Bars with a date/timestamp column and OHLCV columns
+        symbol: Symbol written in every row
+
+    Returns:
+        COPY (FORMAT BINARY) payload for (symbol, timestamp, open, high, low, close, volume)
+    """
+    symbol_bytes = symbol.encode()
+    fields = ([('symbol', f'S{len(symbol_bytes)}'), ('timestamp', '>i8')]
+              + [(col, '>f8') for col in PRICE_COLUMNS] + [('volume', '>i8')])
+    values = {
+        'symbol': symbol_bytes,
+        'timestamp': postgres_micros(df.get_column(time_column_of(df))),
+        'volume': df.get_column('volume').cast(pl.Int64).fill_null(VOLUME_NULL).to_numpy(),
+        **{col: df.get_column(col).cast(pl.Float64).fill_null(np.nan).to_numpy() for col in PRICE_COLUMNS},
+    }
+    return pack_copy_binary(fields, values, df.height)
+
+
+def split_by_symbol(df: pl.DataFrame, symbol: Optional[str] = None) -> Dict[str, pl.DataFrame]:
+    """
+    One frame per symbol with duplicate bars removed (last one wins)
+
+    Raises:
+        ValueError: If the frame has no symbol column and no symbol is given
+    """
+    time_column = time_column_of(df)
+    if 'symbol' in df.columns:
+        groups = {key[0]: group for key, group in df.partition_by('symbol', as_dict=True).items()}
+    elif symbol is not None:
+        groups = {symbol: df}
+    else:
+        raise ValueError("Frame has no symbol column; pass symbol")
+    return {
+        name: group.unique(subset=time_column, keep='last', maintain_order=True).sort(time_column)
+        for name, group in groups.items()
+    }
+
+
+def as_utc(value: Union[date, datetime]) -> datetime:
+    """Date or datetime as a UTC datetime (dates at midnight, naive values taken as UTC)"""
+    if not isinstance(value, datetime):
+        return datetime(value.year, value.month, value.day, tzinfo=timezone.utc)
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def partition_ranges(start: Union[date, datetime], end: Union[date, datetime], n_partitions: int,
+                     chunk: timedelta = timedelta(days=1)) -> List[Tuple[datetime, datetime]]:
+    """
+    Split [start, end) into contiguous ranges with inner bounds on chunk boundaries
+
+    Each range then touches a disjoint set of hypertable chunks.
+    """
+    start, end = as_utc(start), as_utc(end)
+    if end <= start:
+        return []
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    first_chunk = epoch + ((start - epoch) // chunk) * chunk
+    n_chunks = -(-(end - first_chunk) // chunk)
+    per_partition = -(-n_chunks // max(n_partitions, 1))
+    bounds = [first_chunk + i * per_partition * chunk for i in range(1, -(-n_chunks // per_partition))]
+    bounds = [start] + [bound for bound in bounds if start < bound < end] + [end]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def records_to_frame(records: np.ndarray, symbols: List[str], columns: List[str],
+                     as_date: bool = False) -> pl.DataFrame:
+    """Polars frame (symbol, timestamp or date, columns) from decoded market_data records"""
+    micros = records['timestamp'].astype(np.int64) + POSTGRES_EPOCH_MICROS
+    frame = pl.DataFrame([
+        pl.Series('symbol', records['symbol'].astype(np.int32) - 1),
+        pl.Series('timestamp', micros).cast(pl.Datetime('us', 'UTC')),
+        *[pl.Series(col, records[col].astype(np.float64)).fill_nan(None) for col in columns if col != 'volume'],
+        *([pl.Series('volume', records['volume'].astype(np.int64))] if 'volume' in columns else []),
+    ]).sort(['symbol', 'timestamp'])
+
+    # Sort on the integer symbol positions, then map them to names
+    frame = frame.with_columns(pl.Series('symbol', symbols, dtype=pl.String).gather(frame.get_column('symbol')))
+    if 'volume' in columns:
+        frame = frame.with_columns(pl.when(pl.col('volume') != VOLUME_NULL).then(pl.col('volume')).alias('volume'))
+    time_column = 'date' if as_date else 'timestamp'
+    if as_date:
+        frame = frame.with_columns(pl.col('timestamp').dt.date()).rename({'timestamp': 'date'})
+    return frame.select(['symbol', time_column] + columns)
+
+
+# Continuous aggregates of db/migrations/002_market_data_compression_and_rollups.sql
+ROLLUP_VIEWS = {
+    (1, 'month'): 'market_data_1mo',
+    (1, 'week'): 'market_data_1w',
+    (1, 'day'): 'market_data_1d',
+    (1, 'hour'): 'market_data_1h',
+}
+RAW_RELATION = 'raw'
+INTERVAL_UNITS = {'min': 'minute', 'h': 'hour', 'd': 'day', 'w': 'week', 'mo': 'month', 'y': 'year'}
+UNIT_MINUTES = {'minute': 1, 'hour': 60, 'day': 1440, 'week': 10080}
+
+
+def parse_interval(interval: str) -> Tuple[int, str]:
+    """
+    Bar size as (count, unit) with unit minute/hour/day/week/month ('1y' -> (12, 'month'))
+
+    Raises:
+        ValueError: If the interval is not <count><min|h|d|w|mo|y>
+    """
+    match = re.fullmatch(r"(\d+)(min|h|d|w|mo|y)", interval.strip().lower())
+    if match is None or int(match.group(1)) == 0:
+        raise ValueError(f"Unsupported bar interval '{interval}' (use e.g. 30min, 4h, 1d, 1w, 1mo, 1y)")
+    count, unit = int(match.group(1)), INTERVAL_UNITS[match.group(2)]
+    return (count * 12, 'month') if unit == 'year' else (count, unit)
+
+
+def interval_sql(interval: str) -> str:
+    """PostgreSQL interval literal of a bar size"""
+    count, unit = parse_interval(interval)
+    return f"{count} {unit}s"
+
+
+def route_interval(interval: str, use_aggregates: bool = True) -> Tuple[str, str, bool]:
+    """
+    Relation serving bars of the given size
+
+    The coarsest aggregate whose bucket evenly divides the interval wins:
+    months come from the monthly (or daily) view, multiples of a week from the
+    weekly view, and so on. Intervals no aggregate divides are bucketed from raw rows.
+
+    Returns:
+        (relation, time column, whether rows must be re-bucketed); relation is
+        RAW_RELATION for the hypertable itself
+    """
+    count, unit = parse_interval(interval)
+    if use_aggregates:
+        for (view_count, view_unit), view in ROLLUP_VIEWS.items():
+            if unit == 'month':
+                divides = True
+            else:
+                divides = view_unit != 'month' and (count * UNIT_MINUTES[unit]) % UNIT_MINUTES[view_unit] == 0
+            if divides:
+                return view, 'bucket', (count, unit) != (view_count, view_unit)
+    return RAW_RELATION, 'timestamp', True
+
+
+class _PooledClient:
+    """psycopg connection pool shared by the sink and the reader"""
+
+    def __init__(self, config: Optional[TimescaleConfig] = None):
+        self.config = config or TimescaleConfig()
+        self._pool = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def open(self):
+        """Open the connection pool"""
+        from psycopg_pool import ConnectionPool
+
+        if self._pool is None:
+            pool = ConnectionPool(self.config.dsn, min_size=1, max_size=self.config.pool_size, open=True)
+            try:
+                pool.wait(timeout=self.config.connect_timeout)
+            except Exception:
+                pool.close()
+                raise
+            self._pool = pool
+
+    def close(self):
+        """Close the connection pool"""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+
+class MarketDataSink(_PooledClient):
+    """Parallel COPY-based upserts of OHLCV frames into market_data"""
+
+    def _statements(self):
+        """Staging DDL, COPY and upsert statements for the configured table"""
+        from psycopg import sql
+
+        table = sql.Identifier(self.config.table)
+        staging = sql.Identifier(f"{self.config.table}_staging")
+        values = sql.SQL(", ").join(
+            [sql.SQL("symbol"), sql.SQL("timestamp")]
+            + [sql.SQL("NULLIF({col}, 'NaN')").format(col=sql.Identifier(col)) for col in PRICE_COLUMNS]
+            + [sql.SQL("NULLIF(volume, {})").format(sql.Literal(VOLUME_NULL))]
+        )
+        updates = sql.SQL(", ").join(
+            sql.SQL("{col} = EXCLUDED.{col}").format(col=sql.Identifier(col)) for col in PRICE_COLUMNS + ['volume']
+        )
+        create = sql.SQL(
+            "CREATE TEMP TABLE {staging} (symbol text, timestamp timestamptz, open float8, high float8, "
+            "low float8, close float8, volume int8) ON COMMIT DROP"
+        ).format(staging=staging)
+        copy = sql.SQL(
+            "COPY {staging} (symbol, timestamp, open, high, low, close, volume) FROM STDIN (FORMAT BINARY)"
+        ).format(staging=staging)
+        upsert = sql.SQL(
+            "INSERT INTO {table} (symbol, timestamp, open, high, low, close, volume) "
+            "SELECT {values} FROM {staging} "
+            "ON CONFLICT (symbol, timestamp) DO UPDATE SET {updates}"
+        ).format(table=table, values=values, staging=staging, updates=updates)
+        return create, copy, upsert
+
+    def write_symbol(self, symbol: str, df: pl.DataFrame) -> int:
+        """
+        COPY one symbol into staging and upsert it in a single transaction
+
+        Returns:
+            Number of inserted or updated rows
+        """
+        if df.height == 0:
+            return 0
+        self.open()
+        payload = memoryview(encode_copy_binary(df, symbol))
+        create, copy_statement, upsert = self._statements()
+        step = self.config.copy_buffer_bytes
+
+        with self._pool.connection() as conn, conn.cursor() as cur:
+            cur.execute(create)
+            with cur.copy(copy_statement) as copy:
+                for offset in range(0, len(payload), step):
+                    copy.write(payload[offset:offset + step])
+            cur.execute(upsert)
+            return cur.rowcount
+
+    def write(self, df: pl.DataFrame, symbol: Optional[str] = None) -> Dict[str, int]:
+        """
+        Upsert the bars of every symbol in the frame, symbols in parallel
+
+        Args:
+            df: OHLCV bars (with a symbol column, or of the given symbol)
+            symbol: Symbol of a single-symbol frame
+
+        Returns:
+            Upserted rows per symbol
+        """
+        groups = split_by_symbol(df, symbol)
+        self.open()
+        with ThreadPoolExecutor(max_workers=self.config.pool_size) as executor:
+            counts = executor.map(lambda item: self.write_symbol(*item), groups.items())
+            return dict(zip(groups, counts))
+
+
+class MarketDataReader(_PooledClient):
+    """Parallel, range-partitioned binary COPY reads of market_data into Polars"""
+
+    @staticmethod
+    def fields(columns: List[str]) -> List[Tuple[str, str]]:
+        """Fixed-width COPY layout of a read"""
+        return ([('symbol', '>i4'), ('timestamp', '>i8')]
+                + [(col, '>i8' if col == 'volume' else '>f8') for col in columns])
+
+    def _query(self, columns: List[str], relation: Optional[str] = None, time_column: str = 'timestamp',
+               rebucket: bool = False):
+        """
+        COPY TO statement selecting only the requested columns
+
+        With rebucket, rows are grouped into time_bucket(%(bucket)s) bars
+        (first open, max high, min low, last close, summed volume).
+        """
+        from psycopg import sql
+
+        time = sql.Identifier(time_column)
+        bucket = sql.SQL("time_bucket(%(bucket)s::interval, {time})").format(time=time) if rebucket else time
+        selected = [sql.SQL("array_position(%(symbols)s::text[], symbol::text)::int4"), bucket]
+        for col in columns:
+            value = sql.Identifier(col)
+            if rebucket:
+                value = {
+                    'open': sql.SQL("first(open, {time})"), 'high': sql.SQL("max(high)"), 'low': sql.SQL("min(low)"),
+                    'close': sql.SQL("last(close, {time})"), 'volume': sql.SQL("sum(volume)"),
+                }[col].format(time=time)
+            if col == 'volume':
+                selected.append(sql.SQL("COALESCE({value}, {null})::int8").format(value=value, null=sql.Literal(VOLUME_NULL)))
+            else:
+                selected.append(sql.SQL("COALESCE({value}::float8, 'NaN')").format(value=value))
+        return sql.SQL(
+            "COPY (SELECT {selected} FROM {relation} WHERE symbol = ANY(%(symbols)s::text[]) "
+            "AND {time} >= %(start)s AND {time} < %(end)s{group}) TO STDOUT (FORMAT BINARY)"
+        ).format(selected=sql.SQL(", ").join(selected), relation=sql.Identifier(relation or self.config.table),
+                 time=time, group=sql.SQL(" GROUP BY 1, 2") if rebucket else sql.SQL(""))
+
+    def _read_range(self, query, params: Dict[str, object], columns: List[str]) -> np.ndarray:
+        """One partition: binary COPY out, decoded in a single frombuffer"""
+        with self._pool.connection() as conn, conn.cursor() as cur:
+            with cur.copy(query, params) as copy:
+                payload = b"".join(copy)
+        return decode_copy_binary(payload, self.fields(columns))
+
+    def _run(self, query, symbols: List[str], ranges: List[Tuple[datetime, datetime]], columns: List[str],
+             as_date: bool, **params) -> pl.DataFrame:
+        """Run a query over time ranges in parallel and assemble the frame"""
+        self.open()
+        with ThreadPoolExecutor(max_workers=self.config.pool_size) as executor:
+            parts = list(executor.map(
+                lambda bounds: self._read_range(
+                    query, {'symbols': symbols, 'start': bounds[0], 'end': bounds[1], **params}, columns),
+                ranges
+            ))
+        records = np.concatenate(parts) if parts else np.empty(0, dtype=copy_record_dtype(self.fields(columns)))
+        return records_to_frame(records, symbols, columns, as_date)
+
+    @staticmethod
+    def _check_columns(columns: Optional[List[str]]) -> List[str]:
+        """Requested columns (default: all)"""
+        columns = columns or MARKET_DATA_COLUMNS
+        unknown = [col for col in columns if col not in MARKET_DATA_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown market_data columns: {unknown}")
+        return columns
+
+    def read(self, symbols: List[str], start: Union[date, datetime], end: Union[date, datetime],
+             columns: Optional[List[str]] = None, as_date: bool = False,
+             partitions: Optional[int] = None) -> pl.DataFrame:
+        """
+        Bars of a symbol set in [start, end)
+
+        Args:
+            symbols: Symbols to read
+            start: Inclusive start (dates are midnight UTC)
+            end: Exclusive end
+            columns: Subset of open/high/low/close/volume (default: all)
+            as_date: Return a 'date' column instead of the UTC 'timestamp'
+            partitions: Parallel range partitions (default: TimescaleConfig.read_partitions)
+
+        Returns:
+            Frame sorted by requested symbol order, then time
+
+        Raises:
+            ValueError: If an unknown column is requested
+        """
+        columns = self._check_columns(columns)
+        symbols = list(dict.fromkeys(symbols))
+        ranges = partition_ranges(start, end, partitions or self.config.read_partitions)
+        return self._run(self._query(columns), symbols, ranges, columns, as_date)
+
+    def read_bars(self, symbols: List[str], start: Union[date, datetime], end: Union[date, datetime],
+                  interval: str = '1w', columns: Optional[List[str]] = None, as_date: bool = False,
+                  use_aggregates: bool = True) -> pl.DataFrame:
+        """
+        Resampled bars, served from the coarsest continuous aggregate that fits
+
+        Args:
+            symbols: Symbols to read
+            start: Inclusive start
+            end: Exclusive end (buckets at the edges only cover bars inside the range)
+            interval: Bar size such as '30min', '4h', '1d', '1w', '2w', '1mo', '3mo' or '1y'
+            columns: Subset of open/high/low/close/volume (default: all)
+            as_date: Return a 'date' column instead of the UTC 'timestamp'
+            use_aggregates: False computes the bars from raw rows (for comparisons)
+
+        Returns:
+            Frame of bars labelled by bucket start, sorted by symbol order, then time
+        """
+        columns = self._check_columns(columns)
+        symbols = list(dict.fromkeys(symbols))
+        relation, time_column, rebucket = route_interval(interval, use_aggregates)
+        if relation == RAW_RELATION:
+            relation = self.config.table
+        query = self._query(columns, relation, time_column, rebucket)
+        # Partitions of a re-bucketed read could split buckets, so those run as one query
+        ranges = (partition_ranges(start, end, 1) if rebucket
+                  else partition_ranges(start, end, self.config.read_partitions))
+        return self._run(query, symbols, ranges, columns, as_date, bucket=interval_sql(interval))
+
+
+def synthetic_bars(n_symbols: int, n_days: int, prefix: str = "SYM", seed: int = 42) -> pl.DataFrame:
+    """Random-walk daily OHLCV bars for benchmarks"""
+    rng = np.random.default_rng(seed)
+    dates = pl.date_range(pl.date(2015, 1, 1), pl.date(2015, 1, 1) + pl.duration(days=n_days - 1), "1d", eager=True)
+    close = 100 * np.exp(rng.standard_normal((n_symbols, n_days)).cumsum(axis=1) * 0.01).ravel()
+    return pl.DataFrame({
+        'symbol': np.repeat([f"{prefix}{i:03d}" for i in range(n_symbols)], n_days),
+        'date': np.tile(dates.to_numpy(), n_symbols),
+        'open': close, 'high': close * 1.01, 'low': close * 0.99, 'close': close,
+        'volume': rng.integers(1_000, 1_000_000, n_symbols * n_days),
+    })
+
+
+def benchmark_rollups(config: Optional[TimescaleConfig] = None, n_symbols: int = 100, years: int = 10,
+                      intervals: Tuple[str, ...] = ('1d', '1w', '1mo', '1y'), repeats: int = 3) -> pl.DataFrame:
+    """
+    Resampled-read latency from raw rows vs continuous aggregates, before and after compression
+
+    Loads synthetic daily bars (symbols ZZRB000...), refreshes the aggregates,
+    times read_bars both ways, compresses the chunks, times again and deletes
+    the synthetic rows. Needs db/migrations/002 applied.
+
+    Returns:
+        One row per (storage, interval, source) with the median latency
+    """
+    import psycopg
+    from psycopg import sql
+
+    config = config or TimescaleConfig()
+    bars = synthetic_bars(n_symbols, years * 365, prefix="ZZRB")
+    symbols = bars.get_column('symbol').unique(maintain_order=True).to_list()
+    start, end = bars.get_column('date').min(), bars.get_column('date').max() + timedelta(days=1)
+    rows = []
+
+    with MarketDataSink(config) as sink:
+        sink.write(bars)
+    try:
+        with psycopg.connect(config.dsn, autocommit=True) as conn, MarketDataReader(config) as reader:
+            for view in reversed(list(ROLLUP_VIEWS.values())):
+                conn.execute("CALL refresh_continuous_aggregate(%s, NULL, NULL)", [view])
+
+            for storage in ['uncompressed', 'compressed']:
+                if storage == 'compressed':
+                    conn.execute("SELECT compress_chunk(c, if_not_compressed => true) FROM show_chunks(%s) c",
+                                 [config.table])
+                for interval in intervals:
+                    for use_aggregates in [False, True]:
+                        timings = []
+                        for _ in range(repeats):
+                            started = time.perf_counter()
+                            frame = reader.read_bars(symbols, start, end, interval, use_aggregates=use_aggregates)
+                            timings.append(time.perf_counter() - started)
+                        rows.append({
+                            'storage': storage, 'interval': interval,
+                            'source': route_interval(interval, use_aggregates)[0],
+                            'bars': frame.height, 'seconds': float(np.median(timings)),
+                        })
+    finally:
+        with psycopg.connect(config.dsn, autocommit=True) as conn:
+            conn.execute(sql.SQL("DELETE FROM {} WHERE symbol LIKE 'ZZRB___'").format(sql.Identifier(config.table)))
+    return pl.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    # Example: 500 symbols x 10 years of daily bars; loads, reads back and benchmarks
+    # rollups when the compose instance is up
+    n_symbols, n_days = 500, 2520
+    bars = synthetic_bars(n_symbols, n_days)
+
+    start = time.perf_counter()
+    groups = split_by_symbol(bars)
+    size = sum(len(encode_copy_binary(group, name)) for name, group in groups.items())
+    elapsed = time.perf_counter() - start
+    print(f"Encoded {bars.height:,} bars ({size / 1e6:.0f} MB) in {elapsed:.2f}s "
+          f"({bars.height / elapsed / 1e6:.1f}M rows/s)")
+
+    # Client-side cost of a read: decode a COPY OUT stream of the same bars
+    symbols = list(groups)
+    fields = MarketDataReader.fields(MARKET_DATA_COLUMNS)
+    payload = pack_copy_binary(fields, {
+        'symbol': np.repeat(np.arange(1, n_symbols + 1), n_days),
+        'timestamp': postgres_micros(bars.get_column('date')),
+        **{col: bars.get_column(col).to_numpy() for col in MARKET_DATA_COLUMNS},
+    }, bars.height)
+    start = time.perf_counter()
+    decoded = records_to_frame(decode_copy_binary(payload, fields), symbols, MARKET_DATA_COLUMNS, as_date=True)
+    elapsed = time.perf_counter() - start
+    print(f"Decoded {decoded.height:,} bars ({len(payload) / 1e6:.0f} MB) into Polars in {elapsed:.2f}s "
+          f"({len(payload) / elapsed / 1e6:.0f} MB/s)")
+
+    try:
+        with MarketDataSink() as sink:
+            start = time.perf_counter()
+            counts = sink.write(bars)
+            elapsed = time.perf_counter() - start
+            print(f"Upserted {sum(counts.values()):,} bars for {len(counts)} symbols in {elapsed:.1f}s "
+                  f"({sum(counts.values()) / elapsed:,.0f} rows/s)")
+        with MarketDataReader() as reader:
+            start = time.perf_counter()
+            frame = reader.read(symbols, date(2015, 1, 1), date(2025, 1, 1), as_date=True)
+            elapsed = time.perf_counter() - start
+            print(f"Read {frame.height:,} bars back in {elapsed:.1f}s ({frame.height / elapsed:,.0f} rows/s)")
+        print(benchmark_rollups())
+    except Exception as e:
+        print(f"Skipping database load ({type(e).__name__}: {e})")